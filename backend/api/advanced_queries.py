@@ -1,6 +1,10 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, request
 from db.connection import get_connection
+from db.user_operations import get_active_groups
+from db.activity_counters import WINDOWS
+from db.group_stats import ensure_group_stats_table
 import mysql.connector
+from .responses import jsonify
 from typing import Optional, List, Dict, Any
 from pymysql.cursors import DictCursor
 
@@ -13,6 +17,7 @@ def get_recommended_groups():
         return jsonify({'error': 'User ID is required'}), 400
 
     try:
+        ensure_group_stats_table()
         conn = get_connection()
         cursor = conn.cursor(dictionary=True)
         
@@ -25,15 +30,13 @@ def get_recommended_groups():
                 g.group_id,
                 g.group_name,
                 g.created_at,
-                COUNT(gm.user_id) AS member_count,
-                COUNT(DISTINCT m.message_id) AS message_count,
-                COUNT(DISTINCT e.event_id) AS event_count
+                COALESCE(gs.member_count, 0) AS member_count,
+                COALESCE(gs.message_count, 0) AS message_count,
+                COALESCE(gs.event_count, 0) AS event_count
             FROM
                 `Group` g
                 JOIN User_Interests ui ON g.interest_id = ui.interest_id
-                LEFT JOIN Group_Members gm ON g.group_id = gm.group_id
-                LEFT JOIN Messages m ON g.chat_id = m.chat_id
-                LEFT JOIN Event e ON g.group_id = e.group_id
+                LEFT JOIN Group_Stats gs ON g.group_id = gs.group_id
             WHERE
                 ui.user_id = %s
                 AND g.group_id NOT IN (
@@ -44,10 +47,6 @@ def get_recommended_groups():
                     WHERE
                         user_id = %s
                 )
-            GROUP BY
-                g.group_id,
-                g.group_name,
-                g.created_at
             ORDER BY
                 member_count DESC,
                 message_count DESC,
@@ -74,47 +73,13 @@ def get_recommended_groups():
         if 'conn' in locals():
             conn.close()
 
-def get_active_groups() -> Optional[List[Dict[str, Any]]]:
-    """
-    Get the most active groups based on message and event activity.
-    """
-    connection = None
-    cursor = None
-    try:
-        connection = get_connection()
-        if not connection:
-            return None
-            
-        cursor = connection.cursor(DictCursor)
-        cursor.execute("""
-            SELECT 
-                g.group_id,
-                g.group_name,
-                g.created_at,
-                COUNT(DISTINCT m.message_id) as message_count,
-                COUNT(DISTINCT e.event_id) as event_count
-            FROM `Group` g
-            LEFT JOIN Messages m ON g.chat_id = m.chat_id
-            LEFT JOIN Event e ON g.group_id = e.group_id
-            GROUP BY g.group_id
-            ORDER BY (message_count + event_count) DESC
-            LIMIT 10
-        """)
-        groups = cursor.fetchall()
-        return groups
-    except Exception as e:
-        print(f"Error getting active groups: {e}")
-        return None
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
-
 # Update the route to remove user_id parameter
 @advanced_queries_bp.route('/active-groups', methods=['GET'])
 def get_active_groups_route():
-    groups = get_active_groups()
+    window = request.args.get('window', '7d')
+    if window not in WINDOWS:
+        return jsonify({"error": f"window must be one of {', '.join(WINDOWS)}"}), 400
+    groups = get_active_groups(window)
     if groups is None:
         return jsonify({"error": "Failed to fetch active groups"}), 500
-    return jsonify(groups) 
\ No newline at end of file
+    return jsonify(groups)
@@ -0,0 +1,230 @@
+import datetime
+import decimal
+import gzip
+import hashlib
+import json
+
+from flask import current_app, request
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESS_MIN_BYTES = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+# Streamed rows are buffered up to about this many bytes per write, so each row is not its own chunk
+STREAM_CHUNK_BYTES = 16 * 1024
+
+_COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def _default(value):
+    # Only reached for values the SQL did not already format. Dates keep the HTTP-date
+    # form flask.jsonify always sent, e.g. "Tue, 02 Jan 2024 03:04:05 GMT"
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return http_date(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    """
+    Encode data as JSON bytes, with orjson when it is installed.
+    """
+    if orjson is not None:
+        # orjson would write datetimes as ISO strings; passing them through keeps the wire format
+        return orjson.dumps(data, default=_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(data, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def jsonify(*args, **kwargs):
+    """
+    Drop-in replacement for flask.jsonify that encodes with dumps().
+    """
+    if args and kwargs:
+        raise TypeError("jsonify() behavior undefined when passed both args and kwargs")
+    if len(args) == 1:
+        data = args[0]
+    else:
+        data = args or kwargs
+    return current_app.response_class(dumps(data), mimetype='application/json')
+
+
+def stream_format():
+    """
+    Get the streaming format the request asked for, if any.
+
+    `?stream=ndjson` or an Accept of application/x-ndjson selects newline-delimited
+    JSON; `?stream=1` (or any other value) a streamed JSON array.
+
+    Returns:
+        str: 'ndjson', 'json' or None for an ordinary buffered response
+    """
+    requested = request.args.get('stream')
+    if requested == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        return 'ndjson'
+    if requested and requested not in ('0', 'false'):
+        return 'json'
+    return None
+
+
+def stream_json(rows, fmt='json'):
+    """
+    Build a response that encodes rows one at a time as they are iterated.
+
+    Args:
+        rows (iterable): The rows, typically a RowStream from db.streaming.stream_rows
+        fmt (str): 'json' for a single array, 'ndjson' for one document per line
+
+    Returns:
+        Response: A streamed response; closing it closes the rows
+    """
+    def generate():
+        buffer = bytearray(b'[' if fmt == 'json' else b'')
+        first = True
+        for row in rows:
+            if fmt == 'json':
+                if not first:
+                    buffer += b','
+                buffer += dumps(row)
+            else:
+                buffer += dumps(row) + b'\n'
+            first = False
+            if len(buffer) >= STREAM_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+        if fmt == 'json':
+            buffer += b']'
+        if buffer:
+            yield bytes(buffer)
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    response = current_app.response_class(generate(), mimetype=mimetype)
+    if hasattr(rows, 'close'):
+        response.call_on_close(rows.close)
+    return response
+
+
+def resource_stamp(versions):
+    """
+    Turn resource versions into validators for a conditional GET.
+
+    Args:
+        versions (dict): resource -> (version, updated_at), from db.resource_versions,
+            or None if they could not be read
+
+    Returns:
+        tuple: (etag, last_modified), or None to serve the request unconditionally
+    """
+    if versions is None:
+        return None
+    # The query string is part of the tag, since fields= and the like change the body
+    key = ';'.join(f"{resource}={version}" for resource, (version, _) in sorted(versions.items()))
+    etag = hashlib.sha256(f"{key}?{request.query_string.decode()}".encode()).hexdigest()[:32]
+    updated = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+    last_modified = max(updated).replace(tzinfo=datetime.timezone.utc) if updated else None
+    return etag, last_modified
+
+
+def not_modified(stamp):
+    """
+    Answer a conditional GET whose cached copy is still current, before any list query runs.
+
+    Returns:
+        Response: A 304 if the request's If-None-Match matches the stamp, otherwise None
+    """
+    # If-Modified-Since is not honoured: Last-Modified has 1-second resolution, so a write
+    # in the same second as the cached copy would be answered 304
+    if stamp is None or not request.if_none_match:
+        return None
+    etag, _ = stamp
+    # Weak comparison, since compressed responses carry a weak tag
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return with_stamp(current_app.response_class(status=304), stamp)
+
+
+def with_stamp(response, stamp):
+    """
+    Attach a resource stamp's ETag and Last-Modified to a response.
+    """
+    if stamp is None:
+        return response
+    etag, last_modified = stamp
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Cacheable, but only after checking back with a conditional GET
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _negotiate(accept_encoding):
+    offered = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            offered[name.strip().lower()] = quality
+    if brotli is not None and offered.get('br', 0) > 0:
+        return 'br'
+    if offered.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def init_compression(app):
+    """
+    Compress responses of at least COMPRESS_MIN_BYTES with brotli or gzip, as the client accepts.
+    """
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(_COMPRESSIBLE_TYPES)):
+            return response
+
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = _negotiate(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        if encoding == 'br':
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+
+        # The compressed bytes differ from the identity representation, so the validator becomes weak
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -1,25 +1,67 @@
-from flask import jsonify, request
+from flask import request
 from db.user_operations import (
     get_all_users, get_user_by_id, get_user_recommendations, verify_login, 
     create_user, get_friend_recommendations, get_user_details, update_user_details, 
     get_user_friends, create_friendship, create_friend_request, 
     get_pending_friend_requests, update_friend_request, get_sent_friend_requests,
-    search_users, get_all_interests, delete_user_account, get_recommended_groups,
-    get_active_groups
+    search_users, delete_user_account, get_recommended_groups,
+    get_active_groups, get_users_by_ids, accept_friend_requests
 )
 from db.group_operations import (
     get_all_groups, get_group_recommendations, get_user_groups, add_user_to_group,
-    get_group_members, get_group_events, remove_user_from_group, search_groups
+    get_group_members, get_group_events, remove_user_from_group, search_groups,
+    create_group_event, get_trending_groups, stream_all_groups
 )
-from db.chat_operations import send_message, get_chat_messages, get_group_messages, send_group_message
-from db.connection import get_connection
+from db.chat_operations import (
+    send_message, get_chat_messages, get_group_messages, send_group_message,
+    stream_chat_messages, stream_group_messages
+)
+from db.account_deletion import get_account_deletion_job
+from db.activity_counters import WINDOWS
+from db.interest_service import parse_interest_ids, set_user_interests
+from db.reference_data import get_reference_data
+from db.resource_versions import ALL_GROUPS, GROUP_EVENTS, GROUP_MEMBERS, USER_GROUPS, get_resource_versions
+from db.typeahead import TOP_N, typeahead
+from db.unified_search import search_everything
+from db.user_overview import get_user_overview
 from .advanced_queries import advanced_queries_bp
+from .responses import (
+    init_compression, jsonify, not_modified, resource_stamp, stream_format, stream_json, with_stamp
+)
+from .session_tokens import (
+    TOKEN_MAX_AGE_SECONDS, forbid_other_user, init_session_tokens, issue_session_token, session_user_id
+)
 import mysql.connector
 
+# Most ids /api/users?ids= accepts in one request
+MAX_USER_IDS = 200
+
+def parse_id(value):
+    """Coerce an id from a JSON body (an int or a string of digits) to int; None if it is neither"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def requested_fields():
+    """Read a sparse fieldset from ?fields=a,b,c; None means every field"""
+    fields = request.args.get('fields')
+    if fields is None:
+        return None
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
 def setup_routes(app):
     # Register the advanced queries blueprint
     app.register_blueprint(advanced_queries_bp, url_prefix='/api')
 
+    # Session tokens are checked locally on every request
+    init_session_tokens(app)
+
+    # Large responses are gzip/brotli compressed when the client accepts it
+    init_compression(app)
+
     # Root route
     @app.route('/')
     def index():
@@ -28,11 +70,13 @@ def setup_routes(app):
             "endpoints": {
                 "users": "/api/users",
                 "user": "/api/users/<user_id>",
+                "user_overview": "/api/users/<user_id>/overview",
                 "user_recommendations": "/api/users/<user_id>/recommendations",
                 "groups": "/api/groups",
                 "group_search": "/api/groups/search",
                 "recommended_groups": "/api/users/<user_id>/recommended-groups",
                 "active_groups": "/api/active-groups",
+                "trending_groups": "/api/trending-groups",
                 "friend_recommendations": "/api/users/<user_id>/friend-recommendations",
                 "login": "/api/login",
                 "signup": "/api/signup",
@@ -42,15 +86,20 @@ def setup_routes(app):
                 "send_group_message": "/api/groups/<group_id>/messages/send",
                 "user_groups": "/api/users/<user_id>/groups",
                 "add_user_to_group": "/api/groups/<group_id>/add-user",
+                "account_deletion": "/api/users/<user_id>/deletion",
                 "user_friends": "/api/users/<user_id>/friends",
                 "create_friendship": "/api/users/<user_id1>/friends/<user_id2>",
                 "friend_requests": "/api/users/<user_id>/friend-requests",
                 "send_friend_request": "/api/users/<user_id1>/friend-requests/<user_id2>",
                 "update_friend_request": "/api/friend-requests/<sender_id>/<receiver_id>/update",
+                "accept_friend_requests": "/api/users/<user_id>/friend-requests/accept",
                 "group_members": "/api/groups/<group_id>/members",
                 "group_events": "/api/groups/<group_id>/events",
+                "create_group_event": "/api/groups/<group_id>/events/create",
                 "remove_user_from_group": "/api/groups/<group_id>/remove-user",
                 "user_search": "/api/users/search",
+                "search": "/api/search",
+                "typeahead": "/api/typeahead",
                 "interests": "/api/interests"
             }
         })
@@ -82,6 +131,8 @@ def setup_routes(app):
                 "success": True,
                 "message": "Login successful",
                 "user": user,
+                "token": issue_session_token(user),
+                "expires_in": TOKEN_MAX_AGE_SECONDS,
                 "redirect_url": "/dashboard"
             })
         else:
@@ -93,6 +144,20 @@ def setup_routes(app):
     # User Routes
     @app.route('/api/users', methods=['GET'])
     def users():
+        # /api/users?ids=1,2,3 hydrates just those users, in that order
+        ids = request.args.get('ids')
+        if ids is not None:
+            try:
+                user_ids = [int(user_id) for user_id in ids.split(',') if user_id.strip()]
+            except ValueError:
+                return jsonify({"error": "ids must be a comma-separated list of integers"}), 400
+            if len(user_ids) > MAX_USER_IDS:
+                return jsonify({"error": f"At most {MAX_USER_IDS} ids per request"}), 400
+            result = get_users_by_ids(user_ids)
+            if result is None:
+                return jsonify({"error": "Failed to fetch users"}), 500
+            return jsonify(result)
+        
         users = get_all_users()
         if users is None:
             return jsonify({"error": "Failed to fetch users"}), 500
@@ -105,9 +170,20 @@ def setup_routes(app):
             return jsonify({"error": "User not found"}), 404
         return jsonify(user)
 
+    @app.route('/api/users/<int:user_id>/overview', methods=['GET'])
+    def user_overview(user_id):
+        """Profile, friends, groups, friend requests and recommendations in one response"""
+        overview = get_user_overview(user_id)
+        if overview is None:
+            return jsonify({"error": "User not found"}), 404
+        if "error" in overview:
+            return jsonify(overview), 500
+        return jsonify(overview)
+
     @app.route('/api/users/<int:user_id>/recommendations', methods=['GET'])
     def user_recommendations(user_id):
-        recommendations = get_user_recommendations(user_id)
+        nearby = request.args.get('nearby', '').lower() in ('1', 'true', 'yes')
+        recommendations = get_user_recommendations(user_id, nearby)
         if recommendations is None:
             return jsonify({"error": "Failed to fetch recommendations"}), 500
         return jsonify(recommendations)
@@ -135,6 +211,9 @@ def setup_routes(app):
 
     @app.route('/api/users/<int:user_id>/details', methods=['PATCH'])
     def update_user(user_id):
+        denied = forbid_other_user(user_id)
+        if denied:
+            return denied
         data = request.get_json()
         if not data:
             return jsonify({"error": "No data provided"}), 400
@@ -146,10 +225,18 @@ def setup_routes(app):
 
     @app.route('/api/users/<int:user_id>/groups', methods=['GET'])
     def user_groups(user_id):
-        groups = get_user_groups(user_id)
+        # Read before the list, so a write landing in between can only make the tag stale, never too new
+        stamp = resource_stamp(get_resource_versions([USER_GROUPS.format(user_id), ALL_GROUPS]))
+        cached = not_modified(stamp)
+        if cached:
+            return cached
+        
+        groups = get_user_groups(user_id, requested_fields())
         if groups is None:
             return jsonify({"error": "Failed to fetch user groups"}), 500
-        return jsonify(groups)
+        if "error" in groups:
+            return jsonify(groups), 400
+        return with_stamp(jsonify(groups), stamp)
 
     @app.route('/api/users/<int:user_id>/friends', methods=['GET'])
     def user_friends(user_id):
@@ -161,10 +248,26 @@ def setup_routes(app):
     # Group Routes
     @app.route('/api/groups', methods=['GET'])
     def groups():
-        groups = get_all_groups()
+        stamp = resource_stamp(get_resource_versions([ALL_GROUPS]))
+        cached = not_modified(stamp)
+        if cached:
+            return cached
+        
+        fmt = stream_format()
+        if fmt:
+            rows = stream_all_groups(requested_fields())
+            if rows is None:
+                return jsonify({"error": "Failed to fetch groups"}), 500
+            if isinstance(rows, dict):
+                return jsonify(rows), 400
+            return with_stamp(stream_json(rows, fmt), stamp)
+        
+        groups = get_all_groups(requested_fields())
         if groups is None:
             return jsonify({"error": "Failed to fetch groups"}), 500
-        return jsonify(groups)
+        if "error" in groups:
+            return jsonify(groups), 400
+        return with_stamp(jsonify(groups), stamp)
 
     @app.route('/api/messages/send', methods=['POST'])
     def send_user_message():
@@ -172,16 +275,21 @@ def setup_routes(app):
         if not data or 'sender_id' not in data or 'receiver_id' not in data or 'message_text' not in data:
             return jsonify({"error": "sender_id, receiver_id, and message_text are required"}), 400
             
-        sender_id = data['sender_id']
-        receiver_id = data['receiver_id']
+        # The pair is ordered numerically to find the friendship row, so both must be real ints
+        sender_id = parse_id(data['sender_id'])
+        receiver_id = parse_id(data['receiver_id'])
+        if sender_id is None or receiver_id is None:
+            return jsonify({"error": "sender_id and receiver_id must be integers"}), 400
         message_text = data['message_text']
         
-        # Validate that both users exist
-        sender = get_user_by_id(sender_id)
-        receiver = get_user_by_id(receiver_id)
+        denied = forbid_other_user(sender_id)
+        if denied:
+            return denied
         
-        if not sender:
+        # Validate that both users exist; a session token for the sender already proves they do
+        if session_user_id() is None and not get_user_by_id(sender_id):
             return jsonify({"error": "Sender not found"}), 404
+        receiver = get_user_by_id(receiver_id)
         if not receiver:
             return jsonify({"error": "Receiver not found"}), 404
             
@@ -192,6 +300,15 @@ def setup_routes(app):
 
     @app.route('/api/users/<int:user_id1>/chat/<int:user_id2>/messages', methods=['GET'])
     def get_messages(user_id1, user_id2):
+        fmt = stream_format()
+        if fmt:
+            rows = stream_chat_messages(user_id1, user_id2)
+            if rows is None:
+                return jsonify({"error": "Failed to fetch messages"}), 500
+            if isinstance(rows, dict):
+                return jsonify(rows), 404
+            return stream_json(rows, fmt)
+        
         messages = get_chat_messages(user_id1, user_id2)
         if messages is None:
             return jsonify({"error": "Failed to fetch messages"}), 500
@@ -201,6 +318,15 @@ def setup_routes(app):
 
     @app.route('/api/groups/<int:group_id>/messages', methods=['GET'])
     def group_messages(group_id):
+        fmt = stream_format()
+        if fmt:
+            rows = stream_group_messages(group_id)
+            if rows is None:
+                return jsonify({"error": "Failed to fetch group messages"}), 500
+            if isinstance(rows, dict):
+                return jsonify(rows), 404
+            return stream_json(rows, fmt)
+        
         messages = get_group_messages(group_id)
         if messages is None:
             return jsonify({"error": "Failed to fetch group messages"}), 500
@@ -217,9 +343,12 @@ def setup_routes(app):
         user_id = data['user_id']
         message_text = data.get('message_text', '')  # Default to empty string if not provided
         
-        # Validate that the user exists
-        user = get_user_by_id(user_id)
-        if not user:
+        denied = forbid_other_user(user_id)
+        if denied:
+            return denied
+        
+        # Validate that the user exists, unless their session token already vouches for it
+        if session_user_id() is None and not get_user_by_id(user_id):
             return jsonify({"error": "User not found"}), 404
             
         message = send_group_message(group_id, user_id, message_text)
@@ -234,6 +363,9 @@ def setup_routes(app):
             return jsonify({"error": "user_id is required"}), 400
             
         user_id = data['user_id']
+        denied = forbid_other_user(user_id)
+        if denied:
+            return denied
         
         result = add_user_to_group(user_id, group_id)
         if "error" in result:
@@ -253,6 +385,9 @@ def setup_routes(app):
     @app.route('/api/users/<int:user_id1>/friend-requests/<int:user_id2>', methods=['POST'])
     def send_friend_request(user_id1, user_id2):
         """Send a friend request from user_id1 to user_id2"""
+        denied = forbid_other_user(user_id1)
+        if denied:
+            return denied
         result = create_friend_request(user_id1, user_id2)
         if result is None:
             return jsonify({"error": "Failed to create friend request"}), 500
@@ -285,6 +420,10 @@ def setup_routes(app):
             
         status = data['status']
         
+        denied = forbid_other_user(receiver_id)
+        if denied:
+            return denied
+        
         if status not in ['Accepted', 'Rejected']:
             return jsonify({"error": "Status must be either 'Accepted' or 'Rejected'"}), 400
             
@@ -295,25 +434,71 @@ def setup_routes(app):
             return jsonify(result), 400
         return jsonify(result)
 
+    @app.route('/api/users/<int:user_id>/friend-requests/accept', methods=['POST'])
+    def accept_friend_requests_route(user_id):
+        """Accept several pending friend requests at once (all of them if no sender_ids are given)"""
+        denied = forbid_other_user(user_id)
+        if denied:
+            return denied
+        data = request.get_json(silent=True) or {}
+        sender_ids = data.get('sender_ids')
+        if sender_ids is not None:
+            if not isinstance(sender_ids, list) or not all(isinstance(sender_id, int) for sender_id in sender_ids):
+                return jsonify({"error": "sender_ids must be a list of integers"}), 400
+        
+        result = accept_friend_requests(user_id, sender_ids)
+        if result is None:
+            return jsonify({"error": "Failed to accept friend requests"}), 500
+        if "error" in result:
+            return jsonify(result), 404
+        return jsonify(result)
+
     @app.route('/api/groups/<int:group_id>/members', methods=['GET'])
     def get_group_members_route(group_id):
         """Get all members of a group"""
+        stamp = resource_stamp(get_resource_versions([GROUP_MEMBERS.format(group_id)]))
+        cached = not_modified(stamp)
+        if cached:
+            return cached
+        
         members = get_group_members(group_id)
         if members is None:
             return jsonify({"error": "Failed to fetch group members"}), 500
         if "error" in members:
             return jsonify(members), 404
-        return jsonify(members)
+        return with_stamp(jsonify(members), stamp)
 
     @app.route('/api/groups/<int:group_id>/events', methods=['GET'])
     def get_group_events_route(group_id):
         """Get all events of a group"""
+        stamp = resource_stamp(get_resource_versions([GROUP_EVENTS.format(group_id)]))
+        cached = not_modified(stamp)
+        if cached:
+            return cached
+        
         events = get_group_events(group_id)
         if events is None:
             return jsonify({"error": "Failed to fetch group events"}), 500
         if "error" in events:
             return jsonify(events), 404
-        return jsonify(events)
+        return with_stamp(jsonify(events), stamp)
+
+    @app.route('/api/groups/<int:group_id>/events/create', methods=['POST'])
+    def create_group_event_route(group_id):
+        """Create an event in a group"""
+        data = request.get_json()
+        if not data or 'user_id' not in data or 'event_name' not in data:
+            return jsonify({"error": "user_id and event_name are required"}), 400
+        denied = forbid_other_user(data['user_id'])
+        if denied:
+            return denied
+            
+        result = create_group_event(group_id, data['user_id'], data['event_name'])
+        if result is None:
+            return jsonify({"error": "Failed to create event"}), 500
+        if "error" in result:
+            return jsonify(result), 400
+        return jsonify(result), 201
     
     @app.route('/api/groups/<int:group_id>/remove-user', methods=['POST'])
     def remove_user_from_group_route(group_id):
@@ -323,6 +508,9 @@ def setup_routes(app):
             return jsonify({"error": "user_id is required"}), 400
             
         user_id = data['user_id']
+        denied = forbid_other_user(user_id)
+        if denied:
+            return denied
         
         result = remove_user_from_group(group_id, user_id)
         
@@ -346,7 +534,9 @@ def setup_routes(app):
             except ValueError:
                 return jsonify({"error": "User ID must be an integer"}), 400
         
-        results = search_users(search_term, None, current_user_id)
+        location = request.args.get('location')
+        limit = request.args.get('limit', type=int)
+        results = search_users(search_term, None, current_user_id, location, limit)
         if results is None:
             return jsonify({"error": "Failed to search users"}), 500
         return jsonify(results)
@@ -365,130 +555,126 @@ def setup_routes(app):
             except ValueError:
                 return jsonify({"error": "User ID must be an integer"}), 400
         
-        results = search_groups(search_term, None, current_user_id)
+        limit = request.args.get('limit', type=int)
+        after = request.args.get('cursor')
+        results = search_groups(search_term, limit, current_user_id, after, requested_fields())
         if results is None:
             return jsonify({"error": "Failed to search groups"}), 500
-        return jsonify(results)
+        if "error" in results:
+            return jsonify(results), 400
+        
+        # The body stays a plain list; paging details travel in headers
+        response = jsonify(results["groups"])
+        response.headers['X-Total-Count'] = str(results["total_estimate"])
+        if results["next_cursor"]:
+            response.headers['X-Next-Cursor'] = results["next_cursor"]
+        return response
+        
+    @app.route('/api/search', methods=['GET'])
+    def search_route():
+        """Search users, groups and optionally messages in one request"""
+        search_term = request.args.get('q', '').strip()
+        if not search_term:
+            return jsonify({"error": "q is required"}), 400
+        
+        user_id = request.args.get('user_id')
+        current_user_id = None
+        if user_id:
+            try:
+                current_user_id = int(user_id)
+            except ValueError:
+                return jsonify({"error": "User ID must be an integer"}), 400
+        
+        sections = ['users', 'groups']
+        if request.args.get('include') == 'messages':
+            if current_user_id is None:
+                return jsonify({"error": "user_id is required to search messages"}), 400
+            sections.append('messages')
+        
+        limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+        return jsonify(search_everything(search_term, current_user_id, tuple(sections), limit))
+        
+    @app.route('/api/typeahead', methods=['GET'])
+    def typeahead_route():
+        """Suggest users and groups by name prefix"""
+        prefix = request.args.get('q', '')
+        kind = request.args.get('type', 'all')
+        if kind not in ('users', 'groups', 'all'):
+            return jsonify({"error": "type must be users, groups or all"}), 400
+        limit = request.args.get('limit', TOP_N, type=int)
+        
+        kinds = ('users', 'groups') if kind == 'all' else (kind,)
+        try:
+            return jsonify(typeahead(prefix, kinds, max(1, min(limit, TOP_N))))
+        except Exception as e:
+            print(f"Error in typeahead: {str(e)}")
+            return jsonify({"error": "Failed to fetch suggestions"}), 500
         
     @app.route('/api/interests', methods=['GET'])
     def get_interests_route():
         """Get all available interests"""
-        interests = get_all_interests()
-        if interests is None:
+        try:
+            snapshot = get_reference_data()
+        except Exception as e:
+            print(f"Error loading reference data: {str(e)}")
             return jsonify({"error": "Failed to fetch interests"}), 500
-        return jsonify(interests)
         
-    @app.route('/api/users/<int:user_id>/interests', methods=['POST'])
-    def add_user_interests(user_id):
-        """Add interests for a user"""
-        data = request.get_json()
-        if not data or 'interests' not in data:
-            return jsonify({"error": "interests array is required"}), 400
-            
-        interests = data['interests']
+        # Clients revalidate with If-None-Match and get a 304 while the data is unchanged
+        response = jsonify(snapshot.rows('interests'))
+        response.set_etag(snapshot.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
         
-        # Validate that the user exists
-        user = get_user_by_id(user_id)
-        if not user:
-            return jsonify({"error": "User not found"}), 404
-            
-        connection = None
-        cursor = None
-        try:
-            connection = get_connection()
-            if not connection:
-                return jsonify({"error": "Database connection failed"}), 500
-                
-            cursor = connection.cursor()
-            
-            # First delete existing user interests
-            cursor.execute("DELETE FROM User_Interests WHERE user_id = %s", (user_id,))
-            
-            # Insert new user interests
-            if interests and len(interests) > 0:
-                insert_values = [(user_id, interest_id) for interest_id in interests]
-                cursor.executemany(
-                    "INSERT INTO User_Interests (user_id, interest_id) VALUES (%s, %s)",
-                    insert_values
-                )
-                
-            connection.commit()
-            return jsonify({
-                "success": True,
-                "message": "User interests updated successfully"
-            })
-            
-        except Exception as e:
-            if connection:
-                connection.rollback()
-            print(f"Error adding user interests: {str(e)}")
-            return jsonify({"error": str(e)}), 500
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
-                
-    # patch endpoint for updating user interests
-    @app.route('/api/users/<int:user_id>/interests', methods=['PATCH'])
+    @app.route('/api/users/<int:user_id>/interests', methods=['POST', 'PATCH'])
     def update_user_interests(user_id):
-        """Update interests for a user"""
+        """Set a user's interests; only the interests that changed are written"""
         data = request.get_json()
         if not data or 'interests' not in data:
             return jsonify({"error": "interests array is required"}), 400
             
-        interests = data['interests']
+        try:
+            interests = parse_interest_ids(data['interests'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Validate that the user exists
-        user = get_user_by_id(user_id)
-        if not user:
+        denied = forbid_other_user(user_id)
+        if denied:
+            return denied
+        
+        # Validate that the user exists, unless their session token already vouches for it
+        if session_user_id() is None and not get_user_by_id(user_id):
             return jsonify({"error": "User not found"}), 404
-            
-        connection = None
-        cursor = None
-        try:
-            connection = get_connection()
-            if not connection:
-                return jsonify({"error": "Database connection failed"}), 500
-                
-            cursor = connection.cursor()
-            
-            # First delete existing user interests
-            cursor.execute("DELETE FROM User_Interests WHERE user_id = %s", (user_id,))
-            
-            # Insert new user interests
-            if interests and len(interests) > 0:
-                insert_values = [(user_id, interest_id) for interest_id in interests]
-                cursor.executemany(
-                    "INSERT INTO User_Interests (user_id, interest_id) VALUES (%s, %s)",
-                    insert_values
-                )
-                
-            connection.commit()
-            return jsonify({
-                "success": True,
-                "message": "User interests updated successfully"
-            })
-            
-        except Exception as e:
-            if connection:
-                connection.rollback()
-            print(f"Error updating user interests: {str(e)}")
-            return jsonify({"error": str(e)}), 500
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
+        
+        result = set_user_interests(user_id, interests)
+        if "error" in result:
+            return jsonify(result), 500
+        return jsonify({
+            "success": True,
+            "message": "User interests updated successfully",
+            "added": result["added"],
+            "removed": result["removed"]
+        })
 
     # Add the delete user account endpoint
     @app.route('/api/users/<int:user_id>', methods=['DELETE'])
     def delete_user(user_id):
         """Delete a user account and all associated data"""
+        denied = forbid_other_user(user_id)
+        if denied:
+            return denied
         result = delete_user_account(user_id)
         if "error" in result:
             return jsonify(result), 400
-        return jsonify(result), 200
+        # The account is tombstoned; its data is purged in the background
+        return jsonify(result), 202
+
+    @app.route('/api/users/<int:user_id>/deletion', methods=['GET'])
+    def account_deletion_progress(user_id):
+        """Get the progress of a user's account deletion"""
+        job = get_account_deletion_job(user_id)
+        if job is None:
+            return jsonify({"error": "No deletion job for this user"}), 404
+        return jsonify(job)
 
     @app.route('/api/users/<int:user_id>/recommended-groups', methods=['GET'])
     def user_recommended_groups(user_id):
@@ -499,11 +685,22 @@ def setup_routes(app):
 
     @app.route('/api/active-groups', methods=['GET'])
     def active_groups():
-        groups = get_active_groups()
+        window = request.args.get('window', '7d')
+        if window not in WINDOWS:
+            return jsonify({"error": f"window must be one of {', '.join(WINDOWS)}"}), 400
+        groups = get_active_groups(window)
         if groups is None:
             return jsonify({"error": "Failed to fetch active groups"}), 500
         return jsonify(groups)
 
+    @app.route('/api/trending-groups', methods=['GET'])
+    def trending_groups():
+        limit = request.args.get('limit', 10, type=int)
+        groups = get_trending_groups(max(1, min(limit, 50)))
+        if groups is None:
+            return jsonify({"error": "Failed to fetch trending groups"}), 500
+        return jsonify(groups)
+
     # Remove the old active-groups route since it's now under users
     # @app.route('/api/active-groups', methods=['GET'])
     # def active_groups():
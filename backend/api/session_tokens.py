@@ -0,0 +1,142 @@
+import os
+import secrets
+import threading
+import time
+
+from flask import g, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from db.account_deletion import account_tombstoned
+from .responses import jsonify
+
+# How long a token issued at login stays valid
+TOKEN_MAX_AGE_SECONDS = int(os.getenv('SESSION_TOKEN_MAX_AGE', str(24 * 60 * 60)))
+
+# A token's user is re-checked against the deletion tombstones at most this often
+LIVE_USER_CHECK_SECONDS = 30
+
+# Without this, a request with no token is trusted to act for whichever user it names, so
+# ownership is only enforced for clients that send tokens. Set REQUIRE_SESSION_TOKEN=1 once
+# the frontend sends a token on every write.
+REQUIRE_SESSION_TOKEN = os.getenv('REQUIRE_SESSION_TOKEN') == '1'
+
+_serializer = None
+_serializer_lock = threading.Lock()
+
+
+def _get_serializer():
+    # Read on first use rather than at import, so a missing secret fails token requests
+    # loudly without taking the whole app (and its token-less routes) down with it
+    global _serializer
+    with _serializer_lock:
+        if _serializer is None:
+            secret = os.getenv('SESSION_SECRET')
+            if not secret:
+                # Every instance must share the secret, or tokens fail whenever a request lands on
+                # another instance or after a restart; a random one is only good enough for local runs
+                if os.getenv('FLASK_ENV') != 'development':
+                    raise RuntimeError("SESSION_SECRET must be set (or FLASK_ENV=development for a throwaway secret)")
+                print("SESSION_SECRET is not set; using a random per-process secret for session tokens")
+                secret = secrets.token_hex(32)
+            _serializer = URLSafeTimedSerializer(secret, salt='synapo-session')
+        return _serializer
+
+# user_id -> time until which the user is known not to be deleted
+_live_users = {}
+_live_users_lock = threading.Lock()
+
+
+def _user_is_live(user_id):
+    now = time.monotonic()
+    with _live_users_lock:
+        if _live_users.get(user_id, 0) > now:
+            return True
+    if account_tombstoned(user_id):
+        return False
+    with _live_users_lock:
+        if len(_live_users) > 10000:
+            _live_users.clear()
+        _live_users[user_id] = now + LIVE_USER_CHECK_SECONDS
+    return True
+
+
+def issue_session_token(user):
+    """
+    Sign a token carrying the user's id and basic profile claims.
+
+    Args:
+        user (dict): The logged-in user's row
+
+    Returns:
+        str: The token, valid for TOKEN_MAX_AGE_SECONDS
+
+    Raises:
+        RuntimeError: If SESSION_SECRET is not configured
+    """
+    return _get_serializer().dumps({
+        'user_id': user['user_id'],
+        'full_name': user.get('full_name'),
+    })
+
+
+def init_session_tokens(app):
+    """
+    Validate `Authorization: Bearer <token>` on every request.
+
+    Valid claims are put in g.session_claims. Requests without a token still
+    go through, so older clients keep working; see forbid_other_user for what
+    that leaves unprotected. A token that is malformed,
+    tampered with or expired, or whose user has since deleted their account,
+    gets a 401. The signature is checked locally; the deletion check is one
+    primary-key lookup, remembered per user for LIVE_USER_CHECK_SECONDS.
+    """
+    @app.before_request
+    def load_session_claims():
+        g.session_claims = None
+        header = request.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return None
+        try:
+            claims = _get_serializer().loads(header[len('Bearer '):].strip(), max_age=TOKEN_MAX_AGE_SECONDS)
+        except SignatureExpired:
+            return jsonify({"error": "Session expired"}), 401
+        except BadSignature:
+            return jsonify({"error": "Invalid session token"}), 401
+        try:
+            live = _user_is_live(claims['user_id'])
+        except Exception as e:
+            print(f"Error checking session user: {str(e)}")
+            return jsonify({"error": "Could not verify session"}), 503
+        if not live:
+            return jsonify({"error": "Account has been deleted"}), 401
+        g.session_claims = claims
+        return None
+
+
+def session_user_id():
+    """
+    Get the user id from the request's session token, or None if there is no token.
+    """
+    claims = g.get('session_claims')
+    return claims['user_id'] if claims else None
+
+
+def forbid_other_user(user_id):
+    """
+    Reject a request whose session token belongs to a different user than the one it acts for.
+
+    Unless REQUIRE_SESSION_TOKEN is set, a request without a token is let through,
+    so until then this only stops clients that send a token for someone else; it
+    does not stop a token-less caller from acting as any user.
+
+    Returns:
+        tuple: A 401 response if a token is required but missing, a 403 response
+        if the token is for someone else, otherwise None
+    """
+    token_user_id = session_user_id()
+    if token_user_id is None and REQUIRE_SESSION_TOKEN:
+        return jsonify({"error": "Session token required"}), 401
+    # Ids from JSON bodies may arrive as strings
+    if token_user_id is not None and str(token_user_id) != str(user_id):
+        return jsonify({"error": "Session does not belong to this user"}), 403
+    return None
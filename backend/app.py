@@ -7,6 +7,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from api.routes import setup_routes
+from db.account_deletion import schedule_account_deletion_resume
 from db.chat_operations import get_group_messages, send_group_message
 from db.user_operations import get_user_by_id, get_user_by_username
 from db.group_operations import get_group_by_id, get_group_members, add_user_to_group
@@ -23,6 +24,7 @@ CORS(app, resources={
         "origins": "*",  # Allow all origins
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
+        "expose_headers": ["X-Total-Count", "X-Next-Cursor", "ETag"],
         "supports_credentials": True
     }
 })
@@ -30,6 +32,9 @@ CORS(app, resources={
 # Set up routes
 setup_routes(app)
 
+# Finish account deletions a previous run left failed or half done
+schedule_account_deletion_resume()
+
 @app.route('/api/groups/<int:group_id>/summarize', methods=['POST', 'OPTIONS'])
 def summarize_group_messages(group_id):
     if request.method == 'OPTIONS':
@@ -0,0 +1,120 @@
+"""
+Benchmark encoding and compressing chat-history responses.
+
+The synthetic mode builds N message rows shaped like get_chat_messages output
+and compares the old path (per-row strftime, then stdlib json) against the
+new one (sent_at formatted by the query, then api.responses.dumps), and
+reports the raw, gzip and brotli sizes of the body. The --live mode does the
+same for a real chat between two users.
+
+Usage:
+    python benchmark_chat_serialization.py [--messages 5000] [--repeat 5]
+    python benchmark_chat_serialization.py --live --user-id 1 --other-user-id 2
+"""
+import argparse
+import gzip
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from api.responses import BROTLI_QUALITY, GZIP_LEVEL, brotli, dumps, orjson
+
+WORDS = [
+    'hey', 'are', 'you', 'coming', 'to', 'the', 'study', 'group', 'tonight', 'lol', 'yes',
+    'no', 'maybe', 'see', 'library', 'at', 'seven', 'bring', 'notes', 'thanks', 'ok'
+]
+
+
+def _timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def _synthetic_messages(n, seed):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 9, 0, 0)
+    return [
+        {
+            'message_id': message_id,
+            'sender_id': rng.choice((1, 2)),
+            'sender_name': rng.choice(('Ada Lovelace', 'Alan Turing')),
+            'message_text': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 25))),
+            'sent_at': start + timedelta(seconds=message_id * 37),
+            'chat_id': 7,
+        }
+        for message_id in range(1, n + 1)
+    ]
+
+
+def _report(label, rows, repeat):
+    def old_path():
+        # What the routes did before: copy, strftime every row, encode with the stdlib
+        formatted = [dict(row) for row in rows]
+        for row in formatted:
+            if row['sent_at']:
+                row['sent_at'] = row['sent_at'].strftime('%Y-%m-%d %H:%M:%S')
+        return json.dumps(formatted).encode('utf-8')
+
+    preformatted = [
+        dict(row, sent_at=row['sent_at'].strftime('%Y-%m-%d %H:%M:%S') if isinstance(row['sent_at'], datetime)
+             else row['sent_at'])
+        for row in rows
+    ]
+
+    old_ms, old_body = _timed(old_path, repeat)
+    new_ms, new_body = _timed(lambda: dumps(preformatted), repeat)
+    gzip_ms, gzip_body = _timed(lambda: gzip.compress(new_body, compresslevel=GZIP_LEVEL), repeat)
+
+    print(f"{label}: {len(rows)} messages, encoder={'orjson' if orjson else 'json'}")
+    print(f"  {'path':<22} {'ms':>9} {'bytes':>10}")
+    print(f"  {'strftime + json':<22} {old_ms:>9.2f} {len(old_body):>10}")
+    print(f"  {'sql format + dumps':<22} {new_ms:>9.2f} {len(new_body):>10}")
+    print(f"  {'gzip ' + str(GZIP_LEVEL):<22} {gzip_ms:>9.2f} {len(gzip_body):>10}")
+    if brotli is not None:
+        br_ms, br_body = _timed(lambda: brotli.compress(new_body, quality=BROTLI_QUALITY), repeat)
+        print(f"  {'brotli ' + str(BROTLI_QUALITY):<22} {br_ms:>9.2f} {len(br_body):>10}")
+    else:
+        print("  brotli not installed")
+
+
+def run_synthetic(args):
+    _report("synthetic", _synthetic_messages(args.messages, args.seed), args.repeat)
+
+
+def run_live(args):
+    from db.chat_operations import get_chat_messages
+
+    start = time.perf_counter()
+    rows = get_chat_messages(args.user_id, args.other_user_id)
+    print(f"query: {(time.perf_counter() - start) * 1000:.2f} ms")
+    if rows is None or "error" in rows:
+        print(f"could not load chat: {rows}")
+        return
+    _report(f"chat {args.user_id}-{args.other_user_id}", rows, args.repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat-history serialization")
+    parser.add_argument('--live', action='store_true', help="Load a real chat from the database")
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--other-user-id', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=411)
+    args = parser.parse_args()
+
+    if args.live:
+        run_live(args)
+    else:
+        run_synthetic(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark group search on large group tables.
+
+The synthetic mode builds N random group names and compares the old search
+shape (substring scan over every name, per-row membership probe, full result)
+against the trigram index with keyset pages and a membership set. The --live
+mode times db.group_operations.search_groups against the configured database.
+
+Usage:
+    python benchmark_search_groups.py [--groups 200000] [--pages 5] [--page-size 50]
+    python benchmark_search_groups.py --live [--user-id 1] [--terms chess,club]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from db.trigram_index import TrigramIndex
+
+WORDS = [
+    'chess', 'club', 'hiking', 'runners', 'book', 'study', 'cs', 'data', 'music', 'band',
+    'film', 'photo', 'coding', 'robotics', 'soccer', 'tennis', 'climbing', 'cooking', 'anime',
+    'jazz', 'poetry', 'startup', 'design', 'gaming', 'yoga', 'dance', 'debate', 'travel'
+]
+
+DEFAULT_TERMS = ['chess', 'club', 'ro', 'photo club', 'xyz']
+
+
+def _timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def _synthetic_groups(n, seed):
+    rng = random.Random(seed)
+    return {
+        group_id: f"{' '.join(rng.sample(WORDS, rng.randint(1, 3))).title()} {group_id}"
+        for group_id in range(1, n + 1)
+    }
+
+
+def run_synthetic(args):
+    names = _synthetic_groups(args.groups, args.seed)
+    rng = random.Random(args.seed)
+    member_of = set(rng.sample(list(names), min(args.memberships, len(names))))
+
+    start = time.perf_counter()
+    index = TrigramIndex()
+    for group_id, name in names.items():
+        index.set(group_id, name)
+    print(f"groups={len(names)} index build: {time.perf_counter() - start:.2f}s")
+    print(f"{'term':<12} {'matches':>8} {'scan ms':>9} {'cold ms':>9} {'page 1 ms':>10} {'page ' + str(args.pages) + ' ms':>10}")
+
+    for term in args.terms:
+        needle = term.casefold()
+
+        def scan():
+            # What LIKE '%term%' plus a correlated EXISTS per row amounts to
+            rows = [
+                (name, group_id, group_id in member_of)
+                for group_id, name in names.items() if needle in name.casefold()
+            ]
+            rows.sort()
+            return rows
+
+        def pages(count):
+            after = None
+            for _ in range(count):
+                keys, total = index.search_page(term, args.page_size + 1, after)
+                page = keys[:args.page_size]
+                # The membership flag becomes one set probe per returned row
+                flags = [key[-1] in member_of for key in page]
+                if len(keys) <= args.page_size:
+                    break
+                after = page[-1]
+            return total
+
+        def cold():
+            # A write clears the index's ranked-term cache, as it would after a rename
+            index.set(1, names[1])
+            return pages(1)
+
+        scan_ms, rows = _timed(scan, args.repeat)
+        cold_ms, _ = _timed(cold, args.repeat)
+        first_ms, _ = _timed(lambda: pages(1), args.repeat)
+        last_ms, _ = _timed(lambda: pages(args.pages), args.repeat)
+        print(f"{term:<12} {len(rows):>8} {scan_ms:>9.2f} {cold_ms:>9.2f} {first_ms:>10.2f} {last_ms:>10.2f}")
+
+
+def run_live(args):
+    from db.group_operations import search_groups
+
+    print(f"{'term':<12} {'total':>8} {'page 1 ms':>10} {'page ' + str(args.pages) + ' ms':>10}")
+    for term in args.terms:
+        def pages(count):
+            after = None
+            result = None
+            for _ in range(count):
+                result = search_groups(term, args.page_size, args.user_id, after)
+                if not result or "error" in result or not result["next_cursor"]:
+                    break
+                after = result["next_cursor"]
+            return result
+
+        # Build the name index outside the timings
+        search_groups(term, 1, args.user_id)
+        first_ms, result = _timed(lambda: pages(1), args.repeat)
+        last_ms, _ = _timed(lambda: pages(args.pages), args.repeat)
+        total = result["total_estimate"] if result and "error" not in result else '-'
+        print(f"{term:<12} {total:>8} {first_ms:>10.2f} {last_ms:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark group search")
+    parser.add_argument('--live', action='store_true', help="Time search_groups against the database")
+    parser.add_argument('--groups', type=int, default=200000)
+    parser.add_argument('--memberships', type=int, default=50)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=411)
+    parser.add_argument('--terms', type=lambda value: value.split(','), default=DEFAULT_TERMS)
+    args = parser.parse_args()
+
+    if args.live:
+        run_live(args)
+    else:
+        run_synthetic(args)
+
+
+if __name__ == "__main__":
+    main()
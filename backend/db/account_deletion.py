@@ -0,0 +1,412 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pymysql.cursors import DictCursor
+
+from .connection import get_connection
+from .friend_graph import record_user_removed
+from .group_stats import bump_group_stats
+from .interest_lsh import record_interest_user_removed
+from .location_index import record_location_user_removed
+from .post_commit import after_commit
+from .resource_versions import (
+    ALL_GROUPS, GROUP_EVENTS, bump_resource_versions, ensure_resource_versions_table, membership_resources
+)
+from .trigram_index import record_name_user_removed
+
+# One row per account being deleted. Until the job is done the row is the user's tombstone:
+# it is written before any data is removed, and login treats the user as gone from then on.
+# A done job's User row is gone too, so its id may be handed to a new signup, which the
+# old row must not lock out.
+CREATE_ACCOUNT_DELETION_JOBS_TABLE = """
+    CREATE TABLE IF NOT EXISTS Account_Deletion_Jobs (
+        user_id INTEGER PRIMARY KEY,
+        status VARCHAR(16) NOT NULL DEFAULT 'pending',
+        step VARCHAR(32),
+        rows_deleted INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        requested_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+"""
+
+# Rows removed per statement; each chunk commits on its own so locks are held briefly
+CHUNK_SIZE = 500
+
+# Pause between chunks so chat writes queued behind a chunk get through
+CHUNK_PAUSE_SECONDS = 0.05
+
+# A running job whose progress row has not moved for this long is assumed dead (its
+# instance restarted) and may be claimed again
+STALE_JOB_SECONDS = 10 * 60
+
+# Deletions run one at a time in the background
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='account-deletion')
+
+# Users whose account is being deleted, for NOT IN (...) filters
+TOMBSTONED_USER_IDS = "SELECT user_id FROM Account_Deletion_Jobs WHERE status <> 'done'"
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+def ensure_account_deletion_table(cursor):
+    """
+    Create the Account_Deletion_Jobs table the first time this process needs it.
+    """
+    global _table_ready
+    with _table_lock:
+        if not _table_ready:
+            cursor.execute(CREATE_ACCOUNT_DELETION_JOBS_TABLE)
+            _table_ready = True
+
+def is_account_tombstoned(cursor, user_id):
+    """
+    Check whether a user's account is being deleted.
+
+    Call this before the transaction's first write, since creating the jobs table commits.
+    """
+    ensure_account_deletion_table(cursor)
+    cursor.execute("SELECT 1 FROM Account_Deletion_Jobs WHERE user_id = %s AND status <> 'done'", (user_id,))
+    return cursor.fetchone() is not None
+
+def account_tombstoned(user_id):
+    """
+    Check on a connection of its own whether a user's account is being deleted.
+
+    Raises:
+        Exception: If the database cannot be reached, so callers can fail closed
+    """
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        return is_account_tombstoned(cursor, user_id)
+    finally:
+        cursor.close()
+        connection.close()
+
+def _delete_friend_requests(cursor, user_id):
+    cursor.execute("DELETE FROM FriendRequests WHERE sender_id = %s LIMIT %s", (user_id, CHUNK_SIZE))
+    deleted = cursor.rowcount
+    cursor.execute("DELETE FROM FriendRequests WHERE receiver_id = %s LIMIT %s", (user_id, CHUNK_SIZE))
+    return deleted + cursor.rowcount
+
+def _delete_messages(cursor, user_id):
+    cursor.execute("""
+        SELECT m.message_id, g.group_id
+        FROM Messages m
+        LEFT JOIN `Group` g ON g.chat_id = m.chat_id
+        WHERE m.sender_id = %s
+        LIMIT %s
+    """, (user_id, CHUNK_SIZE))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    # Take this chunk's group messages out of the counters in the same commit
+    per_group = {}
+    for row in rows:
+        if row['group_id'] is not None:
+            per_group[row['group_id']] = per_group.get(row['group_id'], 0) + 1
+    for group_id, count in per_group.items():
+        bump_group_stats(cursor, group_id, messages=-count)
+
+    message_ids = [row['message_id'] for row in rows]
+    cursor.execute(
+        f"DELETE FROM Messages WHERE message_id IN ({', '.join(['%s'] * len(message_ids))})",
+        message_ids
+    )
+    return len(rows)
+
+def _delete_friend_chat_messages(cursor, user_id):
+    # The friends' side of the user's one-to-one chats, so the chats themselves can go
+    cursor.execute("""
+        SELECT message_id
+        FROM Messages
+        WHERE chat_id IN (
+            SELECT chat_id FROM Friendships WHERE user1_id = %s
+            UNION ALL
+            SELECT chat_id FROM Friendships WHERE user2_id = %s
+        )
+        LIMIT %s
+    """, (user_id, user_id, CHUNK_SIZE))
+    message_ids = [row['message_id'] for row in cursor.fetchall()]
+    if not message_ids:
+        return 0
+    cursor.execute(
+        f"DELETE FROM Messages WHERE message_id IN ({', '.join(['%s'] * len(message_ids))})",
+        message_ids
+    )
+    return len(message_ids)
+
+def _delete_interests(cursor, user_id):
+    cursor.execute("DELETE FROM User_Interests WHERE user_id = %s LIMIT %s", (user_id, CHUNK_SIZE))
+    return cursor.rowcount
+
+def _delete_events(cursor, user_id):
+    cursor.execute("SELECT event_id, group_id FROM Event WHERE created_by = %s LIMIT %s", (user_id, CHUNK_SIZE))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    per_group = {}
+    for row in rows:
+        per_group[row['group_id']] = per_group.get(row['group_id'], 0) + 1
+    for group_id, count in per_group.items():
+        bump_group_stats(cursor, group_id, events=-count)
+    bump_resource_versions(cursor, [GROUP_EVENTS.format(group_id) for group_id in per_group])
+
+    event_ids = [row['event_id'] for row in rows]
+    cursor.execute(
+        f"DELETE FROM Event WHERE event_id IN ({', '.join(['%s'] * len(event_ids))})",
+        event_ids
+    )
+    return len(rows)
+
+def _release_created_groups(cursor, user_id):
+    # Groups outlive their creator; they just stop naming one
+    cursor.execute("UPDATE `Group` SET created_by = NULL WHERE created_by = %s LIMIT %s", (user_id, CHUNK_SIZE))
+    released = cursor.rowcount
+    if released:
+        bump_resource_versions(cursor, [ALL_GROUPS])
+    return released
+
+def _delete_friendships(cursor, user_id):
+    cursor.execute("""
+        (SELECT user1_id, user2_id, chat_id FROM Friendships WHERE user1_id = %s LIMIT %s)
+        UNION ALL
+        (SELECT user1_id, user2_id, chat_id FROM Friendships WHERE user2_id = %s LIMIT %s)
+    """, (user_id, CHUNK_SIZE, user_id, CHUNK_SIZE))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    pairs = []
+    for row in rows:
+        pairs += [row['user1_id'], row['user2_id']]
+    cursor.execute(
+        f"DELETE FROM Friendships WHERE (user1_id, user2_id) IN ({', '.join(['(%s, %s)'] * len(rows))})",
+        pairs
+    )
+
+    # Delete chats associated with the friendships
+    chat_ids = [row['chat_id'] for row in rows if row['chat_id'] is not None]
+    if chat_ids:
+        cursor.execute(f"DELETE FROM Chat WHERE chat_id IN ({', '.join(['%s'] * len(chat_ids))})", chat_ids)
+    return len(rows)
+
+def _delete_memberships(cursor, user_id):
+    cursor.execute("SELECT group_id FROM Group_Members WHERE user_id = %s LIMIT %s", (user_id, CHUNK_SIZE))
+    group_ids = [row['group_id'] for row in cursor.fetchall()]
+    if not group_ids:
+        return 0
+    for group_id in group_ids:
+        bump_group_stats(cursor, group_id, members=-1)
+    bump_resource_versions(
+        cursor, [resource for group_id in group_ids for resource in membership_resources(group_id, user_id)])
+    cursor.execute(
+        f"DELETE FROM Group_Members WHERE user_id = %s AND group_id IN ({', '.join(['%s'] * len(group_ids))})",
+        [user_id] + group_ids
+    )
+    return len(group_ids)
+
+def _delete_user(cursor, user_id):
+    cursor.execute("DELETE FROM User WHERE user_id = %s", (user_id,))
+    return cursor.rowcount
+
+# Every row that references the user (or one of their chats) goes before what it references,
+# so no chunk trips a foreign key; every step can be re-run after a crash
+_STEPS = [
+    ('friend_requests', _delete_friend_requests),
+    ('messages', _delete_messages),
+    ('friend_chat_messages', _delete_friend_chat_messages),
+    ('interests', _delete_interests),
+    ('events', _delete_events),
+    ('created_groups', _release_created_groups),
+    ('friendships', _delete_friendships),
+    ('group_memberships', _delete_memberships),
+    ('user', _delete_user),
+]
+
+def _run_job(user_id):
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor(DictCursor)
+        ensure_resource_versions_table(cursor)
+        
+        # Claim the job, so two instances resuming at startup do not purge the same user twice
+        cursor.execute("""
+            UPDATE Account_Deletion_Jobs
+            SET status = 'running', error = NULL
+            WHERE user_id = %s
+            AND (status IN ('pending', 'failed') OR (status = 'running' AND updated_at < NOW() - INTERVAL %s SECOND))
+        """, (user_id, STALE_JOB_SECONDS))
+        claimed = cursor.rowcount
+        connection.commit()
+        if not claimed:
+            return
+
+        for step, delete_chunk in _STEPS:
+            while True:
+                deleted = delete_chunk(cursor, user_id)
+                # The job is done in the same commit that deletes the User row, so the
+                # tombstone never outlives it and a reused id is never locked out
+                cursor.execute("""
+                    UPDATE Account_Deletion_Jobs
+                    SET step = %s, rows_deleted = rows_deleted + %s,
+                        status = IF(%s = 'user', 'done', status)
+                    WHERE user_id = %s
+                """, (step, deleted, step, user_id))
+                connection.commit()
+                if deleted == 0 or step == 'user':
+                    break
+                time.sleep(CHUNK_PAUSE_SECONDS)
+    except Exception as e:
+        print(f"Error in account deletion job for user {user_id}: {str(e)}")
+        if connection:
+            connection.rollback()
+            try:
+                cursor.execute(
+                    "UPDATE Account_Deletion_Jobs SET status = 'failed', error = %s WHERE user_id = %s",
+                    (str(e), user_id)
+                )
+                connection.commit()
+            except Exception:
+                pass
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+def start_account_deletion(user_id):
+    """
+    Tombstone a user and queue the removal of their data.
+
+    The user disappears from login and the in-memory indexes straight away.
+    Their rows are then purged in the background in chunks of CHUNK_SIZE, and
+    each chunk commits on its own. Calling this again for a job that has not
+    finished queues it again.
+
+    Args:
+        user_id (int): The ID of the user to delete
+
+    Returns:
+        dict: The job's progress (see get_account_deletion_job), or an error
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        if not connection:
+            return {"error": "Database connection failed"}
+
+        cursor = connection.cursor(DictCursor)
+        ensure_account_deletion_table(cursor)
+
+        cursor.execute("SELECT status FROM Account_Deletion_Jobs WHERE user_id = %s", (user_id,))
+        job = cursor.fetchone()
+        if not job or job['status'] == 'done':
+            cursor.execute("SELECT user_id FROM User WHERE user_id = %s", (user_id,))
+            if not cursor.fetchone():
+                return {"error": "User not found"}
+            # A done job belongs to an earlier account that had this id; start a fresh one
+            cursor.execute("""
+                INSERT INTO Account_Deletion_Jobs (user_id) VALUES (%s)
+                ON DUPLICATE KEY UPDATE
+                    status = 'pending', step = NULL, rows_deleted = 0, error = NULL,
+                    requested_at = CURRENT_TIMESTAMP
+            """, (user_id,))
+            connection.commit()
+
+        after_commit(record_user_removed, user_id)
+        after_commit(record_interest_user_removed, user_id)
+        after_commit(record_location_user_removed, user_id)
+        after_commit(record_name_user_removed, user_id)
+    except Exception as e:
+        print(f"Error in start_account_deletion: {str(e)}")
+        if connection:
+            connection.rollback()
+        return {"error": str(e)}
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+    _executor.submit(_run_job, user_id)
+    return get_account_deletion_job(user_id)
+
+def get_account_deletion_job(user_id):
+    """
+    Get the progress of a user's deletion job.
+
+    Returns:
+        dict: user_id, status (pending, running, done or failed), step, rows_deleted,
+        error, requested_at and updated_at; None if there is no job or the lookup failed
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        if not connection:
+            return None
+
+        cursor = connection.cursor(DictCursor)
+        ensure_account_deletion_table(cursor)
+        cursor.execute("SELECT * FROM Account_Deletion_Jobs WHERE user_id = %s", (user_id,))
+        job = cursor.fetchone()
+        if job:
+            for column in ('requested_at', 'updated_at'):
+                if job[column]:
+                    job[column] = job[column].strftime('%Y-%m-%d %H:%M:%S')
+        return job
+    except Exception as e:
+        print(f"Error in get_account_deletion_job: {str(e)}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+def resume_account_deletions():
+    """
+    Run every unfinished or failed deletion job to completion, e.g. after a restart.
+
+    Returns:
+        int: The number of jobs run
+    """
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        ensure_account_deletion_table(cursor)
+        cursor.execute("SELECT user_id FROM Account_Deletion_Jobs WHERE status <> 'done'")
+        user_ids = [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        connection.close()
+    for user_id in user_ids:
+        _run_job(user_id)
+    return len(user_ids)
+
+def schedule_account_deletion_resume():
+    """
+    Queue resume_account_deletions on the background worker, so jobs that failed or
+    were cut off by a restart finish without anyone having to run this module by hand.
+    """
+    _executor.submit(_resume_quietly)
+
+def _resume_quietly():
+    try:
+        resumed = resume_account_deletions()
+        if resumed:
+            print(f"Resumed {resumed} account deletion jobs")
+    except Exception as e:
+        print(f"Error in resume_account_deletions: {str(e)}")
+
+if __name__ == "__main__":
+    print("Resuming unfinished account deletions...")
+    print(f"Ran {resume_account_deletions()} jobs")
@@ -0,0 +1,182 @@
+import heapq
+import threading
+import time
+
+from .connection import get_connection
+
+BUCKET_SECONDS = 3600
+
+# Re-read the message counts after this many seconds, so each instance also sees
+# the messages other instances wrote
+MAX_AGE_SECONDS = 15 * 60
+
+# One week of hourly buckets per group, plus the bucket the week's start falls in
+NUM_BUCKETS = 7 * 24 + 1
+
+# Window name -> length in hours. Each window slides with the clock: it is the current
+# partial hour, the full hours before it, and the matching share of the oldest hour.
+WINDOWS = {
+    '1h': 1,
+    '24h': 24,
+    '7d': 7 * 24,
+}
+
+
+class _GroupRing:
+    __slots__ = ('hours', 'messages', 'events')
+
+    def __init__(self):
+        self.hours = [-1] * NUM_BUCKETS
+        self.messages = [0] * NUM_BUCKETS
+        self.events = [0] * NUM_BUCKETS
+
+    def add(self, hour, messages=0, events=0):
+        slot = hour % NUM_BUCKETS
+        if hour < self.hours[slot]:
+            # Older than the ring reaches back; the slot already holds a newer bucket
+            return
+        if self.hours[slot] != hour:
+            # The slot still holds a bucket from a previous lap of the ring
+            self.hours[slot] = hour
+            self.messages[slot] = 0
+            self.events[slot] = 0
+        self.messages[slot] += messages
+        self.events[slot] += events
+
+    def copy_events(self, other):
+        for slot in range(NUM_BUCKETS):
+            # A slot holding an older lap than this ring's is stale and skipped
+            if not other.events[slot] or other.hours[slot] < self.hours[slot]:
+                continue
+            if self.hours[slot] != other.hours[slot]:
+                self.hours[slot] = other.hours[slot]
+                self.messages[slot] = 0
+            self.events[slot] = other.events[slot]
+
+    def totals(self, current_hour, window_hours, elapsed):
+        messages = 0
+        events = 0
+        for slot in range(NUM_BUCKETS):
+            age = current_hour - self.hours[slot]
+            if 0 <= age < window_hours:
+                weight = 1
+            elif age == window_hours:
+                # Only the part of the oldest hour still inside the window, assuming its
+                # activity was spread evenly over the hour
+                weight = 1 - elapsed
+            else:
+                continue
+            messages += weight * self.messages[slot]
+            events += weight * self.events[slot]
+        return round(messages), round(events)
+
+
+class ActivityCounters:
+    """
+    Per-group message and event counts in hourly buckets over the last week and an hour.
+    """
+
+    def __init__(self):
+        self.loaded_at = time.time()
+        self._lock = threading.Lock()
+        self._rings = {}
+
+    def record(self, group_id, messages=0, events=0, timestamp=None):
+        hour = int((timestamp if timestamp is not None else time.time()) // BUCKET_SECONDS)
+        with self._lock:
+            ring = self._rings.get(group_id)
+            if ring is None:
+                ring = self._rings[group_id] = _GroupRing()
+            ring.add(hour, messages, events)
+
+    def keep_events_from(self, other):
+        """
+        Carry another instance's event counts over, since events cannot be replayed from the database.
+        """
+        with other._lock:
+            rings = {group_id: ring for group_id, ring in other._rings.items() if any(ring.events)}
+        with self._lock:
+            for group_id, old_ring in rings.items():
+                ring = self._rings.get(group_id)
+                if ring is None:
+                    ring = self._rings[group_id] = _GroupRing()
+                ring.copy_events(old_ring)
+
+    def top(self, window='7d', limit=10):
+        """
+        Rank groups by messages plus events inside a window ending now.
+
+        Args:
+            window (str): One of the keys of WINDOWS
+            limit (int): Number of groups to return
+
+        Returns:
+            list: (group_id, message_count, event_count) tuples, most active first
+        """
+        window_hours = WINDOWS[window]
+        now = time.time()
+        current_hour = int(now // BUCKET_SECONDS)
+        elapsed = (now % BUCKET_SECONDS) / BUCKET_SECONDS
+        with self._lock:
+            totals = [
+                (group_id,) + ring.totals(current_hour, window_hours, elapsed)
+                for group_id, ring in self._rings.items()
+            ]
+        totals = [t for t in totals if t[1] + t[2] > 0]
+        return heapq.nlargest(limit, totals, key=lambda t: (t[1] + t[2], -t[0]))
+
+
+_counters = None
+_counters_lock = threading.Lock()
+
+
+def _warm(counters):
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        # Event has no timestamp column, so only messages can be replayed;
+        # event activity is counted from the moment this process starts.
+        # Whole buckets are loaded, from the start of the oldest one the ring keeps
+        cursor.execute("""
+            SELECT
+                g.group_id,
+                FLOOR(UNIX_TIMESTAMP(m.sent_at) / %s) AS hour,
+                COUNT(*) AS message_count
+            FROM Messages m
+            JOIN `Group` g ON g.chat_id = m.chat_id
+            WHERE m.sent_at >= FROM_UNIXTIME((FLOOR(UNIX_TIMESTAMP() / %s) - %s) * %s)
+            GROUP BY g.group_id, hour
+        """, (BUCKET_SECONDS, BUCKET_SECONDS, NUM_BUCKETS - 1, BUCKET_SECONDS))
+        for group_id, hour, message_count in cursor.fetchall():
+            counters.record(group_id, messages=int(message_count), timestamp=int(hour) * BUCKET_SECONDS)
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+def get_activity_counters():
+    """
+    Get the process-wide activity counters, replaying the last week of messages on
+    first use and again every MAX_AGE_SECONDS.
+    """
+    global _counters
+    with _counters_lock:
+        if _counters is None or time.time() - _counters.loaded_at > MAX_AGE_SECONDS:
+            counters = ActivityCounters()
+            _warm(counters)
+            if _counters is not None:
+                counters.keep_events_from(_counters)
+            _counters = counters
+        return _counters
+
+
+def record_group_activity(group_id, messages=0, events=0):
+    """
+    Count a committed group message or event, if the counters are loaded.
+    """
+    if _counters is not None:
+        _counters.record(group_id, messages=messages, events=events)
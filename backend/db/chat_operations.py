@@ -1,7 +1,34 @@
 from .connection import get_connection
+from .post_commit import after_commit
+from .account_deletion import is_account_tombstoned
+from .friend_graph import record_friendship
+from .friendships import canonical_pair
+from .group_stats import bump_group_stats
+from .streaming import stream_rows
+from .activity_counters import record_group_activity
+from .trending import record_trending_activity
 from pymysql.cursors import DictCursor
 from datetime import datetime
 
+# A chat's history, oldest first; sent_at comes back already formatted
+CHAT_HISTORY_QUERY = """
+    SELECT 
+        m.message_id,
+        m.sender_id,
+        u.full_name AS sender_name,
+        m.message_text,
+        DATE_FORMAT(m.sent_at, '%%Y-%%m-%%d %%H:%%i:%%s') AS sent_at,
+        m.chat_id
+    FROM 
+        Messages m
+    JOIN 
+        User u ON m.sender_id = u.user_id
+    WHERE 
+        m.chat_id = %s
+    ORDER BY 
+        m.sent_at ASC
+"""
+
 def send_message(sender_id, receiver_id, message_text):
     """
     Send a message from one user to another.
@@ -24,11 +51,16 @@ def send_message(sender_id, receiver_id, message_text):
             
         cursor = connection.cursor(DictCursor)
         
+        # Deleted accounts can neither send nor receive
+        if is_account_tombstoned(cursor, sender_id) or is_account_tombstoned(cursor, receiver_id):
+            return {"error": "User not found"}
+        
         # Check if a chat already exists between the users
+        user1_id, user2_id = canonical_pair(sender_id, receiver_id)
         cursor.execute("""
             SELECT chat_id FROM Friendships 
-            WHERE (user1_id = %s AND user2_id = %s) OR (user1_id = %s AND user2_id = %s)
-        """, (sender_id, receiver_id, receiver_id, sender_id))
+            WHERE user1_id = %s AND user2_id = %s
+        """, (user1_id, user2_id))
         
         friendship = cursor.fetchone()
         
@@ -54,7 +86,7 @@ def send_message(sender_id, receiver_id, message_text):
             # Create a new friendship with the chat
             cursor.execute("""
                 INSERT INTO Friendships (user1_id, user2_id, chat_id) VALUES (%s, %s, %s)
-            """, (sender_id, receiver_id, next_chat_id))
+            """, (user1_id, user2_id, next_chat_id))
             
             chat_id = next_chat_id
         
@@ -82,6 +114,8 @@ def send_message(sender_id, receiver_id, message_text):
         ))
         
         connection.commit()
+        if not friendship:
+            after_commit(record_friendship, user1_id, user2_id)
         
         # Get the inserted message
         cursor.execute("""
@@ -142,9 +176,8 @@ def get_chat_messages(user_id1, user_id2):
         cursor.execute("""
             SELECT chat_id 
             FROM Friendships 
-            WHERE (user1_id = %s AND user2_id = %s) 
-               OR (user1_id = %s AND user2_id = %s)
-        """, (user_id1, user_id2, user_id2, user_id1))
+            WHERE user1_id = %s AND user2_id = %s
+        """, canonical_pair(user_id1, user_id2))
         
         friendship = cursor.fetchone()
         if not friendship:
@@ -153,40 +186,56 @@ def get_chat_messages(user_id1, user_id2):
         chat_id = friendship['chat_id']
         
         # Get all messages in this chat
-        cursor.execute("""
-            SELECT 
-                m.message_id,
-                m.sender_id,
-                u.full_name AS sender_name,
-                m.message_text,
-                m.sent_at,
-                m.chat_id
-            FROM 
-                Messages m
-            JOIN 
-                User u ON m.sender_id = u.user_id
-            WHERE 
-                m.chat_id = %s
-            ORDER BY 
-                m.sent_at ASC
-        """, (chat_id,))
+        cursor.execute(CHAT_HISTORY_QUERY, (chat_id,))
+        return cursor.fetchall()
+    except Exception as e:
+        print(f"Error in get_chat_messages: {str(e)}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+def stream_chat_messages(user_id1, user_id2):
+    """
+    Like get_chat_messages, but yields the messages from a server-side cursor as they are read.
+    
+    Args:
+        user_id1 (int): The ID of the first user
+        user_id2 (int): The ID of the second user
         
-        messages = cursor.fetchall()
+    Returns:
+        generator: The messages, {"error": ...} if the users have no chat, or None on a database error
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        if not connection:
+            return None
+            
+        cursor = connection.cursor(DictCursor)
+        cursor.execute("""
+            SELECT chat_id 
+            FROM Friendships 
+            WHERE user1_id = %s AND user2_id = %s
+        """, canonical_pair(user_id1, user_id2))
         
-        # Format the sent_at timestamps
-        for message in messages:
-            if message['sent_at']:
-                message['sent_at'] = message['sent_at'].strftime('%Y-%m-%d %H:%M:%S')
-                
-        return messages
+        friendship = cursor.fetchone()
+        if not friendship:
+            return {"error": "No chat found between these users"}
+        chat_id = friendship['chat_id']
     except Exception as e:
-        print(f"Error in get_chat_messages: {str(e)}")
+        print(f"Error in stream_chat_messages: {str(e)}")
         return None
     finally:
         if cursor:
             cursor.close()
         if connection:
             connection.close()
+    
+    return stream_rows(CHAT_HISTORY_QUERY, (chat_id,))
 
 def get_group_messages(group_id):
     """
@@ -221,40 +270,55 @@ def get_group_messages(group_id):
         chat_id = group['chat_id']
         
         # Get all messages in this chat
-        cursor.execute("""
-            SELECT 
-                m.message_id,
-                m.sender_id,
-                u.full_name AS sender_name,
-                m.message_text,
-                m.sent_at,
-                m.chat_id
-            FROM 
-                Messages m
-            JOIN 
-                User u ON m.sender_id = u.user_id
-            WHERE 
-                m.chat_id = %s
-            ORDER BY 
-                m.sent_at ASC
-        """, (chat_id,))
+        cursor.execute(CHAT_HISTORY_QUERY, (chat_id,))
+        return cursor.fetchall()
+    except Exception as e:
+        print(f"Error in get_group_messages: {str(e)}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+def stream_group_messages(group_id):
+    """
+    Like get_group_messages, but yields the messages from a server-side cursor as they are read.
+    
+    Args:
+        group_id (int): The ID of the group
         
-        messages = cursor.fetchall()
+    Returns:
+        generator: The messages, {"error": ...} if the group does not exist, or None on a database error
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        if not connection:
+            return None
+            
+        cursor = connection.cursor(DictCursor)
+        cursor.execute("""
+            SELECT chat_id 
+            FROM `Group` 
+            WHERE group_id = %s
+        """, (group_id,))
         
-        # Format the sent_at timestamps
-        for message in messages:
-            if message['sent_at']:
-                message['sent_at'] = message['sent_at'].strftime('%Y-%m-%d %H:%M:%S')
-                
-        return messages
+        group = cursor.fetchone()
+        if not group:
+            return {"error": "Group not found"}
+        chat_id = group['chat_id']
     except Exception as e:
-        print(f"Error in get_group_messages: {str(e)}")
+        print(f"Error in stream_group_messages: {str(e)}")
         return None
     finally:
         if cursor:
             cursor.close()
         if connection:
             connection.close()
+    
+    return stream_rows(CHAT_HISTORY_QUERY, (chat_id,))
 
 def send_group_message(group_id, user_id, message_text):
     """
@@ -277,6 +341,9 @@ def send_group_message(group_id, user_id, message_text):
             
         cursor = connection.cursor(DictCursor)
         
+        if is_account_tombstoned(cursor, user_id):
+            return {"error": "User not found"}
+        
         # Check if the user is a member of the group
         cursor.execute("""
             SELECT 1 FROM Group_Members 
@@ -326,8 +393,11 @@ def send_group_message(group_id, user_id, message_text):
             message_text,
             sent_at
         ))
+        bump_group_stats(cursor, group_id, messages=1)
         
         connection.commit()
+        after_commit(record_group_activity, group_id, messages=1)
+        after_commit(record_trending_activity, group_id, messages=1)
         
         # Get the inserted message
         cursor.execute("""
@@ -362,4 +432,70 @@ def send_group_message(group_id, user_id, message_text):
         if cursor:
             cursor.close()
         if connection:
-            connection.close() 
\ No newline at end of file
+            connection.close() 
+
+def search_messages(search_term, user_id, limit=20):
+    """
+    Search the text of messages in chats a user belongs to.
+    
+    Args:
+        search_term (str): The text to look for
+        user_id (int): The ID of the user; only their friend and group chats are searched
+        limit (int): Maximum number of messages to return (default: 20)
+        
+    Returns:
+        list: Matching messages, newest first, with group_id/group_name set for group chats
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        if not connection:
+            return None
+            
+        cursor = connection.cursor(DictCursor)
+        
+        # Escape LIKE wildcards so the term is matched literally
+        pattern = '%' + search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        cursor.execute("""
+            SELECT 
+                m.message_id,
+                m.chat_id,
+                m.sender_id,
+                u.full_name AS sender_name,
+                m.message_text,
+                DATE_FORMAT(m.sent_at, '%%Y-%%m-%%d %%H:%%i:%%s') AS sent_at,
+                g.group_id,
+                g.group_name
+            FROM 
+                Messages m
+            JOIN 
+                User u ON m.sender_id = u.user_id
+            LEFT JOIN 
+                `Group` g ON g.chat_id = m.chat_id
+            WHERE 
+                m.chat_id IN (
+                    SELECT chat_id FROM Friendships WHERE user1_id = %s
+                    UNION ALL
+                    SELECT chat_id FROM Friendships WHERE user2_id = %s
+                    UNION
+                    SELECT g2.chat_id FROM `Group` g2
+                    JOIN Group_Members gm ON g2.group_id = gm.group_id
+                    WHERE gm.user_id = %s
+                )
+                AND m.message_text LIKE %s
+            ORDER BY 
+                m.sent_at DESC
+            LIMIT %s
+        """, (user_id, user_id, user_id, pattern, limit))
+        
+        # sent_at is already formatted by the query
+        return cursor.fetchall()
+    except Exception as e:
+        print(f"Error in search_messages: {str(e)}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
@@ -4,6 +4,8 @@ import sqlalchemy
 from google.oauth2 import service_account
 import os
 import json
+import queue
+import time
 
 def get_credentials():
     # Try to get credentials from environment variable
@@ -31,7 +33,17 @@ credentials = get_credentials()
 # Initialize the Cloud SQL Connector with credentials
 connector = Connector(credentials=credentials)
 
-def get_connection() -> pymysql.connections.Connection:
+# Connections kept open for reuse; callers beyond this many get a fresh connection
+# that is really closed when they are done with it
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+
+# Pooled connections idle longer than this are replaced instead of reused
+POOL_RECYCLE_SECONDS = 5 * 60
+
+_pool = queue.LifoQueue()
+_pool_pid = os.getpid()
+
+def _connect() -> pymysql.connections.Connection:
     connection = connector.connect(
         "database-systems-uiuc:us-central1:database-systems-411",  # Your instance connection name
         "pymysql",
@@ -42,8 +54,76 @@ def get_connection() -> pymysql.connections.Connection:
     )
     return connection
 
+class PooledConnection:
+    """
+    A pymysql connection on loan from the pool.
+
+    Behaves like the connection itself, except that close() rolls back
+    anything uncommitted and hands the connection back to the pool.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise pymysql.err.InterfaceError("Connection already returned to the pool")
+        return getattr(self._connection, name)
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            # Readers never commit, so end their snapshot too; the next borrower sees fresh data
+            connection.rollback()
+        except Exception:
+            _close_quietly(connection)
+            return
+        if _pool.qsize() < POOL_SIZE and os.getpid() == _pool_pid:
+            _pool.put((time.time(), connection))
+        else:
+            _close_quietly(connection)
+
+    def discard(self):
+        """
+        Really close the connection instead of returning it to the pool, e.g. when an
+        unbuffered result was abandoned part-way and the socket still holds unread rows.
+        """
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            _close_quietly(connection)
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+def get_connection():
+    global _pool, _pool_pid
+    # A forked worker must not share its parent's sockets
+    if os.getpid() != _pool_pid:
+        _pool = queue.LifoQueue()
+        _pool_pid = os.getpid()
+
+    while True:
+        try:
+            returned_at, connection = _pool.get_nowait()
+        except queue.Empty:
+            return PooledConnection(_connect())
+        if time.time() - returned_at > POOL_RECYCLE_SECONDS:
+            _close_quietly(connection)
+            continue
+        try:
+            connection.ping(reconnect=False)
+        except Exception:
+            _close_quietly(connection)
+            continue
+        return PooledConnection(connection)
+
 # Set up SQLAlchemy engine
 engine = sqlalchemy.create_engine(
     "mysql+pymysql://",
-    creator=get_connection,
-) 
\ No newline at end of file
+    creator=_connect,
+)
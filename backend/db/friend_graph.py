@@ -0,0 +1,225 @@
+import threading
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .connection import get_connection
+
+# Rebuild the CSR snapshot once this many edges have been applied on top of it
+COMPACT_THRESHOLD = 5000
+
+# Reload from the database after this many seconds so other instances' writes show up
+MAX_AGE_SECONDS = 15 * 60
+
+
+class FriendGraph:
+    """
+    In-memory friendship adjacency graph.
+
+    The bulk of the graph is stored as a symmetric CSR matrix built from the
+    Friendships table. Writes made after the snapshot was built are kept in a
+    small delta (added edges and removed users) which is merged at query time
+    and folded into a fresh CSR matrix once it grows past COMPACT_THRESHOLD.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._user_ids = np.zeros(0, dtype=np.int64)
+        self._index = {}
+        self._matrix = csr_matrix((0, 0), dtype=np.int32)
+        self._added = {}
+        self._removed = set()
+        self._delta_size = 0
+        self.loaded_at = None
+
+    def load(self, edges):
+        """
+        Build the CSR snapshot from an iterable of (user1_id, user2_id) pairs.
+        """
+        edges = np.asarray(list(edges), dtype=np.int64).reshape(-1, 2)
+        user_ids = np.unique(edges)
+        rows = np.searchsorted(user_ids, edges[:, 0])
+        cols = np.searchsorted(user_ids, edges[:, 1])
+
+        # Store both directions so a row lists every friend of that user
+        all_rows = np.concatenate([rows, cols])
+        all_cols = np.concatenate([cols, rows])
+        data = np.ones(len(all_rows), dtype=np.int32)
+        matrix = csr_matrix((data, (all_rows, all_cols)), shape=(len(user_ids), len(user_ids)))
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+
+        with self._lock:
+            self._user_ids = user_ids
+            self._index = {int(user_id): i for i, user_id in enumerate(user_ids)}
+            self._matrix = matrix
+            self._added = {}
+            self._removed = set()
+            self._delta_size = 0
+            self.loaded_at = time.time()
+
+    def _edges(self):
+        coo = self._matrix.tocoo()
+        upper = coo.row < coo.col
+        edges = {
+            (int(self._user_ids[r]), int(self._user_ids[c]))
+            for r, c in zip(coo.row[upper], coo.col[upper])
+        }
+        for user_id, friends in self._added.items():
+            for friend_id in friends:
+                edges.add((min(user_id, friend_id), max(user_id, friend_id)))
+        return [
+            edge for edge in edges
+            if edge[0] not in self._removed and edge[1] not in self._removed
+        ]
+
+    def _compact(self):
+        self.load(self._edges())
+
+    def add_friendship(self, user_id1, user_id2):
+        with self._lock:
+            # A reused id must not bring back the deleted user's old edges
+            if user_id1 in self._removed or user_id2 in self._removed:
+                self._compact()
+            self._added.setdefault(user_id1, set()).add(user_id2)
+            self._added.setdefault(user_id2, set()).add(user_id1)
+            self._delta_size += 1
+            if self._delta_size >= COMPACT_THRESHOLD:
+                self._compact()
+
+    def remove_user(self, user_id):
+        with self._lock:
+            for friend_id in self._added.pop(user_id, set()):
+                self._added.get(friend_id, set()).discard(user_id)
+            self._removed.add(user_id)
+            self._delta_size += 1
+            if self._delta_size >= COMPACT_THRESHOLD:
+                self._compact()
+
+    def _row_indices(self, user_ids):
+        return np.array(
+            [self._index[u] for u in user_ids if u in self._index],
+            dtype=np.int64
+        )
+
+    def friends(self, user_id):
+        """
+        Get the set of friend ids for a user.
+        """
+        with self._lock:
+            if user_id in self._removed:
+                return set()
+            friends = set()
+            i = self._index.get(user_id)
+            if i is not None:
+                row = self._matrix.indices[self._matrix.indptr[i]:self._matrix.indptr[i + 1]]
+                friends.update(int(u) for u in self._user_ids[row])
+            friends.update(self._added.get(user_id, ()))
+            return friends - self._removed
+
+    def mutual_friend_counts(self, user_id, limit=None):
+        """
+        Count mutual friends between a user and every user two hops away.
+
+        Args:
+            user_id (int): The ID of the user
+            limit (int, optional): Only return the top candidates (default: None)
+
+        Returns:
+            list: (candidate_id, mutual_friends) tuples, highest count first
+        """
+        with self._lock:
+            friends = self.friends(user_id)
+            if not friends:
+                return []
+
+            # Two-hop walk over the snapshot: gather every friend's row and count column hits
+            counts = np.zeros(len(self._user_ids), dtype=np.int64)
+            rows = self._row_indices(friends)
+            if len(rows):
+                counts = np.bincount(
+                    self._matrix[rows].indices,
+                    minlength=len(self._user_ids)
+                ).astype(np.int64)
+
+            # Candidates reached through edges that are not in the snapshot yet
+            extra = {}
+            for friend_id in friends:
+                for candidate_id in self._added.get(friend_id, ()):
+                    i = self._index.get(candidate_id)
+                    if i is not None and self._is_snapshot_edge(friend_id, i):
+                        continue
+                    extra[candidate_id] = extra.get(candidate_id, 0) + 1
+
+            excluded = friends | self._removed | {user_id}
+            for candidate_id in excluded:
+                i = self._index.get(candidate_id)
+                if i is not None:
+                    counts[i] = 0
+                extra.pop(candidate_id, None)
+
+            nonzero = np.flatnonzero(counts > 0)
+            result = {int(self._user_ids[i]): int(counts[i]) for i in nonzero}
+            for candidate_id, count in extra.items():
+                result[candidate_id] = result.get(candidate_id, 0) + count
+
+            ranked = sorted(result.items(), key=lambda item: (-item[1], item[0]))
+            if limit:
+                ranked = ranked[:limit]
+            return ranked
+
+    def _is_snapshot_edge(self, user_id, column):
+        i = self._index.get(user_id)
+        if i is None:
+            return False
+        row = self._matrix.indices[self._matrix.indptr[i]:self._matrix.indptr[i + 1]]
+        return bool(np.any(row == column))
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def _load_edges():
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT user1_id, user2_id FROM Friendships")
+        return cursor.fetchall()
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+def get_friend_graph():
+    """
+    Get the process-wide friend graph, loading it from the database on first use.
+    """
+    global _graph
+    with _graph_lock:
+        if _graph is None or time.time() - _graph.loaded_at > MAX_AGE_SECONDS:
+            graph = FriendGraph()
+            graph.load(_load_edges())
+            _graph = graph
+        return _graph
+
+
+def record_friendship(user_id1, user_id2):
+    """
+    Apply a newly committed friendship to the in-memory graph, if it is loaded.
+    """
+    if _graph is not None:
+        _graph.add_friendship(user_id1, user_id2)
+
+
+def record_user_removed(user_id):
+    """
+    Drop a deleted user and all of their edges from the in-memory graph, if it is loaded.
+    """
+    if _graph is not None:
+        _graph.remove_user(user_id)
@@ -0,0 +1,82 @@
+from .connection import get_connection
+
+# Friendships rows are stored once per pair with user1_id < user2_id. The primary key
+# (user1_id, user2_id) answers pair lookups and "friends where I am user1"; this index
+# answers "friends where I am user2", so every friend lookup is a single index seek.
+FRIENDSHIPS_REVERSE_INDEX = "idx_friendships_user2_user1"
+
+def canonical_pair(user_id1, user_id2):
+    """
+    Order two user ids the way Friendships stores them.
+
+    Ids are compared as ints, so "10" and "9" are not ordered as strings.
+
+    Returns:
+        tuple: (smaller id, larger id)
+
+    Raises:
+        ValueError: If an id is not an integer
+    """
+    user_id1, user_id2 = int(user_id1), int(user_id2)
+    return (user_id1, user_id2) if user_id1 < user_id2 else (user_id2, user_id1)
+
+def migrate_canonical_friendships():
+    """
+    Rewrite existing Friendships rows as canonical pairs and add the reverse index.
+
+    A pair stored in both directions keeps its canonical row. Pairs stored
+    only as (larger, smaller) are swapped. The migration can be run again
+    safely.
+
+    Returns:
+        dict: Counts of rows dropped as duplicates and rows swapped
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        if not connection:
+            return None
+
+        cursor = connection.cursor()
+
+        # Pairs stored in both directions: drop the reversed copy
+        cursor.execute("""
+            DELETE f FROM Friendships f
+            JOIN Friendships c ON c.user1_id = f.user2_id AND c.user2_id = f.user1_id
+            WHERE f.user1_id > f.user2_id
+        """)
+        duplicates = cursor.rowcount
+
+        # Swap the rest by copying them across and removing the originals; a single-table
+        # UPDATE cannot swap two columns in MySQL, which assigns left to right
+        cursor.execute("""
+            INSERT INTO Friendships (user1_id, user2_id, chat_id)
+            SELECT user2_id, user1_id, chat_id FROM Friendships WHERE user1_id > user2_id
+        """)
+        cursor.execute("DELETE FROM Friendships WHERE user1_id > user2_id")
+        swapped = cursor.rowcount
+
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'Friendships' AND INDEX_NAME = %s
+        """, (FRIENDSHIPS_REVERSE_INDEX,))
+        if not cursor.fetchone()[0]:
+            cursor.execute(f"CREATE INDEX {FRIENDSHIPS_REVERSE_INDEX} ON Friendships (user2_id, user1_id)")
+
+        connection.commit()
+        return {"duplicates_removed": duplicates, "rows_swapped": swapped}
+    except Exception as e:
+        print(f"Error in migrate_canonical_friendships: {str(e)}")
+        if connection:
+            connection.rollback()
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+if __name__ == "__main__":
+    print("Migrating Friendships to canonical pairs...")
+    print(migrate_canonical_friendships())
@@ -0,0 +1,221 @@
+import threading
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+from .connection import get_connection
+from .friend_graph import get_friend_graph
+
+# Seconds between background rebuilds of the similarity model
+REFRESH_SECONDS = 10 * 60
+
+# Most similar groups kept per group
+NEIGHBORS_PER_GROUP = 50
+
+# A group that n friends belong to scores like n * FRIEND_WEIGHT of item-item similarity
+FRIEND_WEIGHT = 0.5
+
+# Interest-matched groups get this bonus when merged with the collaborative list
+INTEREST_MATCH_BONUS = 1.0
+
+
+class GroupSimilarityModel:
+    """
+    Item-item cosine similarity between groups, computed from the sparse
+    user x group membership matrix.
+    """
+
+    def __init__(self, memberships):
+        memberships = np.asarray(list(memberships), dtype=np.int64).reshape(-1, 2)
+        self.user_ids, user_rows = np.unique(memberships[:, 0], return_inverse=True)
+        self.group_ids, group_cols = np.unique(memberships[:, 1], return_inverse=True)
+        self._user_index = {int(u): i for i, u in enumerate(self.user_ids)}
+        self._group_index = {int(g): j for j, g in enumerate(self.group_ids)}
+
+        matrix = csr_matrix(
+            (np.ones(len(memberships), dtype=np.float32), (user_rows, group_cols)),
+            shape=(len(self.user_ids), len(self.group_ids))
+        )
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        self.memberships = matrix
+
+        # Cosine similarity: co-membership counts scaled by both groups' sizes
+        co_members = (matrix.T @ matrix).tocsr()
+        sizes = np.sqrt(np.asarray(co_members.diagonal(), dtype=np.float32))
+        sizes[sizes == 0] = 1
+        inverse = diags(1 / sizes)
+        similarity = (inverse @ co_members @ inverse).tocsr()
+        similarity.setdiag(0)
+        similarity.eliminate_zeros()
+        self.similarity = self._keep_top_neighbors(similarity)
+        self.built_at = time.time()
+
+    @staticmethod
+    def _keep_top_neighbors(similarity):
+        rows, cols, data = [], [], []
+        for i in range(similarity.shape[0]):
+            start, end = similarity.indptr[i], similarity.indptr[i + 1]
+            row_data = similarity.data[start:end]
+            keep = np.argsort(-row_data)[:NEIGHBORS_PER_GROUP]
+            rows.append(np.full(len(keep), i))
+            cols.append(similarity.indices[start:end][keep])
+            data.append(row_data[keep])
+        if not rows:
+            return similarity
+        return csr_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+            shape=similarity.shape
+        )
+
+    def _rows(self, user_ids):
+        return [self._user_index[u] for u in user_ids if u in self._user_index]
+
+    def recommend(self, user_id, friend_ids=(), limit=15):
+        """
+        Rank groups the user is not in by similarity to their groups and by friends' membership.
+
+        Returns:
+            list: (group_id, score) tuples, best first
+        """
+        n_groups = len(self.group_ids)
+        scores = np.zeros(n_groups, dtype=np.float32)
+        own = np.zeros(0, dtype=np.int64)
+
+        rows = self._rows([user_id])
+        if rows:
+            user_row = self.memberships[rows[0]]
+            own = user_row.indices
+            scores += np.asarray((user_row @ self.similarity).todense()).ravel()
+
+        friend_rows = self._rows(friend_ids)
+        if friend_rows:
+            scores += FRIEND_WEIGHT * np.asarray(self.memberships[friend_rows].sum(axis=0)).ravel()
+
+        scores[own] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if not len(candidates):
+            return []
+        best = candidates[np.argsort(-scores[candidates], kind='stable')[:limit]]
+        return [(int(self.group_ids[j]), float(scores[j])) for j in best]
+
+
+_model = None
+_model_lock = threading.Lock()
+_refresher = None
+
+
+def _build_model():
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT user_id, group_id FROM Group_Members")
+        return GroupSimilarityModel(cursor.fetchall())
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+def _refresh_forever():
+    global _model
+    while True:
+        time.sleep(REFRESH_SECONDS)
+        try:
+            _model = _build_model()
+        except Exception as e:
+            print(f"Error refreshing group similarity model: {str(e)}")
+
+
+def get_group_similarity_model():
+    """
+    Get the current model, building it on first use and starting the background refresher.
+    """
+    global _model, _refresher
+    with _model_lock:
+        if _model is None:
+            _model = _build_model()
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_forever, daemon=True)
+            _refresher.start()
+        return _model
+
+
+def merge_cf_recommendations(cursor, user_id, groups, limit, columns):
+    """
+    Merge interest-matched groups with the collaborative-filtering ranking.
+
+    Args:
+        cursor: A DictCursor used to load groups that only the CF model found
+        user_id (int): The ID of the user
+        groups (list): Interest-matched group rows from the caller's query
+        limit (int): Number of groups to return
+        columns (list): Keys to keep on rows loaded for CF-only groups, matching `groups`
+
+    Returns:
+        list: Group rows with the given columns plus a 'cf_score' key
+    """
+    model = get_group_similarity_model()
+    cf_scores = model.recommend(user_id, get_friend_graph().friends(user_id), limit * 2)
+
+    def load_missing(missing_ids):
+        placeholders = ', '.join(['%s'] * len(missing_ids))
+        cursor.execute(f"""
+            SELECT
+                g.group_id,
+                g.group_name,
+                g.created_at,
+                COALESCE(gs.member_count, 0) AS member_count,
+                COALESCE(gs.message_count, 0) AS message_count,
+                COALESCE(gs.event_count, 0) AS event_count
+            FROM `Group` g
+            LEFT JOIN Group_Stats gs ON g.group_id = gs.group_id
+            WHERE g.group_id IN ({placeholders})
+            AND g.group_id NOT IN (
+                SELECT group_id FROM Group_Members WHERE user_id = %s
+            )
+        """, missing_ids + [user_id])
+        return [{column: row[column] for column in columns} for row in cursor.fetchall()]
+
+    return blend_cf_scores(groups, cf_scores, load_missing, limit)
+
+
+def blend_cf_scores(groups, cf_scores, load_missing, limit):
+    """
+    Rank interest-matched groups and CF-recommended groups together.
+
+    Args:
+        groups (list): Interest-matched group dictionaries
+        cf_scores (list): (group_id, score) tuples from GroupSimilarityModel.recommend
+        load_missing (callable): Given the ids only the CF model found, returns group
+            dictionaries for the ones the user may join
+        limit (int): Number of groups to return
+
+    Returns:
+        list: The groups plus a 'cf_score' key, best first
+    """
+    cf_scores = dict(cf_scores)
+    merged = {group['group_id']: group for group in groups}
+    missing_ids = [group_id for group_id in cf_scores if group_id not in merged]
+    if missing_ids:
+        found = {group['group_id']: group for group in load_missing(missing_ids)}
+        # In CF order, so ties come out the same however the rows were loaded
+        for group_id in missing_ids:
+            if group_id in found:
+                merged[group_id] = found[group_id]
+
+    interest_ids = {group['group_id'] for group in groups}
+    ranks = {}
+    for group_id, group in merged.items():
+        group['cf_score'] = round(cf_scores.get(group_id, 0.0), 4)
+        ranks[group_id] = group['cf_score'] + (INTEREST_MATCH_BONUS if group_id in interest_ids else 0)
+
+    ranked = sorted(
+        merged.values(),
+        key=lambda g: (-ranks[g['group_id']], -(g.get('member_count') or 0))
+    )
+    return ranked[:limit]
@@ -1,23 +1,113 @@
+import base64
+import json
+
 from .connection import get_connection
+from .post_commit import after_commit
+from .account_deletion import is_account_tombstoned
+from .group_stats import bump_group_stats, ensure_group_stats_table
+from .activity_counters import record_group_activity
+from .group_cf import merge_cf_recommendations
+from .resource_versions import (
+    GROUP_EVENTS, bump_resource_versions, ensure_resource_versions_table, membership_resources
+)
+from .streaming import stream_rows
+from .trigram_index import get_group_name_index
+from .trending import get_trending_leaderboard, record_trending_activity
 from pymysql.cursors import DictCursor
 
-def get_all_groups():
+# Groups per search page when the caller does not ask for a size, and the most it may ask for
+SEARCH_PAGE_SIZE = 50
+SEARCH_PAGE_MAX = 200
+
+# Fields a group list can be narrowed to with fields=, as (SELECT expression, join it needs).
+# Queries using these always pass parameters (if only ()), so '%%' reaches MySQL as '%'.
+GROUP_FIELDS = {
+    'group_id': ("g.group_id", None),
+    'group_name': ("g.group_name", None),
+    'created_by': ("g.created_by", None),
+    'chat_id': ("g.chat_id", None),
+    # Formatted by MySQL, so listing groups needs no per-row Python pass over the dates
+    'created_at': ("DATE_FORMAT(g.created_at, '%%a, %%d %%b %%Y %%H:%%i:%%s GMT') AS created_at", None),
+    'interest_id': ("g.interest_id", None),
+    'member_count': ("COALESCE(gs.member_count, 0) as member_count", 'stats'),
+    'is_member': ("my.user_id IS NOT NULL as is_member", 'membership'),
+}
+
+_GROUP_JOINS = {
+    'stats': "LEFT JOIN Group_Stats gs ON g.group_id = gs.group_id",
+    'membership': "LEFT JOIN Group_Members my ON my.group_id = g.group_id AND my.user_id = %s",
+}
+
+def _project_group_fields(fields, default, required=('group_id',)):
+    """
+    Build the SELECT list and joins for the requested group fields.
+    
+    Args:
+        fields (list): Requested field names, or None for the endpoint's default set
+        default (list): The fields the endpoint returns when none are requested
+        required (tuple): Fields the query itself needs (ids, sort keys)
+        
+    Returns:
+        tuple: (SELECT list, joins in the order they must appear, fields to drop
+        from the rows before returning them)
+        
+    Raises:
+        ValueError: If a requested field is unknown or not offered by the endpoint
+    """
+    requested = list(dict.fromkeys(fields if fields is not None else default))
+    unknown = [field for field in requested if field not in default]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    
+    # The id always comes back so clients can key rows; other required fields are only for the query
+    selected = list(dict.fromkeys(['group_id'] + requested + list(required)))
+    hidden = [field for field in selected if field not in requested and field != 'group_id']
+    joins = [join for join in _GROUP_JOINS if any(GROUP_FIELDS[field][1] == join for field in selected)]
+    columns = ', '.join(GROUP_FIELDS[field][0] for field in selected)
+    return columns, joins, hidden
+
+def _format_group_rows(groups, hidden):
+    for group in groups:
+        for field in hidden:
+            group.pop(field, None)
+        if 'is_member' in group:
+            group['is_member'] = bool(group['is_member'])
+    return groups
+
+def get_all_groups(fields=None):
+    """
+    Get every group.
+    
+    Args:
+        fields (list, optional): Only return these GROUP_FIELDS (default: all but is_member)
+        
+    Returns:
+        list: A list of dictionaries, one per group, or {"error": ...} for unknown fields
+    """
     connection = None
     cursor = None
     try:
+        try:
+            columns, joins, hidden = _project_group_fields(
+                fields, [field for field in GROUP_FIELDS if field != 'is_member'])
+        except ValueError as e:
+            return {"error": str(e)}
+        if 'stats' in joins:
+            ensure_group_stats_table()
+        
         connection = get_connection()
         if not connection:
             return None
             
         cursor = connection.cursor(DictCursor)
-        cursor.execute("""
-            SELECT g.*, COUNT(gm.user_id) as member_count 
+        # The Group_Stats join is only made when member_count is asked for
+        cursor.execute(f"""
+            SELECT {columns} 
             FROM `Group` g 
-            LEFT JOIN Group_Members gm ON g.group_id = gm.group_id 
-            GROUP BY g.group_id
-        """)
+            {' '.join(_GROUP_JOINS[join] for join in joins)}
+        """, ())
         groups = cursor.fetchall()
-        return groups
+        return _format_group_rows(groups, hidden)
     except Exception as e:
         print(f"Error in get_all_groups: {str(e)}")
         return None
@@ -27,10 +117,39 @@ def get_all_groups():
         if connection:
             connection.close()
 
+def stream_all_groups(fields=None):
+    """
+    Like get_all_groups, but yields the groups from a server-side cursor as they are read.
+    
+    Args:
+        fields (list, optional): Only return these GROUP_FIELDS (default: all but is_member)
+        
+    Returns:
+        generator: The groups, {"error": ...} for unknown fields, or None on a database error
+    """
+    try:
+        columns, joins, hidden = _project_group_fields(
+            fields, [field for field in GROUP_FIELDS if field != 'is_member'])
+    except ValueError as e:
+        return {"error": str(e)}
+    if 'stats' in joins:
+        try:
+            ensure_group_stats_table()
+        except Exception as e:
+            print(f"Error in stream_all_groups: {str(e)}")
+            return None
+    
+    return stream_rows(f"""
+        SELECT {columns} 
+        FROM `Group` g 
+        {' '.join(_GROUP_JOINS[join] for join in joins)}
+    """, (), transform=lambda group: _format_group_rows([group], hidden)[0])
+
 def get_group_recommendations(user_id):
     connection = None
     cursor = None
     try:
+        ensure_group_stats_table()
         connection = get_connection()
         if not connection:
             return None
@@ -40,11 +159,11 @@ def get_group_recommendations(user_id):
             SELECT
                 g.group_id,
                 g.group_name,
-                COUNT(gm.user_id) AS member_count
+                COALESCE(gs.member_count, 0) AS member_count
             FROM
                 `Group` g
                 JOIN User_Interests ui ON g.interest_id = ui.interest_id
-                LEFT JOIN Group_Members gm ON g.group_id = gm.group_id
+                LEFT JOIN Group_Stats gs ON g.group_id = gs.group_id
             WHERE
                 ui.user_id = %s
                 AND g.group_id NOT IN (
@@ -55,16 +174,16 @@ def get_group_recommendations(user_id):
                     WHERE
                         user_id = %s
                 )
-            GROUP BY
-                g.group_id,
-                g.group_name
             ORDER BY
                 member_count DESC
             LIMIT
                 15
         """, (user_id, user_id))
         recommendations = cursor.fetchall()
-        return recommendations
+        return merge_cf_recommendations(
+            cursor, user_id, recommendations, 15,
+            ['group_id', 'group_name', 'member_count']
+        )
     except Exception as e:
         print(f"Error in get_group_recommendations: {str(e)}")
         return None
@@ -74,19 +193,29 @@ def get_group_recommendations(user_id):
         if connection:
             connection.close()
 
-def get_user_groups(user_id):
+def get_user_groups(user_id, fields=None):
     """
     Get all groups where a user is a member.
     
     Args:
         user_id (int): The ID of the user
+        fields (list, optional): Only return these GROUP_FIELDS (default: all but is_member)
         
     Returns:
-        list: A list of dictionaries containing all groups the user is a member of
+        list: A list of dictionaries containing all groups the user is a member of,
+        or {"error": ...} for unknown fields
     """
     connection = None
     cursor = None
     try:
+        try:
+            columns, joins, hidden = _project_group_fields(
+                fields, [field for field in GROUP_FIELDS if field != 'is_member'])
+        except ValueError as e:
+            return {"error": str(e)}
+        if 'stats' in joins:
+            ensure_group_stats_table()
+        
         connection = get_connection()
         if not connection:
             return None
@@ -94,25 +223,16 @@ def get_user_groups(user_id):
         cursor = connection.cursor(DictCursor)
         
         # Get all groups where the user is a member
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
-                g.group_id,
-                g.group_name,
-                g.created_at,
-                g.created_by,
-                g.interest_id,
-                g.chat_id,
-                COUNT(gm2.user_id) as member_count
+                {columns}
             FROM 
                 `Group` g
             JOIN 
                 Group_Members gm ON g.group_id = gm.group_id
-            LEFT JOIN 
-                Group_Members gm2 ON g.group_id = gm2.group_id
+            {' '.join(_GROUP_JOINS[join] for join in joins)}
             WHERE 
                 gm.user_id = %s
-            GROUP BY 
-                g.group_id
             ORDER BY 
                 g.created_at DESC
         """, (user_id,))
@@ -120,11 +240,7 @@ def get_user_groups(user_id):
         groups = cursor.fetchall()
         
         # Format the created_at timestamps
-        for group in groups:
-            if group['created_at']:
-                group['created_at'] = group['created_at'].strftime('%a, %d %b %Y %H:%M:%S GMT')
-                
-        return groups
+        return _format_group_rows(groups, hidden)
     except Exception as e:
         print(f"Error in get_user_groups: {str(e)}")
         return None
@@ -153,6 +269,10 @@ def add_user_to_group(user_id, group_id):
             return None
             
         cursor = connection.cursor(DictCursor)
+        ensure_resource_versions_table(cursor)
+        
+        if is_account_tombstoned(cursor, user_id):
+            return {"error": "User not found"}
         
         # Check if the user is already a member of the group
         cursor.execute("""
@@ -186,6 +306,8 @@ def add_user_to_group(user_id, group_id):
             INSERT INTO Group_Members (user_id, group_id) 
             VALUES (%s, %s)
         """, (user_id, group_id))
+        bump_group_stats(cursor, group_id, members=1)
+        bump_resource_versions(cursor, membership_resources(group_id, user_id))
         
         connection.commit()
         
@@ -313,6 +435,83 @@ def get_group_events(group_id):
         if connection:
             connection.close()
 
+def create_group_event(group_id, user_id, event_name):
+    """
+    Create an event in a group.
+    
+    Args:
+        group_id (int): The ID of the group
+        user_id (int): The ID of the user creating the event
+        event_name (str): The name of the event
+        
+    Returns:
+        dict: A dictionary containing the created event
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        if not connection:
+            return None
+            
+        cursor = connection.cursor(DictCursor)
+        ensure_resource_versions_table(cursor)
+        
+        if is_account_tombstoned(cursor, user_id):
+            return {"error": "User not found"}
+        
+        # Check if the user is a member of the group
+        cursor.execute("""
+            SELECT 1 FROM Group_Members 
+            WHERE group_id = %s AND user_id = %s
+        """, (group_id, user_id))
+        
+        if not cursor.fetchone():
+            return {"error": "User is not a member of this group"}
+        
+        # Get the latest event_id and increment by 1
+        cursor.execute("SELECT MAX(event_id) as max_id FROM Event")
+        result = cursor.fetchone()
+        next_event_id = (result['max_id'] or 0) + 1
+        
+        cursor.execute("""
+            INSERT INTO Event (event_id, event_name, group_id, created_by) 
+            VALUES (%s, %s, %s, %s)
+        """, (next_event_id, event_name, group_id, user_id))
+        bump_group_stats(cursor, group_id, events=1)
+        bump_resource_versions(cursor, [GROUP_EVENTS.format(group_id)])
+        
+        connection.commit()
+        after_commit(record_group_activity, group_id, events=1)
+        after_commit(record_trending_activity, group_id, events=1)
+        
+        cursor.execute("""
+            SELECT 
+                e.event_id,
+                e.event_name,
+                e.group_id,
+                e.created_by,
+                u.full_name as creator_name
+            FROM 
+                Event e
+            JOIN 
+                User u ON e.created_by = u.user_id
+            WHERE 
+                e.event_id = %s
+        """, (next_event_id,))
+        
+        return cursor.fetchone()
+    except Exception as e:
+        print(f"Error in create_group_event: {str(e)}")
+        if connection:
+            connection.rollback()
+        return {"error": str(e)}
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
 def remove_user_from_group(group_id, user_id):
     """
     Remove a user from a group.
@@ -332,6 +531,7 @@ def remove_user_from_group(group_id, user_id):
             return None
             
         cursor = connection.cursor(DictCursor)
+        ensure_resource_versions_table(cursor)
         
         # First verify the group exists
         cursor.execute("SELECT * FROM `Group` WHERE group_id = %s", (group_id,))
@@ -353,6 +553,8 @@ def remove_user_from_group(group_id, user_id):
             DELETE FROM Group_Members 
             WHERE group_id = %s AND user_id = %s
         """, (group_id, user_id))
+        bump_group_stats(cursor, group_id, members=-1)
+        bump_resource_versions(cursor, membership_resources(group_id, user_id))
         
         connection.commit()
         
@@ -369,59 +571,117 @@ def remove_user_from_group(group_id, user_id):
         if connection:
             connection.close()
 
-def search_groups(search_term, limit=None, current_user_id=None):
+def _encode_search_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def _decode_search_cursor(cursor_token, search_term):
+    # Term searches page by the index's (tier, position, length, group_id) rank key;
+    # listings page by (group_name, group_id)
+    key = json.loads(base64.urlsafe_b64decode(cursor_token.encode()))
+    types = (int, int, int, int) if search_term else (str, int)
+    if not isinstance(key, list) or len(key) != len(types) or not all(
+        isinstance(value, expected) and not isinstance(value, bool)
+        for value, expected in zip(key, types)
+    ):
+        raise ValueError("cursor does not match the search")
+    return key
+
+def search_groups(search_term, limit=None, current_user_id=None, after=None, fields=None):
     """
-    Search for groups by name.
+    Search for groups by name, one page at a time.
+    
+    With a search term, groups come back in the trigram index's relevance order;
+    without one, every group is listed by name. Either way the page ends with a
+    cursor that picks up exactly where it stopped, so later pages cost the same
+    as the first.
     
     Args:
         search_term (str): The search term to match against group names
-        limit (int, optional): Limit the number of results (default: None)
+        limit (int, optional): Page size (default: SEARCH_PAGE_SIZE, at most SEARCH_PAGE_MAX)
         current_user_id (int, optional): The ID of the current user (default: None)
+        after (str, optional): The next_cursor returned with the previous page (default: None)
+        fields (list, optional): Only return these GROUP_FIELDS (default: all of them)
         
     Returns:
-        list: A list of dictionaries containing matched groups
+        dict: "groups" (the page), "next_cursor" (None on the last page) and
+        "total_estimate" (how many groups match overall)
     """
+    limit = min(limit or SEARCH_PAGE_SIZE, SEARCH_PAGE_MAX)
     connection = None
     cursor = None
     try:
+        try:
+            after_key = _decode_search_cursor(after, search_term) if after else None
+        except Exception:
+            return {"error": "Invalid cursor"}
+        try:
+            # group_name is the keyset sort key when listing without a term
+            columns, joins, hidden = _project_group_fields(fields, list(GROUP_FIELDS), ('group_id', 'group_name'))
+        except ValueError as e:
+            return {"error": str(e)}
+        if 'stats' in joins:
+            ensure_group_stats_table()
+
+        index = get_group_name_index()
+        next_key = None
+        name_ids = None
+        if search_term:
+            # Substring matching goes through the trigram index instead of LIKE '%term%';
+            # one extra id tells us whether there is another page
+            keys, total_estimate = index.search_page(search_term, limit + 1, after_key)
+            if len(keys) > limit:
+                keys = keys[:limit]
+                next_key = list(keys[-1])
+            name_ids = [key[-1] for key in keys]
+            if not name_ids:
+                return {"groups": [], "next_cursor": None, "total_estimate": total_estimate}
+        else:
+            # Listing everything; the index already holds one entry per group
+            total_estimate = index.size
+        
         connection = get_connection()
         if not connection:
             return None
             
         cursor = connection.cursor(DictCursor)
         
-        # Build the search query
-        query = """
-            SELECT g.*, COUNT(gm.user_id) as member_count,
-            CASE WHEN EXISTS (
-                SELECT 1 FROM Group_Members 
-                WHERE group_id = g.group_id AND user_id = %s
-            ) THEN TRUE ELSE FALSE END as is_member
+        # is_member is one join against the (user_id, group_id) key instead of a per-row EXISTS;
+        # it and the Group_Stats join are only made when their fields are asked for
+        query = f"""
+            SELECT {columns}
             FROM `Group` g 
-            LEFT JOIN Group_Members gm ON g.group_id = gm.group_id 
-            WHERE g.group_name LIKE %s 
-            GROUP BY g.group_id
-            ORDER BY g.group_name ASC
+            {' '.join(_GROUP_JOINS[join] for join in joins)}
         """
+        params = [current_user_id or 0] if 'membership' in joins else []
         
-        # Add limit if specified
-        if limit:
-            query += " LIMIT %s"
-            
-        # Execute the query with or without limit
-        if limit:
-            cursor.execute(query, (current_user_id or 0, f"%{search_term}%", limit))
+        if name_ids is not None:
+            query += f" WHERE g.group_id IN ({', '.join(['%s'] * len(name_ids))})"
+            params += name_ids
         else:
-            cursor.execute(query, (current_user_id or 0, f"%{search_term}%"))
+            if after_key:
+                query += " WHERE (g.group_name, g.group_id) > (%s, %s)"
+                params += after_key
+            query += " ORDER BY g.group_name ASC, g.group_id ASC LIMIT %s"
+            params.append(limit + 1)
             
-        groups = cursor.fetchall()
-        
-        # Format timestamps
-        for group in groups:
-            if group['created_at']:
-                group['created_at'] = group['created_at'].strftime('%a, %d %b %Y %H:%M:%S GMT')
+        cursor.execute(query, params)
+        groups = list(cursor.fetchall())
+        
+        if name_ids is not None:
+            # Keep the index's relevance order
+            rank = {matched_id: position for position, matched_id in enumerate(name_ids)}
+            groups.sort(key=lambda group: rank[group['group_id']])
+        elif len(groups) > limit:
+            groups = groups[:limit]
+            next_key = [groups[-1]['group_name'], groups[-1]['group_id']]
+        
+        _format_group_rows(groups, hidden)
                 
-        return groups
+        return {
+            "groups": groups,
+            "next_cursor": _encode_search_cursor(next_key) if next_key else None,
+            "total_estimate": total_estimate
+        }
     except Exception as e:
         print(f"Error in search_groups: {str(e)}")
         return None
@@ -444,6 +704,7 @@ def get_group_by_id(group_id):
     connection = None
     cursor = None
     try:
+        ensure_group_stats_table()
         connection = get_connection()
         if not connection:
             return None
@@ -459,15 +720,15 @@ def get_group_by_id(group_id):
                 g.created_by,
                 g.interest_id,
                 g.chat_id,
-                COUNT(gm.user_id) as member_count
+                COALESCE(gs.member_count, 0) as member_count,
+                COALESCE(gs.message_count, 0) as message_count,
+                COALESCE(gs.event_count, 0) as event_count
             FROM 
                 `Group` g
             LEFT JOIN 
-                Group_Members gm ON g.group_id = gm.group_id
+                Group_Stats gs ON g.group_id = gs.group_id
             WHERE 
                 g.group_id = %s
-            GROUP BY 
-                g.group_id
         """, (group_id,))
         
         group = cursor.fetchone()
@@ -483,4 +744,52 @@ def get_group_by_id(group_id):
         if cursor:
             cursor.close()
         if connection:
-            connection.close() 
+            connection.close()
+
+def get_trending_groups(limit=10):
+    """
+    Get the groups with the most recent activity, weighted toward the last few hours.
+    
+    Args:
+        limit (int): Number of groups to return (default: 10)
+        
+    Returns:
+        list: A list of dictionaries containing trending groups and their scores
+    """
+    connection = None
+    cursor = None
+    try:
+        ranking = get_trending_leaderboard().top(limit)
+        if not ranking:
+            return []
+            
+        connection = get_connection()
+        if not connection:
+            return None
+            
+        cursor = connection.cursor(DictCursor)
+        
+        group_ids = [group_id for group_id, _ in ranking]
+        placeholders = ', '.join(['%s'] * len(group_ids))
+        cursor.execute(f"""
+            SELECT group_id, group_name, created_at
+            FROM `Group`
+            WHERE group_id IN ({placeholders})
+        """, group_ids)
+        groups_by_id = {group['group_id']: group for group in cursor.fetchall()}
+        
+        groups = []
+        for group_id, score in ranking:
+            group = groups_by_id.get(group_id)
+            if group:
+                group['trending_score'] = round(score, 3)
+                groups.append(group)
+        return groups
+    except Exception as e:
+        print(f"Error in get_trending_groups: {str(e)}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
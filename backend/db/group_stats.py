@@ -0,0 +1,121 @@
+import threading
+
+from .connection import get_connection
+from .resource_versions import ALL_GROUPS, bump_resource_versions, ensure_resource_versions_table
+
+# Pre-aggregated per-group counters, kept current by the membership, message and event write paths
+CREATE_GROUP_STATS_TABLE = """
+    CREATE TABLE IF NOT EXISTS Group_Stats (
+        group_id INTEGER PRIMARY KEY,
+        member_count INTEGER NOT NULL DEFAULT 0,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        event_count INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (group_id) REFERENCES `Group`(group_id)
+    )
+"""
+
+# Each count is its own correlated subquery so the tables never fan out against each other
+BACKFILL_GROUP_STATS = """
+    INSERT INTO Group_Stats (group_id, member_count, message_count, event_count)
+    SELECT
+        g.group_id,
+        (SELECT COUNT(*) FROM Group_Members gm WHERE gm.group_id = g.group_id),
+        (SELECT COUNT(*) FROM Messages m WHERE m.chat_id = g.chat_id),
+        (SELECT COUNT(*) FROM Event e WHERE e.group_id = g.group_id)
+    FROM `Group` g
+    ON DUPLICATE KEY UPDATE
+        member_count = VALUES(member_count),
+        message_count = VALUES(message_count),
+        event_count = VALUES(event_count)
+"""
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+def ensure_group_stats_table():
+    """
+    Create and fill the Group_Stats table the first time this process needs it.
+
+    Runs on its own connection, so it is safe to call from inside a caller's
+    transaction: the implicit commit of CREATE TABLE does not touch it, and a
+    counter bumped afterwards is applied on top of the backfill. Every query
+    that reads or bumps Group_Stats calls this first.
+    """
+    global _table_ready
+    with _table_lock:
+        if _table_ready:
+            return
+        connection = get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SHOW TABLES LIKE 'Group_Stats'")
+            if cursor.fetchone() is None:
+                cursor.execute(CREATE_GROUP_STATS_TABLE)
+                cursor.execute(BACKFILL_GROUP_STATS)
+                connection.commit()
+            _table_ready = True
+        finally:
+            cursor.close()
+            connection.close()
+
+def bump_group_stats(cursor, group_id, members=0, messages=0, events=0):
+    """
+    Adjust a group's counters inside the caller's transaction.
+
+    Args:
+        cursor: A cursor on the connection doing the write
+        group_id (int): The ID of the group
+        members (int): Change in member count
+        messages (int): Change in message count
+        events (int): Change in event count
+    """
+    ensure_group_stats_table()
+    cursor.execute("""
+        INSERT INTO Group_Stats (group_id, member_count, message_count, event_count)
+        VALUES (%s, GREATEST(%s, 0), GREATEST(%s, 0), GREATEST(%s, 0))
+        ON DUPLICATE KEY UPDATE
+            member_count = GREATEST(member_count + %s, 0),
+            message_count = GREATEST(message_count + %s, 0),
+            event_count = GREATEST(event_count + %s, 0)
+    """, (group_id, members, messages, events, members, messages, events))
+
+def rebuild_group_stats():
+    """
+    Create the Group_Stats table if needed and recompute every group's counters.
+
+    Returns:
+        int: The number of groups written
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        if not connection:
+            return None
+
+        cursor = connection.cursor()
+        cursor.execute(CREATE_GROUP_STATS_TABLE)
+        ensure_resource_versions_table(cursor)
+
+        cursor.execute(BACKFILL_GROUP_STATS)
+        cursor.execute("SELECT COUNT(*) FROM Group_Stats")
+        count = cursor.fetchone()[0]
+        # member_count is part of every group list, so cached copies of them are now stale
+        bump_resource_versions(cursor, [ALL_GROUPS])
+
+        connection.commit()
+        return count
+    except Exception as e:
+        print(f"Error in rebuild_group_stats: {str(e)}")
+        if connection:
+            connection.rollback()
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+if __name__ == "__main__":
+    print("Rebuilding Group_Stats...")
+    print(f"Wrote stats for {rebuild_group_stats()} groups")
@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from .connection import get_connection
+
+# Recall/speed trade-off: more bands with fewer rows each catches less similar users too.
+# Two users with Jaccard similarity s share at least one bucket with probability 1 - (1 - s^ROWS)^BANDS.
+LSH_BANDS = int(os.getenv('LSH_BANDS', '32'))
+LSH_ROWS = int(os.getenv('LSH_ROWS', '2'))
+
+# Upper bound on the shortlist handed to exact scoring
+MAX_CANDIDATES = int(os.getenv('LSH_MAX_CANDIDATES', '300'))
+
+# Reload from the database after this many seconds so other instances' writes show up
+MAX_AGE_SECONDS = 15 * 60
+
+_PRIME = (1 << 31) - 1
+
+
+class InterestLSH:
+    """
+    MinHash signatures of each user's interest set, bucketed by band.
+
+    Users that land in the same bucket for any band are likely to share
+    interests, so the union of a user's buckets is a small candidate set
+    that exact scoring can run on instead of the whole interest self-join.
+    """
+
+    def __init__(self, bands=LSH_BANDS, rows=LSH_ROWS, seed=411):
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=bands * rows).astype(np.int64)
+        self._b = rng.randint(0, _PRIME, size=bands * rows).astype(np.int64)
+        self._lock = threading.Lock()
+        self._interests = {}
+        self._keys = {}
+        self._buckets = {}
+        self.loaded_at = time.time()
+
+    def _band_keys(self, interest_ids):
+        values = np.fromiter(interest_ids, dtype=np.int64)
+        # One universal hash per row of the signature, minimised over the set
+        signature = ((self._a[:, None] * values[None, :] + self._b[:, None]) % _PRIME).min(axis=1)
+        return [
+            (band, hash(signature[band * self.rows:(band + 1) * self.rows].tobytes()))
+            for band in range(self.bands)
+        ]
+
+    def _remove(self, user_id):
+        for key in self._keys.pop(user_id, ()):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self._buckets[key]
+        self._interests.pop(user_id, None)
+
+    def set_user_interests(self, user_id, interest_ids):
+        interest_ids = frozenset(interest_ids)
+        with self._lock:
+            self._remove(user_id)
+            if not interest_ids:
+                return
+            keys = self._band_keys(interest_ids)
+            self._interests[user_id] = interest_ids
+            self._keys[user_id] = keys
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(user_id)
+
+    def apply_change(self, user_id, added, removed):
+        with self._lock:
+            interests = (self._interests.get(user_id, frozenset()) - set(removed)) | set(added)
+        self.set_user_interests(user_id, interests)
+
+    def remove_user(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    @property
+    def user_count(self):
+        return len(self._interests)
+
+    def candidates(self, user_id, limit=MAX_CANDIDATES):
+        """
+        Get users likely to share interests with a user.
+
+        Args:
+            user_id (int): The ID of the user
+            limit (int): Maximum number of candidates
+
+        Returns:
+            list: Candidate user ids, those sharing the most buckets first
+        """
+        with self._lock:
+            collisions = {}
+            for key in self._keys.get(user_id, ()):
+                for other_id in self._buckets.get(key, ()):
+                    collisions[other_id] = collisions.get(other_id, 0) + 1
+        collisions.pop(user_id, None)
+        ranked = sorted(collisions, key=lambda other_id: -collisions[other_id])
+        return ranked[:limit]
+
+    def _top_by_common(self, user_id, other_ids, k):
+        interests = self._interests.get(user_id, frozenset())
+        scored = [
+            (len(interests & self._interests.get(other_id, frozenset())), other_id)
+            for other_id in other_ids if other_id != user_id
+        ]
+        scored = [item for item in scored if item[0] > 0]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored[:k]
+
+    def measure_recall(self, user_ids, k=15):
+        """
+        Compare LSH-shortlisted top-k results against brute force for a sample of users.
+
+        Recall for a user is the fraction of its exact top-k shared-interest
+        counts that the shortlist also reaches, so ties are not penalised.
+
+        Returns:
+            float: Mean recall over the sampled users that have any match
+        """
+        recalls = []
+        everyone = list(self._interests)
+        for user_id in user_ids:
+            exact = self._top_by_common(user_id, everyone, k)
+            if not exact:
+                continue
+            approx = self._top_by_common(user_id, self.candidates(user_id), k)
+            exact_scores = sorted(score for score, _ in exact)
+            approx_scores = sorted(score for score, _ in approx)
+            hits = 0
+            for score in approx_scores:
+                if score in exact_scores:
+                    exact_scores.remove(score)
+                    hits += 1
+            recalls.append(hits / len(exact))
+        return sum(recalls) / len(recalls) if recalls else 1.0
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _load(index):
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT user_id, interest_id FROM User_Interests")
+        interests = {}
+        for user_id, interest_id in cursor.fetchall():
+            interests.setdefault(user_id, set()).add(interest_id)
+        for user_id, interest_ids in interests.items():
+            index.set_user_interests(user_id, interest_ids)
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+def get_interest_lsh():
+    """
+    Get the process-wide LSH index, building it from User_Interests on first use.
+    """
+    global _index
+    with _index_lock:
+        if _index is None or time.time() - _index.loaded_at > MAX_AGE_SECONDS:
+            index = InterestLSH()
+            _load(index)
+            _index = index
+        return _index
+
+
+def record_interest_change(user_id, added, removed):
+    """
+    Apply a committed interest change to the index, if it is loaded.
+    """
+    if _index is not None:
+        _index.apply_change(user_id, added, removed)
+
+
+def record_interest_user_removed(user_id):
+    """
+    Drop a deleted user from the index, if it is loaded.
+    """
+    if _index is not None:
+        _index.remove_user(user_id)
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description="Measure LSH recall against brute-force matching")
+    parser.add_argument('--sample', type=int, default=200)
+    parser.add_argument('--k', type=int, default=15)
+    args = parser.parse_args()
+
+    index = get_interest_lsh()
+    users = list(index._interests)
+    sample = random.sample(users, min(args.sample, len(users)))
+    print(f"bands={index.bands} rows={index.rows} max_candidates={MAX_CANDIDATES} users={len(users)}")
+    print(f"recall@{args.k}: {index.measure_recall(sample, args.k):.3f}")
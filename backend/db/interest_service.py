@@ -0,0 +1,120 @@
+import threading
+
+from .account_deletion import is_account_tombstoned
+from .connection import get_connection
+from .interest_lsh import record_interest_change
+
+_subscribers = []
+_subscribers_lock = threading.Lock()
+
+def subscribe_interest_changes(callback):
+    """
+    Register a callback for committed interest changes.
+
+    The callback is called as callback(user_id, added, removed) with sorted
+    lists of interest ids, only when something actually changed. A failing
+    subscriber is logged and does not affect the others.
+    """
+    with _subscribers_lock:
+        if callback not in _subscribers:
+            _subscribers.append(callback)
+
+def _publish(user_id, added, removed):
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for callback in subscribers:
+        try:
+            callback(user_id, added, removed)
+        except Exception as e:
+            print(f"Error in interest change subscriber {getattr(callback, '__name__', callback)}: {str(e)}")
+
+def parse_interest_ids(interest_ids):
+    """
+    Coerce a client-supplied list of interest ids to a set of ints.
+
+    Ints and strings of digits are accepted; anything else (floats, booleans,
+    nested values) is rejected rather than silently diffed as a different id.
+
+    Raises:
+        ValueError: If the value is not a list of integer ids
+    """
+    if interest_ids is None:
+        return set()
+    # A set is what this returns, so already-parsed ids pass straight through
+    if not isinstance(interest_ids, (list, tuple, set, frozenset)):
+        raise ValueError("interests must be a list of integer ids")
+    wanted = set()
+    for interest_id in interest_ids:
+        if isinstance(interest_id, bool) or not isinstance(interest_id, (int, str)):
+            raise ValueError("interests must be a list of integer ids")
+        try:
+            wanted.add(int(interest_id))
+        except ValueError:
+            raise ValueError("interests must be a list of integer ids")
+    return wanted
+
+def set_user_interests(user_id, interest_ids):
+    """
+    Make a user's interests exactly the given set, touching only the rows that differ.
+
+    Args:
+        user_id (int): The ID of the user
+        interest_ids (list): The user's complete new list of interest IDs, as parse_interest_ids accepts
+
+    Returns:
+        dict: "added" and "removed" interest ids (sorted), or an error
+    """
+    try:
+        wanted = parse_interest_ids(interest_ids)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    connection = None
+    cursor = None
+    try:
+
+        connection = get_connection()
+        if not connection:
+            return {"error": "Database connection failed"}
+
+        cursor = connection.cursor()
+
+        if is_account_tombstoned(cursor, user_id):
+            return {"error": "User not found"}
+
+        # Lock the user's current rows so two concurrent updates diff against the same state
+        cursor.execute("SELECT interest_id FROM User_Interests WHERE user_id = %s FOR UPDATE", (user_id,))
+        current = {row[0] for row in cursor.fetchall()}
+
+        added = sorted(wanted - current)
+        removed = sorted(current - wanted)
+
+        if removed:
+            cursor.execute(
+                f"DELETE FROM User_Interests WHERE user_id = %s AND interest_id IN ({', '.join(['%s'] * len(removed))})",
+                [user_id] + removed
+            )
+        if added:
+            cursor.executemany(
+                "INSERT INTO User_Interests (user_id, interest_id) VALUES (%s, %s)",
+                [(user_id, interest_id) for interest_id in added]
+            )
+
+        connection.commit()
+    except Exception as e:
+        print(f"Error in set_user_interests: {str(e)}")
+        if connection:
+            connection.rollback()
+        return {"error": str(e)}
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+    if added or removed:
+        _publish(user_id, added, removed)
+    return {"added": added, "removed": removed}
+
+# The LSH shortlist for user recommendations re-buckets only users whose interests changed
+subscribe_interest_changes(record_interest_change)
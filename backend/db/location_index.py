@@ -0,0 +1,141 @@
+import bisect
+import threading
+import time
+import unicodedata
+
+from .connection import get_connection
+
+# Reload after this many seconds, so each instance also sees other instances' profile edits
+MAX_AGE_SECONDS = 15 * 60
+
+# Where the city part of a location ends, in the scripts users write locations in
+_SEPARATORS = (',', '\u060c', '\u3001')
+
+
+def canonicalize_location(location):
+    """
+    Reduce a free-text location to a bucket key.
+
+    Only the part before the first comma is kept, so "Champaign, IL" and
+    "champaign" land in the same bucket. Case is folded, accents on Latin
+    letters and punctuation are dropped, and whitespace is collapsed; letters
+    and digits of every script are kept, so "東京" and "Москва" stay searchable.
+
+    Returns:
+        str: The bucket key, or None if nothing usable is left
+    """
+    if not location:
+        return None
+    text = unicodedata.normalize('NFKC', location).casefold()
+    for separator in _SEPARATORS:
+        text = text.split(separator)[0]
+
+    # "São Paulo" and "Sao Paulo" share a bucket; marks in other scripts are part of the word
+    chars = []
+    for c in unicodedata.normalize('NFKD', text):
+        if unicodedata.combining(c) and chars and 'a' <= chars[-1] <= 'z':
+            continue
+        chars.append(c)
+    text = unicodedata.normalize('NFC', ''.join(chars))
+
+    text = ''.join(c if c.isalnum() or unicodedata.category(c).startswith('M') else ' ' for c in text)
+    text = ' '.join(text.split())
+    return text or None
+
+
+class LocationIndex:
+    """
+    Canonical location key -> sorted list of user ids.
+    """
+
+    def __init__(self):
+        self.loaded_at = time.time()
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._keys = {}
+
+    def _remove(self, user_id):
+        key = self._keys.pop(user_id, None)
+        if key is None:
+            return
+        bucket = self._buckets[key]
+        i = bisect.bisect_left(bucket, user_id)
+        if i < len(bucket) and bucket[i] == user_id:
+            del bucket[i]
+        if not bucket:
+            del self._buckets[key]
+
+    def set_user_location(self, user_id, location):
+        key = canonicalize_location(location)
+        with self._lock:
+            self._remove(user_id)
+            if key is None:
+                return
+            self._keys[user_id] = key
+            bisect.insort(self._buckets.setdefault(key, []), user_id)
+
+    def remove_user(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def users_at(self, location):
+        """
+        Get the sorted ids of every user whose location falls in the same bucket.
+        """
+        key = canonicalize_location(location)
+        with self._lock:
+            return list(self._buckets.get(key, ()))
+
+    def users_near(self, user_id):
+        """
+        Get the sorted ids of every other user in the same bucket as a user.
+        """
+        with self._lock:
+            key = self._keys.get(user_id)
+            return [other_id for other_id in self._buckets.get(key, ()) if other_id != user_id]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_location_index():
+    """
+    Get the process-wide location index, loading every user's location on first use
+    and again every MAX_AGE_SECONDS.
+    """
+    global _index
+    with _index_lock:
+        if _index is None or time.time() - _index.loaded_at > MAX_AGE_SECONDS:
+            index = LocationIndex()
+            connection = None
+            cursor = None
+            try:
+                connection = get_connection()
+                cursor = connection.cursor()
+                cursor.execute("SELECT user_id, location FROM User WHERE location IS NOT NULL")
+                for user_id, location in cursor.fetchall():
+                    index.set_user_location(user_id, location)
+            finally:
+                if cursor:
+                    cursor.close()
+                if connection:
+                    connection.close()
+            _index = index
+        return _index
+
+
+def record_user_location(user_id, location):
+    """
+    Re-bucket a user after a committed create or profile update, if the index is loaded.
+    """
+    if _index is not None:
+        _index.set_user_location(user_id, location)
+
+
+def record_location_user_removed(user_id):
+    """
+    Drop a deleted user from the index, if it is loaded.
+    """
+    if _index is not None:
+        _index.remove_user(user_id)
@@ -0,0 +1,11 @@
+def after_commit(hook, *args, **kwargs):
+    """
+    Run an in-memory index or counter update for a write that has already committed.
+
+    The write has happened whatever the hook does, so a failing hook is logged
+    rather than turned into an error response; the index catches up on its next reload.
+    """
+    try:
+        hook(*args, **kwargs)
+    except Exception as e:
+        print(f"Error in post-commit hook {getattr(hook, '__name__', hook)}: {str(e)}")
@@ -0,0 +1,96 @@
+# Scoring shared by the live recommendation queries and the batch precompute job
+
+# How many candidates each signal contributes before blending
+FRIEND_CANDIDATE_POOL = 50
+
+# One mutual friend is worth this many shared interests
+MUTUAL_FRIEND_WEIGHT = 2
+
+FRIEND_RECOMMENDATION_LIMIT = 15
+GROUP_RECOMMENDATION_LIMIT = 10
+
+def friend_score(common_interests, mutual_friends):
+    return common_interests + MUTUAL_FRIEND_WEIGHT * mutual_friends
+
+def rank_friend_candidates(candidates, limit=FRIEND_RECOMMENDATION_LIMIT):
+    """
+    Score and order friend candidates.
+    
+    Args:
+        candidates (list): Dictionaries with common_interests, mutual_friends and age_difference
+        limit (int): Number of candidates to keep
+        
+    Returns:
+        list: The best candidates, each with a 'score' key added
+    """
+    for candidate in candidates:
+        candidate['score'] = friend_score(candidate['common_interests'], candidate['mutual_friends'])
+    ranked = sorted(
+        candidates,
+        key=lambda c: (-c['score'], c['age_difference'] if c['age_difference'] is not None else 0)
+    )
+    return ranked[:limit]
+
+def top_interest_matches(candidates, pool=FRIEND_CANDIDATE_POOL):
+    """
+    Keep the interest signal's share of the candidate pool, in the order
+    get_friend_recommendations' query returns it.
+    
+    Args:
+        candidates (list): Dictionaries with recommended_user_id, common_interests and age_difference
+        pool (int): Number of candidates to keep
+        
+    Returns:
+        list: The candidates with the most shared interests
+    """
+    # MySQL sorts a NULL age difference first in ascending order
+    ranked = sorted(
+        candidates,
+        key=lambda c: (-c['common_interests'], c['age_difference'] is not None,
+                       c['age_difference'] or 0, c['recommended_user_id'])
+    )
+    return ranked[:pool]
+
+def blend_friend_candidates(interest_matches, mutual_counts, load_missing, limit=FRIEND_RECOMMENDATION_LIMIT):
+    """
+    Blend the two candidate pools into the final friend recommendations.
+    
+    Args:
+        interest_matches (list): The interest pool, as from top_interest_matches
+        mutual_counts (list): The mutual friend pool, (candidate_id, mutual_friends) tuples
+        load_missing (callable): Given the ids found only through mutual friends, returns
+            candidate dictionaries for them (common_interests 0, plus age_difference)
+        limit (int): Number of candidates to keep
+        
+    Returns:
+        list: The best candidates, each with 'mutual_friends' and 'score' keys added
+    """
+    candidates = {candidate['recommended_user_id']: candidate for candidate in interest_matches}
+    mutual_counts = dict(mutual_counts)
+
+    missing_ids = [candidate_id for candidate_id in mutual_counts if candidate_id not in candidates]
+    if missing_ids:
+        for candidate in load_missing(missing_ids):
+            candidates[candidate['recommended_user_id']] = candidate
+
+    for candidate_id, candidate in candidates.items():
+        candidate['mutual_friends'] = mutual_counts.get(candidate_id, 0)
+
+    return rank_friend_candidates(list(candidates.values()), limit)
+
+def rank_group_candidates(groups, limit=GROUP_RECOMMENDATION_LIMIT):
+    """
+    Order interest-matched groups the same way get_recommended_groups' query does.
+    
+    Args:
+        groups (list): Dictionaries with group_id, member_count, message_count and event_count
+        limit (int): Number of groups to keep
+        
+    Returns:
+        list: The best groups
+    """
+    ranked = sorted(
+        groups,
+        key=lambda g: (-g['member_count'], -g['message_count'], -g['event_count'], g['group_id'])
+    )
+    return ranked[:limit]
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import threading
+import time
+from types import MappingProxyType
+
+from .connection import get_connection
+
+# Reload after this many seconds even without a bump, so other instances' edits show up
+MAX_AGE_SECONDS = 10 * 60
+
+# Small dimension tables loaded whole; each becomes a tuple of read-only rows in the snapshot
+_TABLES = {
+    'interests': "SELECT interest_id, interest_name FROM Interests ORDER BY interest_name",
+}
+
+
+class ReferenceSnapshot:
+    """
+    Immutable copy of the dimension tables, shared by every request in the process.
+
+    A new snapshot replaces the old one on refresh; nothing in a snapshot is modified
+    after it is built, so readers never need a lock.
+    """
+
+    def __init__(self, tables, version):
+        self.version = version
+        self.loaded_at = time.time()
+        self.tables = MappingProxyType({
+            name: tuple(MappingProxyType(dict(row)) for row in rows)
+            for name, rows in tables.items()
+        })
+        self.interest_names = MappingProxyType({
+            row['interest_id']: row['interest_name'] for row in self.tables['interests']
+        })
+        # Content hash, so every instance serving the same data hands out the same ETag
+        payload = json.dumps({name: [dict(row) for row in rows] for name, rows in tables.items()},
+                             sort_keys=True, default=str)
+        self.etag = hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def rows(self, table):
+        """
+        Get a table's rows as fresh dictionaries the caller may modify.
+        """
+        return [dict(row) for row in self.tables[table]]
+
+
+_snapshot = None
+_version = 0
+_snapshot_lock = threading.Lock()
+
+
+def _load(version):
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        tables = {}
+        for name, query in _TABLES.items():
+            cursor.execute(query)
+            columns = [column[0] for column in cursor.description]
+            tables[name] = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return ReferenceSnapshot(tables, version)
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+def get_reference_data():
+    """
+    Get the current reference-data snapshot, loading it on first use or after a bump.
+    """
+    global _snapshot
+    with _snapshot_lock:
+        if (_snapshot is None or _snapshot.version != _version
+                or time.time() - _snapshot.loaded_at > MAX_AGE_SECONDS):
+            _snapshot = _load(_version)
+        return _snapshot
+
+
+def bump_reference_version():
+    """
+    Mark the snapshot stale after a write to one of the dimension tables.
+    """
+    global _version
+    with _snapshot_lock:
+        _version += 1
+
+
+def interest_names(interest_ids):
+    """
+    Resolve interest ids to names from the snapshot, skipping unknown ids.
+    """
+    names = get_reference_data().interest_names
+    if any(interest_id not in names for interest_id in interest_ids):
+        # Added since the snapshot was taken, possibly by another instance
+        bump_reference_version()
+        names = get_reference_data().interest_names
+    return [names[interest_id] for interest_id in interest_ids if interest_id in names]
+
+
+if __name__ == "__main__":
+    snapshot = get_reference_data()
+    for name, rows in snapshot.tables.items():
+        print(f"{name}: {len(rows)} rows")
+    print(f"etag: {snapshot.etag}")
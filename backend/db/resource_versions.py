@@ -0,0 +1,101 @@
+import threading
+
+from pymysql.cursors import DictCursor
+
+from .connection import get_connection
+
+# One counter per cacheable list, bumped in the same transaction as any write that changes it.
+# Reads compare these instead of re-running the list query to answer conditional GETs.
+CREATE_RESOURCE_VERSIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS Resource_Versions (
+        resource VARCHAR(64) PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at DATETIME NOT NULL
+    )
+"""
+
+# Resource keys; the group and user ones are formatted with the id
+ALL_GROUPS = 'groups'
+GROUP_MEMBERS = 'group:{}:members'
+GROUP_EVENTS = 'group:{}:events'
+USER_GROUPS = 'user:{}:groups'
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+
+def ensure_resource_versions_table(cursor):
+    """
+    Create the Resource_Versions table the first time this process needs it.
+
+    CREATE TABLE commits implicitly, so write paths call this before their first write.
+    """
+    global _table_ready
+    with _table_lock:
+        if not _table_ready:
+            cursor.execute(CREATE_RESOURCE_VERSIONS_TABLE)
+            _table_ready = True
+
+
+def membership_resources(group_id, user_id):
+    """
+    Get the resources a user joining or leaving a group changes.
+    """
+    # member_count is part of every group list, so the full list changes too
+    return [GROUP_MEMBERS.format(group_id), USER_GROUPS.format(user_id), ALL_GROUPS]
+
+
+def bump_resource_versions(cursor, resources):
+    """
+    Increment resources' versions inside the caller's transaction.
+
+    Args:
+        cursor: A cursor on the connection doing the write
+        resources (list): Resource keys, e.g. GROUP_MEMBERS.format(group_id)
+    """
+    resources = list(dict.fromkeys(resources))
+    if not resources:
+        return
+    # Sorted so concurrent writers take the row locks in the same order
+    cursor.executemany("""
+        INSERT INTO Resource_Versions (resource, version, updated_at)
+        VALUES (%s, 1, UTC_TIMESTAMP())
+        ON DUPLICATE KEY UPDATE version = version + 1, updated_at = UTC_TIMESTAMP()
+    """, [(resource,) for resource in sorted(resources)])
+
+
+def get_resource_versions(resources):
+    """
+    Read the current versions of resources.
+
+    Args:
+        resources (list): Resource keys
+
+    Returns:
+        dict: resource -> (version, updated_at in UTC), with (0, None) for resources
+        never written; None on a database error
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        if not connection:
+            return None
+
+        cursor = connection.cursor(DictCursor)
+        ensure_resource_versions_table(cursor)
+        cursor.execute(
+            f"SELECT resource, version, updated_at FROM Resource_Versions "
+            f"WHERE resource IN ({', '.join(['%s'] * len(resources))})",
+            resources
+        )
+        found = {row['resource']: (row['version'], row['updated_at']) for row in cursor.fetchall()}
+        return {resource: found.get(resource, (0, None)) for resource in resources}
+    except Exception as e:
+        print(f"Error in get_resource_versions: {str(e)}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
@@ -0,0 +1,87 @@
+from pymysql.cursors import SSDictCursor
+
+from .connection import get_connection
+
+# Rows pulled off the socket per round; memory stays bounded by this, not by the result size
+STREAM_BATCH_SIZE = 500
+
+
+def stream_rows(query, params=None, transform=None):
+    """
+    Run a query on an unbuffered server-side cursor and iterate its rows as they arrive.
+
+    The query is executed before this returns, so a bad query or a dead database is
+    reported to the caller instead of in the middle of a response. The connection
+    belongs to the returned stream and goes back to the pool once it is exhausted;
+    if it is closed early (the client went away, or a HEAD request never read the
+    body), the connection is dropped instead, since the unread rows would otherwise
+    have to be drained first.
+
+    Args:
+        query (str): The SELECT to run
+        params (tuple, optional): Query parameters
+        transform (callable, optional): Applied to each row dictionary before it is yielded
+
+    Returns:
+        RowStream: An iterator over the rows, or None if the query could not be run
+    """
+    connection = None
+    try:
+        connection = get_connection()
+        if not connection:
+            return None
+        cursor = connection.cursor(SSDictCursor)
+        cursor.execute(query, params)
+    except Exception as e:
+        print(f"Error in stream_rows: {str(e)}")
+        if connection:
+            connection.discard()
+        return None
+    return RowStream(connection, cursor, transform)
+
+
+def _iter_rows(connection, cursor, transform):
+    finished = False
+    try:
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield transform(row) if transform else row
+        finished = True
+    except Exception as e:
+        # Re-raised so the response is cut off rather than closed as if it were complete
+        print(f"Error in stream_rows while reading: {str(e)}")
+        raise
+    finally:
+        if finished:
+            cursor.close()
+            connection.close()
+        else:
+            connection.discard()
+
+
+class RowStream:
+    """
+    Iterator over a streamed result that owns its connection until it is exhausted or closed.
+    """
+
+    def __init__(self, connection, cursor, transform=None):
+        self._connection = connection
+        self._rows = _iter_rows(connection, cursor, transform)
+        self._started = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._started = True
+        return next(self._rows)
+
+    def close(self):
+        # Closing a generator that never started skips its finally, which would leave the
+        # unread result on the connection until garbage collection
+        if not self._started:
+            self._connection.discard()
+        self._rows.close()
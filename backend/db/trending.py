@@ -0,0 +1,218 @@
+import heapq
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+from .connection import get_connection
+
+TOP_K = 50
+
+# Activity loses half its weight after this many hours
+HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', '6'))
+
+MESSAGE_WEIGHT = 1.0
+EVENT_WEIGHT = 3.0
+
+CHECKPOINT_PATH = os.getenv(
+    'TRENDING_CHECKPOINT_PATH',
+    os.path.join(tempfile.gettempdir(), 'synapo_trending.json')
+)
+CHECKPOINT_INTERVAL_SECONDS = 60
+
+# Move the landmark forward before exp() gets anywhere near overflowing
+MAX_EXPONENT = 300.0
+
+
+class TrendingLeaderboard:
+    """
+    Exact top-K of groups by exponentially decayed activity.
+
+    Uses forward decay: each write adds weight * exp((t - landmark) / tau) to the
+    group's score, so older scores never have to be touched. Because a write only
+    ever raises one group's score, a bounded min-heap of the current top K stays exact.
+    """
+
+    def __init__(self, k=TOP_K, half_life_hours=HALF_LIFE_HOURS):
+        self.k = k
+        self.tau = half_life_hours * 3600 / math.log(2)
+        self.landmark = time.time()
+        self._lock = threading.Lock()
+        self._scores = {}
+        self._top = set()
+        self._heap = []
+
+    def _weight_at(self, timestamp):
+        return math.exp((timestamp - self.landmark) / self.tau)
+
+    def _rescale(self, timestamp):
+        factor = math.exp(-(timestamp - self.landmark) / self.tau)
+        self._scores = {group_id: score * factor for group_id, score in self._scores.items()}
+        self.landmark = timestamp
+        self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [(self._scores[group_id], group_id) for group_id in self._top]
+        heapq.heapify(self._heap)
+
+    def _peek_min(self):
+        # Entries left behind by earlier score increases are skipped here
+        while self._heap:
+            score, group_id = self._heap[0]
+            if group_id in self._top and self._scores[group_id] == score:
+                return score, group_id
+            heapq.heappop(self._heap)
+        return None
+
+    def record(self, group_id, weight, timestamp=None):
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            if (timestamp - self.landmark) / self.tau > MAX_EXPONENT:
+                self._rescale(timestamp)
+
+            score = self._scores.get(group_id, 0.0) + weight * self._weight_at(timestamp)
+            self._scores[group_id] = score
+
+            if group_id in self._top:
+                heapq.heappush(self._heap, (score, group_id))
+            elif len(self._top) < self.k:
+                self._top.add(group_id)
+                heapq.heappush(self._heap, (score, group_id))
+            else:
+                lowest = self._peek_min()
+                if lowest and score > lowest[0]:
+                    heapq.heappop(self._heap)
+                    self._top.discard(lowest[1])
+                    self._top.add(group_id)
+                    heapq.heappush(self._heap, (score, group_id))
+
+            if len(self._heap) > 4 * self.k:
+                self._rebuild_heap()
+
+    def top(self, limit=10):
+        """
+        Get the highest scoring groups.
+
+        Returns:
+            list: (group_id, score) tuples with scores decayed to the current time
+        """
+        with self._lock:
+            ranked = sorted(((self._scores[g], g) for g in self._top), reverse=True)[:limit]
+            factor = math.exp(-(time.time() - self.landmark) / self.tau)
+        return [(group_id, score * factor) for score, group_id in ranked]
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'landmark': self.landmark,
+                'tau': self.tau,
+                'scores': {str(group_id): score for group_id, score in self._scores.items()}
+            }
+
+    def load_dict(self, data):
+        with self._lock:
+            # Re-express saved scores against this instance's landmark and half-life
+            age = self.landmark - data['landmark']
+            for group_id, score in data['scores'].items():
+                self._scores[int(group_id)] = score * math.exp(-age / data['tau'])
+            self._top = set(
+                group_id for _, group_id in heapq.nlargest(
+                    self.k, ((score, group_id) for group_id, score in self._scores.items())
+                )
+            )
+            self._rebuild_heap()
+
+
+_leaderboard = None
+_leaderboard_lock = threading.Lock()
+_checkpointer = None
+
+
+def save_checkpoint(path=CHECKPOINT_PATH):
+    """
+    Write the leaderboard to disk so a restarted instance starts warm.
+    """
+    if _leaderboard is None:
+        return
+    temp_path = None
+    try:
+        # A temp file of its own, so concurrent savers (threads or worker processes) never interleave
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(_leaderboard.to_dict(), f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Error saving trending checkpoint: {str(e)}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _checkpoint_loop():
+    while True:
+        time.sleep(CHECKPOINT_INTERVAL_SECONDS)
+        save_checkpoint()
+
+
+def _start_checkpointer():
+    global _checkpointer
+    if _checkpointer is None:
+        _checkpointer = threading.Thread(target=_checkpoint_loop, name='trending-checkpoint', daemon=True)
+        _checkpointer.start()
+
+
+def _warm_from_messages(leaderboard):
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT
+                g.group_id,
+                FLOOR(UNIX_TIMESTAMP(m.sent_at) / 3600) * 3600 AS hour_start,
+                COUNT(*) AS message_count
+            FROM Messages m
+            JOIN `Group` g ON g.chat_id = m.chat_id
+            WHERE m.sent_at >= NOW() - INTERVAL 7 DAY
+            GROUP BY g.group_id, hour_start
+        """)
+        for group_id, hour_start, message_count in cursor.fetchall():
+            leaderboard.record(group_id, MESSAGE_WEIGHT * int(message_count), float(hour_start))
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+def get_trending_leaderboard():
+    """
+    Get the process-wide leaderboard, restoring the last checkpoint on first use
+    or replaying the last week of messages if there is none.
+    """
+    global _leaderboard
+    with _leaderboard_lock:
+        if _leaderboard is None:
+            leaderboard = TrendingLeaderboard()
+            try:
+                with open(CHECKPOINT_PATH) as f:
+                    leaderboard.load_dict(json.load(f))
+            except (OSError, ValueError, KeyError):
+                _warm_from_messages(leaderboard)
+            _leaderboard = leaderboard
+            _start_checkpointer()
+        return _leaderboard
+
+
+def record_trending_activity(group_id, messages=0, events=0):
+    """
+    Feed a committed group message or event into the leaderboard, if it is loaded.
+
+    Never loads or saves anything itself: warming happens on the first trending read,
+    and checkpoints are written by a background thread every CHECKPOINT_INTERVAL_SECONDS.
+    """
+    if _leaderboard is not None:
+        _leaderboard.record(group_id, MESSAGE_WEIGHT * messages + EVENT_WEIGHT * events)
@@ -0,0 +1,271 @@
+import bisect
+import threading
+import time
+
+from .connection import get_connection
+
+# Reload from the database after this many seconds so other instances' writes show up
+MAX_AGE_SECONDS = 15 * 60
+
+# Most ids a single search hands back to the SQL layer
+MAX_SEARCH_CANDIDATES = 1000
+
+# Terms whose ranked matches are kept so later pages are a bisect instead of a rescan
+RANKED_CACHE_TERMS = 256
+
+
+def _normalize(text):
+    return ' '.join((text or '').casefold().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _match_key(name, term):
+    position = name.find(term)
+    if position < 0:
+        return None
+    if position == 0:
+        tier = 0
+    elif name[position - 1] == ' ':
+        tier = 1
+    else:
+        tier = 2
+    return tier, position, len(name)
+
+
+def match_rank(name, term):
+    """
+    Rank how well a name matches a search term, the same way the index orders results.
+
+    Returns:
+        tuple: (tier, position, length), smaller is better; None if the name does not contain the term
+    """
+    return _match_key(_normalize(name), _normalize(term))
+
+
+class TrigramIndex:
+    """
+    Inverted index from character trigrams to document ids, for substring search over names.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._postings = {}
+        self._ranked = {}
+        self.loaded_at = time.time()
+
+    def _remove(self, doc_id):
+        self._ranked.clear()
+        name = self._names.pop(doc_id, None)
+        if name is None:
+            return
+        for gram in _trigrams(name):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def set(self, doc_id, name):
+        name = _normalize(name)
+        with self._lock:
+            self._remove(doc_id)
+            self._ranked.clear()
+            self._names[doc_id] = name
+            for gram in _trigrams(name):
+                self._postings.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    @property
+    def size(self):
+        return len(self._names)
+
+    def search_page(self, term, limit=MAX_SEARCH_CANDIDATES, after=None):
+        """
+        Find ids whose name contains a term, best matches first, one page at a time.
+
+        Matches at the start of the name rank first, then matches at the start
+        of a word, then anywhere else; ties go to earlier and shorter names.
+
+        Args:
+            term (str): The substring to look for
+            limit (int): Maximum number of ids to return
+            after (list, optional): Rank key of the last match on the previous page
+
+        Returns:
+            tuple: (rank keys in relevance order, total matches); each key is a
+            (tier, position, length, id) tuple and can be passed back as `after`
+        """
+        term = _normalize(term)
+        if not term:
+            return [], 0
+        with self._lock:
+            ranked = self._ranked.get(term)
+            if ranked is None:
+                ranked = self._rank(term)
+                if len(self._ranked) >= RANKED_CACHE_TERMS:
+                    self._ranked.clear()
+                self._ranked[term] = ranked
+
+        start = bisect.bisect_right(ranked, tuple(after)) if after is not None else 0
+        return ranked[start:start + limit], len(ranked)
+
+    def _rank(self, term):
+        grams = _trigrams(term)
+        if grams:
+            # Intersect from the rarest trigram so the working set shrinks fastest
+            postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    break
+        else:
+            # Terms shorter than a trigram fall back to scanning the names in memory
+            candidates = self._names.keys()
+
+        matches = []
+        for doc_id in candidates:
+            key = _match_key(self._names[doc_id], term)
+            if key is not None:
+                matches.append(key + (doc_id,))
+        matches.sort()
+        return matches
+
+    def search(self, term, limit=MAX_SEARCH_CANDIDATES):
+        """
+        Find ids whose name contains a term, best matches first.
+        """
+        return [key[-1] for key in self.search_page(term, limit)[0]]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# kind -> in-progress load: writes recorded while it runs (replayed into it before the swap)
+# and an event set once it has finished
+_loading = {}
+
+_SOURCES = {
+    'users': "SELECT user_id, full_name FROM User",
+    'groups': "SELECT group_id, group_name FROM `Group`",
+}
+
+
+def _load(kind):
+    index = TrigramIndex()
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        cursor.execute(_SOURCES[kind])
+        for doc_id, name in cursor.fetchall():
+            index.set(doc_id, name)
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+    return index
+
+
+def _run_load(kind, loading):
+    index = None
+    try:
+        index = _load(kind)
+    except Exception as e:
+        print(f"Error loading {kind} name index: {str(e)}")
+    with _indexes_lock:
+        del _loading[kind]
+        if index is not None:
+            for method, args in loading['journal']:
+                getattr(index, method)(*args)
+            _indexes[kind] = index
+    loading['done'].set()
+
+
+def _start_load(kind):
+    # Caller holds _indexes_lock
+    loading = _loading.get(kind)
+    if loading is None:
+        loading = _loading[kind] = {'journal': [], 'done': threading.Event()}
+        threading.Thread(target=_run_load, args=(kind, loading), name=f'{kind}-name-index', daemon=True).start()
+    return loading
+
+
+def _get_index(kind):
+    with _indexes_lock:
+        index = _indexes.get(kind)
+        if index is not None:
+            if time.time() - index.loaded_at > MAX_AGE_SECONDS:
+                # Keep answering from the current index while a fresh one loads
+                _start_load(kind)
+            return index
+        loading = _start_load(kind)
+    # Nothing to answer from yet, so the first caller has to wait for the load
+    loading['done'].wait()
+    index = _indexes.get(kind)
+    if index is None:
+        raise RuntimeError(f"The {kind} name index could not be loaded")
+    return index
+
+
+def name_index_ready(kind):
+    """
+    Check whether a name index ('users' or 'groups') can answer without waiting for a load.
+
+    If it cannot, a load is started in the background, so a caller with a tight deadline
+    can skip the index now and find it ready shortly after.
+    """
+    with _indexes_lock:
+        if kind in _indexes:
+            return True
+        _start_load(kind)
+        return False
+
+
+def _record(kind, method, *args):
+    with _indexes_lock:
+        index = _indexes.get(kind)
+        loading = _loading.get(kind)
+        if loading is not None:
+            loading['journal'].append((method, args))
+    if index is not None:
+        getattr(index, method)(*args)
+
+
+def get_user_name_index():
+    """
+    Get the trigram index over User.full_name, loading it on first use and
+    refreshing it in the background every MAX_AGE_SECONDS.
+    """
+    return _get_index('users')
+
+
+def get_group_name_index():
+    """
+    Get the trigram index over Group.group_name, loading it on first use and
+    refreshing it in the background every MAX_AGE_SECONDS.
+    """
+    return _get_index('groups')
+
+
+def record_user_name(user_id, full_name):
+    """
+    Index a committed user create or rename, if the index is loaded.
+    """
+    _record('users', 'set', user_id, full_name)
+
+
+def record_name_user_removed(user_id):
+    """
+    Drop a deleted user from the name index, if it is loaded.
+    """
+    _record('users', 'remove', user_id)
@@ -0,0 +1,231 @@
+import threading
+import time
+
+from .connection import get_connection
+from .group_stats import ensure_group_stats_table
+
+# Suggestions kept at each trie node, which is also the most a lookup can return
+TOP_N = 10
+
+# Rebuild the tries from the database in the background after this many seconds
+MAX_AGE_SECONDS = 5 * 60
+
+# How long a prefix's answer is reused before the tries are consulted again
+CACHE_TTL_SECONDS = 30
+CACHE_MAX_ENTRIES = 10000
+
+
+class _Node:
+    __slots__ = ('children', 'top')
+
+    def __init__(self, top=None):
+        # first character -> (edge label, child node)
+        self.children = {}
+        # best (-popularity, name, id) tuples anywhere below this node
+        self.top = list(top) if top else []
+
+    def offer(self, entry):
+        if any(existing[2] == entry[2] for existing in self.top):
+            return
+        self.top.append(entry)
+        self.top.sort()
+        del self.top[TOP_N:]
+
+
+class PrefixTrie:
+    """
+    Compressed (radix) prefix trie over names, with each node caching the most
+    popular entries beneath it so a lookup costs one walk down the prefix.
+
+    Every word of a name is inserted as its own key, so "smi" finds "John Smith".
+    """
+
+    def __init__(self):
+        self._root = _Node()
+
+    def insert(self, name, item_id, popularity):
+        entry = (-popularity, name, item_id)
+        words = name.casefold().split()
+        for start in range(len(words)):
+            self._insert_key(' '.join(words[start:]), entry)
+
+    def _insert_key(self, key, entry):
+        node = self._root
+        i = 0
+        while i < len(key):
+            first = key[i]
+            if first not in node.children:
+                leaf = _Node()
+                leaf.offer(entry)
+                node.children[first] = (key[i:], leaf)
+                return
+
+            label, child = node.children[first]
+            common = 0
+            while common < len(label) and i + common < len(key) and label[common] == key[i + common]:
+                common += 1
+
+            if common < len(label):
+                # Split the edge; the new middle node starts with everything under the old child
+                middle = _Node(child.top)
+                middle.children[label[common]] = (label[common:], child)
+                node.children[first] = (label[:common], middle)
+                child = middle
+
+            child.offer(entry)
+            node = child
+            i += common
+
+    def lookup(self, prefix, limit=TOP_N):
+        """
+        Get the most popular (id, name) pairs with a word starting with a prefix.
+        """
+        prefix = ' '.join(prefix.casefold().split())
+        if not prefix:
+            return []
+        node = self._root
+        i = 0
+        while i < len(prefix):
+            edge = node.children.get(prefix[i])
+            if edge is None:
+                return []
+            label, child = edge
+            rest = prefix[i:]
+            if rest.startswith(label):
+                i += len(label)
+                node = child
+            elif label.startswith(rest):
+                node = child
+                break
+            else:
+                return []
+        return [(item_id, name) for _, name, item_id in node.top[:limit]]
+
+
+_tries = None
+_tries_loaded_at = 0.0
+_tries_lock = threading.Lock()
+
+# Set once the in-progress build has finished; None when no build is running
+_loading = None
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _build_tries():
+    connection = None
+    cursor = None
+    try:
+        ensure_group_stats_table()
+        connection = get_connection()
+        cursor = connection.cursor()
+
+        users = PrefixTrie()
+        # Users are ranked by how many friends they have
+        cursor.execute("""
+            SELECT u.user_id, u.full_name, COALESCE(fc.friend_count, 0)
+            FROM User u
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) AS friend_count
+                FROM (
+                    SELECT user1_id AS user_id FROM Friendships
+                    UNION ALL
+                    SELECT user2_id AS user_id FROM Friendships
+                ) f
+                GROUP BY user_id
+            ) fc ON fc.user_id = u.user_id
+        """)
+        for user_id, full_name, friend_count in cursor.fetchall():
+            if full_name:
+                users.insert(full_name, user_id, friend_count)
+
+        groups = PrefixTrie()
+        # Groups are ranked by member count
+        cursor.execute("""
+            SELECT g.group_id, g.group_name, COALESCE(gs.member_count, 0)
+            FROM `Group` g
+            LEFT JOIN Group_Stats gs ON g.group_id = gs.group_id
+        """)
+        for group_id, group_name, member_count in cursor.fetchall():
+            if group_name:
+                groups.insert(group_name, group_id, member_count)
+
+        return {'users': users, 'groups': groups}
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+def _run_build(loading):
+    global _tries, _tries_loaded_at, _loading
+    tries = None
+    try:
+        tries = _build_tries()
+    except Exception as e:
+        print(f"Error building typeahead tries: {str(e)}")
+    with _tries_lock:
+        if tries is not None:
+            _tries = tries
+            _tries_loaded_at = time.time()
+        _loading = None
+    loading.set()
+
+
+def _start_build():
+    # Caller holds _tries_lock
+    global _loading
+    if _loading is None:
+        _loading = threading.Event()
+        threading.Thread(target=_run_build, args=(_loading,), name='typeahead-tries', daemon=True).start()
+    return _loading
+
+
+def _get_tries():
+    with _tries_lock:
+        if _tries is not None:
+            if time.time() - _tries_loaded_at > MAX_AGE_SECONDS:
+                # Keep answering keystrokes from the current tries while fresh ones are built
+                _start_build()
+            return _tries
+        loading = _start_build()
+    # Nothing to answer from yet, so the first requests have to wait for the build
+    loading.wait()
+    tries = _tries
+    if tries is None:
+        raise RuntimeError("The typeahead tries could not be built")
+    return tries
+
+
+def typeahead(prefix, kinds=('users', 'groups'), limit=TOP_N):
+    """
+    Suggest users and groups whose names have a word starting with a prefix.
+
+    Args:
+        prefix (str): What the user has typed so far
+        kinds (tuple): Which sections to include, 'users' and/or 'groups'
+        limit (int): Suggestions per section, at most TOP_N
+
+    Returns:
+        dict: Section name -> list of {"id", "name"} dictionaries, most popular first
+    """
+    key = (prefix.casefold().strip(), tuple(kinds), limit)
+    now = time.time()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    tries = _get_tries()
+    result = {
+        kind: [{'id': item_id, 'name': name} for item_id, name in tries[kind].lookup(prefix, limit)]
+        for kind in kinds
+    }
+
+    with _cache_lock:
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            _cache.clear()
+        _cache[key] = (now + CACHE_TTL_SECONDS, result)
+    return result
@@ -0,0 +1,139 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .chat_operations import search_messages
+from .group_operations import search_groups
+from .trigram_index import match_rank, name_index_ready
+from .user_operations import search_users
+
+SECTIONS = ('users', 'groups', 'messages')
+
+# Seconds each section may take, measured from the start of the request;
+# a section that misses its deadline is reported as timed out and left out of the merge
+SECTION_DEADLINES = {
+    'users': 0.5,
+    'groups': 0.5,
+    'messages': 1.0,
+}
+
+# Shared by every request so a burst of searches cannot open unbounded connections
+MAX_SEARCH_WORKERS = 12
+_executor = ThreadPoolExecutor(max_workers=MAX_SEARCH_WORKERS, thread_name_prefix='search')
+
+# Sections queued or running in the pool, including ones a request already gave up on
+# (a started query cannot be cancelled). Past this many a section is skipped as "busy"
+# instead of queueing behind abandoned work it could never beat its deadline against
+MAX_SEARCHES_IN_FLIGHT = 2 * MAX_SEARCH_WORKERS
+_search_slots = threading.BoundedSemaphore(MAX_SEARCHES_IN_FLIGHT)
+
+# Sections answered from an in-memory name index, skipped while it loads
+_INDEXED = ('users', 'groups')
+
+
+def _search_users(term, user_id, limit):
+    return search_users(term, user_id=user_id, limit=limit)
+
+
+def _search_groups(term, user_id, limit):
+    result = search_groups(term, limit, user_id)
+    if result is None or "error" in result:
+        return None
+    return result["groups"]
+
+
+_SEARCHERS = {
+    'users': _search_users,
+    'groups': _search_groups,
+    'messages': search_messages,
+}
+
+# The name a user or group result is ranked by in the merged list
+_TITLES = {
+    'users': 'full_name',
+    'groups': 'group_name',
+}
+
+_ID_KEYS = {
+    'users': 'user_id',
+    'groups': 'group_id',
+    'messages': 'message_id',
+}
+
+
+def search_everything(term, user_id=None, sections=('users', 'groups'), limit=10):
+    """
+    Search users, groups and optionally messages at once.
+
+    Each section runs on the shared pool against its own deadline. Sections
+    that fail, run late, find the pool saturated ("busy") or need a name index
+    that is still loading ("warming") come back empty with their status set,
+    and the rest of the response is still returned.
+
+    Args:
+        term (str): The search term
+        user_id (int, optional): The current user, excluded from users and used for is_member and message access
+        sections (tuple): Which of SECTIONS to search
+        limit (int): Maximum results per section and in the merged list
+
+    Returns:
+        dict: "sections" (name -> status, elapsed_ms and results), "top" (merged
+        results, best first) and "partial" (whether any section is missing)
+    """
+    start = time.monotonic()
+    response = {}
+    futures = {}
+    for name in sections:
+        # A cold index takes longer to load than any deadline; it loads in the background meanwhile
+        if name in _INDEXED and not name_index_ready(name):
+            response[name] = {"status": "warming", "elapsed_ms": 0.0, "results": []}
+        elif not _search_slots.acquire(blocking=False):
+            response[name] = {"status": "busy", "elapsed_ms": 0.0, "results": []}
+        else:
+            futures[name] = _executor.submit(_SEARCHERS[name], term, user_id, limit)
+            futures[name].add_done_callback(lambda _: _search_slots.release())
+
+    # Collect in order of deadline so each wait only covers the time still left
+    for name in sorted(futures, key=lambda section: SECTION_DEADLINES[section]):
+        future = futures[name]
+        remaining = SECTION_DEADLINES[name] - (time.monotonic() - start)
+        wait([future], timeout=max(remaining, 0))
+        elapsed_ms = round((time.monotonic() - start) * 1000, 1)
+
+        if not future.done():
+            # A queued search is dropped; a running one finishes in the pool and releases
+            # its connection and slot then
+            future.cancel()
+            response[name] = {"status": "timeout", "elapsed_ms": elapsed_ms, "results": []}
+            continue
+
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"Error in search_everything ({name}): {str(e)}")
+            results = None
+        if results is None:
+            response[name] = {"status": "error", "elapsed_ms": elapsed_ms, "results": []}
+        else:
+            response[name] = {"status": "ok", "elapsed_ms": elapsed_ms, "results": results}
+
+    # Merge: name matches by tier (prefix, word start, anywhere), then message hits;
+    # within a tier each section's own order is kept and sections alternate
+    ranked = []
+    for name in sections:
+        for position, item in enumerate(response[name]["results"]):
+            if name == 'messages':
+                tier = 3
+            else:
+                tier = (match_rank(item.get(_TITLES[name]) or '', term) or (3,))[0]
+            ranked.append(((tier, position, SECTIONS.index(name)), name, item))
+    ranked.sort(key=lambda entry: entry[0])
+
+    return {
+        "sections": {name: response[name] for name in sections},
+        "top": [
+            {"type": name, "id": item[_ID_KEYS[name]], "item": item}
+            for _, name, item in ranked[:limit]
+        ],
+        "partial": any(response[name]["status"] != "ok" for name in sections)
+    }
@@ -1,4 +1,17 @@
 from .connection import get_connection
+from .post_commit import after_commit
+from .account_deletion import TOMBSTONED_USER_IDS, ensure_account_deletion_table, start_account_deletion
+from .friend_graph import get_friend_graph, record_friendship
+from .friendships import canonical_pair
+from .group_cf import merge_cf_recommendations
+from .group_stats import ensure_group_stats_table
+from .activity_counters import get_activity_counters
+from .interest_lsh import MAX_CANDIDATES, get_interest_lsh
+from .location_index import get_location_index, record_user_location
+from .trigram_index import MAX_SEARCH_CANDIDATES, get_user_name_index, record_user_name
+from .reference_data import get_reference_data, interest_names
+from .resource_versions import GROUP_EVENTS, GROUP_MEMBERS, bump_resource_versions, ensure_resource_versions_table
+from .recommendation_scoring import FRIEND_CANDIDATE_POOL, GROUP_RECOMMENDATION_LIMIT, blend_friend_candidates
 from pymysql.cursors import DictCursor
 from datetime import datetime
 
@@ -32,18 +45,17 @@ def get_user_by_id(user_id):
             return None
             
         cursor = connection.cursor(DictCursor)
-        cursor.execute("SELECT user_id, full_name, gender, age, location, bio FROM User WHERE user_id = %s", (user_id,))
+        ensure_account_deletion_table(cursor)
+        # Tombstoned users are gone as far as the API is concerned, even before their rows are purged
+        cursor.execute(f"""
+            SELECT user_id, full_name, gender, age, location, bio FROM User
+            WHERE user_id = %s AND user_id NOT IN ({TOMBSTONED_USER_IDS})
+        """, (user_id,))
         user = cursor.fetchone()
         if user:
-            # Get user interests
-            cursor.execute("""
-                SELECT i.interest_name 
-                FROM User_Interests ui 
-                JOIN Interests i ON ui.interest_id = i.interest_id 
-                WHERE ui.user_id = %s
-            """, (user_id,))
-            interests = [row['interest_name'] for row in cursor.fetchall()]
-            user['interests'] = interests
+            # Get user interests; names come from the in-memory reference data
+            cursor.execute("SELECT interest_id FROM User_Interests WHERE user_id = %s", (user_id,))
+            user['interests'] = interest_names([row['interest_id'] for row in cursor.fetchall()])
         return user
     except Exception as e:
         print(f"Error in get_user_by_id: {str(e)}")
@@ -54,16 +66,111 @@ def get_user_by_id(user_id):
         if connection:
             connection.close()
 
-def get_user_recommendations(user_id):
+def get_users_by_ids(user_ids):
+    """
+    Get several users' profiles and interests in two queries.
+    
+    Args:
+        user_ids (list): User IDs, in the order the caller wants them back
+        
+    Returns:
+        dict: "users" (profiles in request order, duplicates dropped) and
+        "missing" (requested ids with no user, or whose account is being deleted)
+    """
     connection = None
     cursor = None
     try:
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {"users": [], "missing": []}
+        
         connection = get_connection()
         if not connection:
             return None
             
         cursor = connection.cursor(DictCursor)
-        cursor.execute("""
+        ensure_account_deletion_table(cursor)
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        # Accounts being deleted are reported as missing, as get_user_by_id reports them
+        cursor.execute(f"""
+            SELECT user_id, full_name, gender, age, location, bio 
+            FROM User 
+            WHERE user_id IN ({placeholders})
+            AND user_id NOT IN ({TOMBSTONED_USER_IDS})
+        """, user_ids)
+        found = {user['user_id']: user for user in cursor.fetchall()}
+        
+        if found:
+            # Interest names for every found user at once
+            found_ids = list(found)
+            cursor.execute(f"""
+                SELECT user_id, interest_id 
+                FROM User_Interests 
+                WHERE user_id IN ({', '.join(['%s'] * len(found_ids))})
+            """, found_ids)
+            interest_ids = {}
+            for row in cursor.fetchall():
+                interest_ids.setdefault(row['user_id'], []).append(row['interest_id'])
+            for user_id, user in found.items():
+                user['interests'] = interest_names(interest_ids.get(user_id, []))
+        
+        return {
+            "users": [found[user_id] for user_id in user_ids if user_id in found],
+            "missing": [user_id for user_id in user_ids if user_id not in found]
+        }
+    except Exception as e:
+        print(f"Error in get_users_by_ids: {str(e)}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+def get_user_recommendations(user_id, nearby=False):
+    """
+    Recommend users who share the most interests with a user.
+    
+    When the user base is larger than the LSH shortlist, exact scoring only
+    runs on the candidates the MinHash index returns, so a popular interest
+    no longer drags its whole member list through the self-join.
+    
+    Args:
+        user_id (int): The ID of the user
+        nearby (bool): Only recommend users in the same location bucket (default: False)
+        
+    Returns:
+        list: Up to 15 recommended users
+    """
+    connection = None
+    cursor = None
+    try:
+        shortlist = None
+        index = get_interest_lsh()
+        if index.user_count > MAX_CANDIDATES:
+            # An empty shortlist (e.g. interests written by another instance) falls back to the exact query
+            shortlist = index.candidates(user_id)
+        if nearby:
+            neighbours = get_location_index().users_near(user_id)
+            if shortlist:
+                nearby_ids = set(neighbours)
+                shortlist = [other_id for other_id in shortlist if other_id in nearby_ids]
+            else:
+                shortlist = neighbours
+            if not shortlist:
+                return []
+            
+        connection = get_connection()
+        if not connection:
+            return None
+            
+        cursor = connection.cursor(DictCursor)
+        shortlist_filter = ""
+        params = [user_id]
+        if shortlist:
+            shortlist_filter = f"AND ui2.user_id IN ({', '.join(['%s'] * len(shortlist))})"
+            params += shortlist
+        cursor.execute(f"""
             SELECT
                 ui2.user_id AS recommended_user_id,
                 u2.full_name AS recommended_user_name,
@@ -75,16 +182,11 @@ def get_user_recommendations(user_id):
                 AND ui1.user_id <> ui2.user_id
                 JOIN User u1 ON ui1.user_id = u1.user_id
                 JOIN User u2 ON ui2.user_id = u2.user_id
-                LEFT JOIN Friendships f ON (
-                    f.user1_id = ui1.user_id
-                    AND f.user2_id = ui2.user_id
-                )
-                OR (
-                    f.user2_id = ui1.user_id
-                    AND f.user1_id = ui2.user_id
-                )
+                LEFT JOIN Friendships f ON f.user1_id = LEAST(ui1.user_id, ui2.user_id)
+                AND f.user2_id = GREATEST(ui1.user_id, ui2.user_id)
             WHERE
                 ui1.user_id = %s
+                {shortlist_filter}
                 AND f.user1_id IS NULL
             GROUP BY
                 ui2.user_id,
@@ -95,7 +197,7 @@ def get_user_recommendations(user_id):
                 common_interests DESC,
                 age_difference ASC
             LIMIT 15
-        """, (user_id,))
+        """, params)
         recommendations = cursor.fetchall()
         return recommendations
     except Exception as e:
@@ -116,10 +218,14 @@ def verify_login(username, password):
             return None
             
         cursor = connection.cursor(DictCursor)
-        cursor.execute("""
+        ensure_account_deletion_table(cursor)
+        
+        # Accounts with an unfinished deletion job are gone as far as login is concerned
+        cursor.execute(f"""
             SELECT user_id, full_name, gender, age, location, bio 
             FROM User 
             WHERE full_name = %s AND password = %s
+            AND user_id NOT IN ({TOMBSTONED_USER_IDS})
         """, (username, password))
         user = cursor.fetchone()
         return user
@@ -173,6 +279,8 @@ def create_user(user_data):
         ))
         
         connection.commit()
+        after_commit(record_user_location, next_user_id, user_data.get('location'))
+        after_commit(record_user_name, next_user_id, user_data['full_name'])
         return {
             "success": True, 
             "message": "User created successfully",
@@ -191,6 +299,15 @@ def create_user(user_data):
             connection.close()
 
 def get_friend_recommendations(user_id):
+    """
+    Recommend friends by blending shared interests with mutual friend counts.
+
+    Args:
+        user_id (int): The ID of the user
+
+    Returns:
+        list: Up to 15 recommended users, highest score first
+    """
     connection = None
     cursor = None
     try:
@@ -211,14 +328,8 @@ def get_friend_recommendations(user_id):
                 AND ui1.user_id <> ui2.user_id
                 JOIN User u1 ON ui1.user_id = u1.user_id
                 JOIN User u2 ON ui2.user_id = u2.user_id
-                LEFT JOIN Friendships f ON (
-                    f.user1_id = ui1.user_id
-                    AND f.user2_id = ui2.user_id
-                )
-                OR (
-                    f.user2_id = ui1.user_id
-                    AND f.user1_id = ui2.user_id
-                )
+                LEFT JOIN Friendships f ON f.user1_id = LEAST(ui1.user_id, ui2.user_id)
+                AND f.user2_id = GREATEST(ui1.user_id, ui2.user_id)
             WHERE
                 ui1.user_id = %s
                 AND f.user1_id IS NULL
@@ -229,12 +340,35 @@ def get_friend_recommendations(user_id):
                 u2.age
             ORDER BY
                 common_interests DESC,
-                age_difference ASC
+                age_difference ASC,
+                recommended_user_id ASC
             LIMIT
-                15
-        """, (user_id,))
-        recommendations = cursor.fetchall()
-        return recommendations
+                %s
+        """, (user_id, FRIEND_CANDIDATE_POOL))
+        interest_matches = cursor.fetchall()
+
+        # Mutual friend counts come from the in-memory graph, not SQL
+        mutual_counts = get_friend_graph().mutual_friend_counts(user_id, FRIEND_CANDIDATE_POOL)
+
+        # Users found only through mutual friends still need a name and age difference
+        def load_missing(missing_ids):
+            placeholders = ', '.join(['%s'] * len(missing_ids))
+            cursor.execute(f"""
+                SELECT
+                    u2.user_id AS recommended_user_id,
+                    u2.full_name AS recommended_user_name,
+                    0 AS common_interests,
+                    ABS(u1.age - u2.age) AS age_difference
+                FROM
+                    User u1
+                    JOIN User u2 ON u2.user_id IN ({placeholders})
+                WHERE
+                    u1.user_id = %s
+            """, missing_ids + [user_id])
+            return cursor.fetchall()
+
+        # precompute_recommendations blends its candidates the same way
+        return blend_friend_candidates(interest_matches, mutual_counts, load_missing)
     except Exception as e:
         print(f"Error in get_friend_recommendations: {str(e)}")
         return None
@@ -244,15 +378,16 @@ def get_friend_recommendations(user_id):
         if connection:
             connection.close()
 
-def get_user_details(user_id):
-    connection = None
-    cursor = None
+def load_user_details(user_id):
+    """
+    Get a user's full row, letting database errors propagate.
+    
+    Returns:
+        dict: The user (including password), or None if there is no such user
+    """
+    connection = get_connection()
+    cursor = connection.cursor(DictCursor)
     try:
-        connection = get_connection()
-        if not connection:
-            return None
-            
-        cursor = connection.cursor(DictCursor)
         cursor.execute("""
             SELECT user_id, password, full_name, gender, age, location, bio, created_at 
             FROM User 
@@ -263,14 +398,16 @@ def get_user_details(user_id):
             # Convert the datetime to string in YYYY-MM-DD HH:MM:SS format
             user['created_at'] = user['created_at'].strftime('%Y-%m-%d %H:%M:%S')
         return user
+    finally:
+        cursor.close()
+        connection.close()
+
+def get_user_details(user_id):
+    try:
+        return load_user_details(user_id)
     except Exception as e:
         print(f"Error in get_user_details: {str(e)}")
         return None
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 def update_user_details(user_id, user_data):
     connection = None
@@ -281,6 +418,7 @@ def update_user_details(user_id, user_data):
             return None
             
         cursor = connection.cursor(DictCursor)
+        ensure_resource_versions_table(cursor)
         
         cursor.execute("""
             UPDATE User 
@@ -301,7 +439,19 @@ def update_user_details(user_id, user_data):
             user_id
         ))
         
+        # Member and event lists show the user's profile, so they change with it
+        cursor.execute("""
+            SELECT group_id FROM Group_Members WHERE user_id = %s
+            UNION
+            SELECT group_id FROM Event WHERE created_by = %s
+        """, (user_id, user_id))
+        group_ids = [row['group_id'] for row in cursor.fetchall()]
+        bump_resource_versions(cursor, [GROUP_MEMBERS.format(group_id) for group_id in group_ids]
+                               + [GROUP_EVENTS.format(group_id) for group_id in group_ids])
+        
         connection.commit()
+        after_commit(record_user_location, user_id, user_data['location'])
+        after_commit(record_user_name, user_id, user_data['full_name'])
         
         # Get updated user details
         updated_user = get_user_details(user_id)
@@ -339,7 +489,8 @@ def get_user_friends(user_id):
             
         cursor = connection.cursor(DictCursor)
         
-        # Get all friends of the user
+        # Get all friends of the user: one seek on the primary key for pairs where
+        # the user is user1, one on the reverse index for pairs where they are user2
         query = """
             SELECT 
                 u.user_id,
@@ -348,22 +499,21 @@ def get_user_friends(user_id):
                 u.location,
                 u.created_at,
                 f.chat_id,
-                CASE 
-                    WHEN f.user1_id = %s THEN f.user2_id
-                    ELSE f.user1_id
-                END as friend_id
-            FROM 
-                User u
+                f.friend_id
+            FROM (
+                SELECT user2_id AS friend_id, chat_id FROM Friendships WHERE user1_id = %s
+                UNION ALL
+                SELECT user1_id AS friend_id, chat_id FROM Friendships WHERE user2_id = %s
+            ) f
             JOIN 
-                Friendships f ON (f.user1_id = %s AND f.user2_id = u.user_id) 
-                OR (f.user2_id = %s AND f.user1_id = u.user_id)
+                User u ON u.user_id = f.friend_id
             ORDER BY 
                 u.full_name
         """
         print(f"Executing query: {query}")
-        print(f"With parameters: {(user_id, user_id, user_id)}")
+        print(f"With parameters: {(user_id, user_id)}")
         
-        cursor.execute(query, (user_id, user_id, user_id))
+        cursor.execute(query, (user_id, user_id))
         friends = cursor.fetchall()
         print(f"Found {len(friends) if friends else 0} friends")
         
@@ -422,11 +572,11 @@ def create_friendship(user_id1, user_id2):
         chat_name = f"Chat between {user_names[user_id1]} and {user_names[user_id2]}"
             
         # Check if friendship already exists
+        user1_id, user2_id = canonical_pair(user_id1, user_id2)
         cursor.execute("""
             SELECT * FROM Friendships 
-            WHERE (user1_id = %s AND user2_id = %s) 
-            OR (user1_id = %s AND user2_id = %s)
-        """, (user_id1, user_id2, user_id2, user_id1))
+            WHERE user1_id = %s AND user2_id = %s
+        """, (user1_id, user2_id))
         if cursor.fetchone():
             return {"error": "Friendship already exists"}
             
@@ -445,9 +595,10 @@ def create_friendship(user_id1, user_id2):
         cursor.execute("""
             INSERT INTO Friendships (user1_id, user2_id, chat_id) 
             VALUES (%s, %s, %s)
-        """, (user_id1, user_id2, next_chat_id))
+        """, (user1_id, user2_id, next_chat_id))
         
         connection.commit()
+        after_commit(record_friendship, user_id1, user_id2)
         
         # Get the created friendship details
         cursor.execute("""
@@ -468,7 +619,7 @@ def create_friendship(user_id1, user_id2):
                 Chat c ON f.chat_id = c.chat_id
             WHERE 
                 f.user1_id = %s AND f.user2_id = %s
-        """, (user_id1, user_id2))
+        """, (user1_id, user2_id))
         
         return cursor.fetchone()
         
@@ -513,9 +664,8 @@ def create_friend_request(sender_id, receiver_id):
         # Check if friendship already exists
         cursor.execute("""
             SELECT * FROM Friendships 
-            WHERE (user1_id = %s AND user2_id = %s) 
-            OR (user1_id = %s AND user2_id = %s)
-        """, (sender_id, receiver_id, receiver_id, sender_id))
+            WHERE user1_id = %s AND user2_id = %s
+        """, canonical_pair(sender_id, receiver_id))
         if cursor.fetchone():
             print("Friendship already exists")
             return {"error": "Friendship already exists"}
@@ -635,6 +785,149 @@ def get_pending_friend_requests(user_id):
         if connection:
             connection.close()
 
+def accept_friend_requests(receiver_id, sender_ids=None):
+    """
+    Accept pending friend requests and create the friendships in one transaction.
+    
+    The requests are locked and flipped with one UPDATE. One MAX(chat_id) read
+    numbers all the new chats, and the chats and friendships go in as multi-row
+    INSERTs. Nothing is re-read afterwards. A sender who is already a friend
+    has the request accepted without a second friendship.
+    
+    Args:
+        receiver_id (int): The ID of the user accepting the requests
+        sender_ids (list, optional): Senders whose requests to accept; all pending requests if None
+        
+    Returns:
+        dict: "accepted" (one entry per accepted request, with the new friend's
+        chat_id or None if they were already friends) and "skipped" (requested
+        senders with no pending request)
+    """
+    connection = None
+    cursor = None
+    try:
+        if sender_ids is not None:
+            sender_ids = list(dict.fromkeys(sender_ids))
+            if not sender_ids:
+                return {"accepted": [], "skipped": []}
+        
+        connection = get_connection()
+        if not connection:
+            return None
+            
+        cursor = connection.cursor(DictCursor)
+        
+        cursor.execute("SELECT full_name FROM User WHERE user_id = %s", (receiver_id,))
+        receiver = cursor.fetchone()
+        if not receiver:
+            return {"error": "User not found"}
+        
+        # Lock the pending requests so a concurrent accept cannot create the friendship twice
+        sender_filter = ""
+        params = [receiver_id]
+        if sender_ids is not None:
+            sender_filter = f"AND fr.sender_id IN ({', '.join(['%s'] * len(sender_ids))})"
+            params += sender_ids
+        cursor.execute(f"""
+            SELECT fr.sender_id, fr.sent_at, u.full_name AS sender_name
+            FROM FriendRequests fr
+            JOIN User u ON fr.sender_id = u.user_id
+            WHERE fr.receiver_id = %s AND fr.status = 'Pending'
+            {sender_filter}
+            ORDER BY fr.sent_at
+            FOR UPDATE
+        """, params)
+        pending = cursor.fetchall()
+        
+        pending_ids = [row['sender_id'] for row in pending]
+        pending_set = set(pending_ids)
+        skipped = [sender_id for sender_id in (sender_ids or []) if sender_id not in pending_set]
+        if not pending:
+            connection.rollback()
+            return {"accepted": [], "skipped": skipped}
+        
+        placeholders = ', '.join(['%s'] * len(pending_ids))
+        cursor.execute(f"""
+            UPDATE FriendRequests 
+            SET status = 'Accepted'
+            WHERE receiver_id = %s AND status = 'Pending' AND sender_id IN ({placeholders})
+        """, [receiver_id] + pending_ids)
+        
+        # Senders who are already friends; the receiver is user1 or user2 depending on id order
+        cursor.execute(f"""
+            SELECT user2_id AS friend_id, chat_id FROM Friendships
+            WHERE user1_id = %s AND user2_id IN ({placeholders})
+            UNION ALL
+            SELECT user1_id AS friend_id, chat_id FROM Friendships
+            WHERE user2_id = %s AND user1_id IN ({placeholders})
+        """, [receiver_id] + pending_ids + [receiver_id] + pending_ids)
+        existing = {row['friend_id']: row['chat_id'] for row in cursor.fetchall()}
+        
+        new_rows = [row for row in pending if row['sender_id'] not in existing]
+        chat_ids = {}
+        if new_rows:
+            cursor.execute("SELECT MAX(chat_id) as max_chat_id FROM Chat FOR UPDATE")
+            next_chat_id = (cursor.fetchone()['max_chat_id'] or 0) + 1
+            chats = []
+            friendships = []
+            for offset, row in enumerate(new_rows):
+                chat_id = next_chat_id + offset
+                chat_ids[row['sender_id']] = chat_id
+                chats.append((chat_id, f"Chat between {row['sender_name']} and {receiver['full_name']}"))
+                friendships.append(canonical_pair(row['sender_id'], receiver_id) + (chat_id,))
+            
+            cursor.executemany("INSERT INTO Chat (chat_id, chat_name) VALUES (%s, %s)", chats)
+            cursor.executemany("""
+                INSERT INTO Friendships (user1_id, user2_id, chat_id) 
+                VALUES (%s, %s, %s)
+            """, friendships)
+        
+        connection.commit()
+        for sender_id in chat_ids:
+            after_commit(record_friendship, sender_id, receiver_id)
+        
+        accepted = []
+        for row in pending:
+            accepted.append({
+                "sender_id": row['sender_id'],
+                "receiver_id": receiver_id,
+                "status": 'Accepted',
+                "sent_at": row['sent_at'].strftime('%Y-%m-%d %H:%M:%S') if row['sent_at'] else None,
+                "sender_name": row['sender_name'],
+                "receiver_name": receiver['full_name'],
+                "chat_id": chat_ids.get(row['sender_id'], existing.get(row['sender_id'])),
+                "new_friendship": row['sender_id'] in chat_ids
+            })
+        return {"accepted": accepted, "skipped": skipped}
+    except Exception as e:
+        print(f"Error in accept_friend_requests: {str(e)}")
+        if connection:
+            connection.rollback()
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+def accept_friend_request(sender_id, receiver_id):
+    """
+    Accept one pending friend request and create the friendship in the same transaction.
+    
+    Args:
+        sender_id (int): The ID of the user who sent the request
+        receiver_id (int): The ID of the user who received the request
+        
+    Returns:
+        dict: The accepted request with the friendship's chat_id, or an error
+    """
+    result = accept_friend_requests(receiver_id, [sender_id])
+    if result is None or "error" in result:
+        return result
+    if not result["accepted"]:
+        return {"error": "Friend request not found or already processed"}
+    return result["accepted"][0]
+
 def update_friend_request(sender_id, receiver_id, new_status):
     """
     Update a friend request's status.
@@ -647,6 +940,9 @@ def update_friend_request(sender_id, receiver_id, new_status):
     Returns:
         dict: A dictionary containing the updated friend request details if successful, None if failed
     """
+    if new_status == 'Accepted':
+        return accept_friend_request(sender_id, receiver_id)
+    
     connection = None
     cursor = None
     try:
@@ -673,13 +969,6 @@ def update_friend_request(sender_id, receiver_id, new_status):
             WHERE sender_id = %s AND receiver_id = %s
         """, (new_status, sender_id, receiver_id))
         
-        # If accepted, create the friendship
-        if new_status == 'Accepted':
-            friendship = create_friendship(sender_id, receiver_id)
-            if not friendship:
-                connection.rollback()
-                return {"error": "Failed to create friendship"}
-        
         connection.commit()
         
         # Get the updated request details
@@ -776,7 +1065,51 @@ def get_sent_friend_requests(user_id):
         if connection:
             connection.close()
 
-def search_users(search_term, interests=None, user_id=None):
+def _search_user_rows(cursor, candidate_ids, interests, user_id, limit):
+    """
+    Fetch the users among candidate_ids (or all users, if None) that pass the interest
+    and current-user filters, with their matching_interests count.
+    """
+    filters = []
+    filter_params = []
+    if candidate_ids is not None:
+        filters.append(f"u.user_id IN ({', '.join(['%s'] * len(candidate_ids))})")
+        filter_params += candidate_ids
+    
+    # Exclude current user if provided
+    if user_id:
+        filters.append("u.user_id != %s")
+        filter_params.append(user_id)
+    
+    where_clause = ("WHERE " + " AND ".join(filters)) if filters else ""
+    limit_clause = ""
+    if limit:
+        limit_clause = "ORDER BY u.user_id LIMIT %s"
+        filter_params.append(limit)
+    
+    if interests and len(interests) > 0:
+        # One grouped pass: each joined row is one matching interest
+        placeholders = ', '.join(['%s'] * len(interests))
+        cursor.execute(f"""
+            SELECT u.user_id, u.full_name, u.location, u.bio, u.gender, 
+                   COUNT(*) as matching_interests
+            FROM User u
+            JOIN User_Interests ui ON u.user_id = ui.user_id
+            AND ui.interest_id IN ({placeholders})
+            {where_clause}
+            GROUP BY u.user_id, u.full_name, u.location, u.bio, u.gender
+            {limit_clause}
+        """, list(interests) + filter_params)
+    else:
+        cursor.execute(f"""
+            SELECT u.user_id, u.full_name, u.location, u.bio, u.gender, 0 as matching_interests
+            FROM User u
+            {where_clause}
+            {limit_clause}
+        """, filter_params)
+    return cursor.fetchall()
+
+def search_users(search_term, interests=None, user_id=None, location=None, limit=None):
     """
     Search for users by name and filter by interests.
     
@@ -784,72 +1117,69 @@ def search_users(search_term, interests=None, user_id=None):
         search_term (str): The search term to match against user names
         interests (list): Optional list of interest IDs to filter by
         user_id (int): Optional ID of the current user to exclude from results
+        location (str): Optional location; only users in the same location bucket are searched
+        limit (int): Optional maximum number of results
         
     Returns:
-        list: A list of users matching the search criteria
+        list: A list of users matching the search criteria, best name matches first
     """
     connection = None
     cursor = None
     try:
+        # Narrow to one location bucket before any interest matching
+        location_ids = None
+        if location:
+            location_ids = get_location_index().users_at(location)
+            if not location_ids:
+                return []
+        
         connection = get_connection()
         if not connection:
             return None
             
         cursor = connection.cursor(DictCursor)
         
-        # Base query without interest filtering
-        if interests and len(interests) > 0:
-            # Query with interest filtering
-            placeholders = ', '.join(['%s'] * len(interests))
-            
-            query = f"""
-                SELECT DISTINCT u.user_id, u.full_name, u.location, u.bio, u.gender, 
-                       (SELECT COUNT(*) FROM User_Interests ui2 
-                        WHERE ui2.user_id = u.user_id AND ui2.interest_id IN ({placeholders})) as matching_interests
-                FROM User u
-                JOIN User_Interests ui ON u.user_id = ui.user_id
-                WHERE u.full_name LIKE %s
-                AND ui.interest_id IN ({placeholders})
-            """
-            
-            # Exclude current user if provided
-            if user_id:
-                query += " AND u.user_id != %s"
-                params = ['%' + search_term + '%'] + interests + interests + [user_id]
-            else:
-                params = ['%' + search_term + '%'] + interests + interests
-                
-            cursor.execute(query, params)
+        if not search_term:
+            # No ranking to preserve, so the database can stop at the limit
+            users = _search_user_rows(cursor, location_ids, interests, user_id, limit)
         else:
-            # Query without interest filtering
-            if user_id:
-                cursor.execute("""
-                    SELECT u.user_id, u.full_name, u.location, u.bio, u.gender, 0 as matching_interests
-                    FROM User u
-                    WHERE u.full_name LIKE %s
-                    AND u.user_id != %s
-                """, ('%' + search_term + '%', user_id))
-            else:
-                cursor.execute("""
-                    SELECT u.user_id, u.full_name, u.location, u.bio, u.gender, 0 as matching_interests
-                    FROM User u
-                    WHERE u.full_name LIKE %s
-                """, ('%' + search_term + '%',))
-                
-        users = cursor.fetchall()
-        
-        # If we have users and interests were specified, get the interest names for each user
+            # Substring matching goes through the trigram index instead of LIKE '%term%'.
+            # Its matches are walked a page at a time in relevance order, and each page
+            # is filtered, until enough users pass; nothing past the first page is dropped
+            index = get_user_name_index()
+            in_location = set(location_ids) if location_ids is not None else None
+            users = []
+            after = None
+            while not limit or len(users) < limit:
+                keys, _ = index.search_page(search_term, MAX_SEARCH_CANDIDATES, after)
+                page_ids = [key[-1] for key in keys]
+                if in_location is not None:
+                    page_ids = [candidate_id for candidate_id in page_ids if candidate_id in in_location]
+                if page_ids:
+                    # Keep the index's relevance order
+                    rank = {matched_id: position for position, matched_id in enumerate(page_ids)}
+                    rows = _search_user_rows(cursor, page_ids, interests, user_id, None)
+                    users += sorted(rows, key=lambda user: rank[user['user_id']])
+                if len(keys) < MAX_SEARCH_CANDIDATES:
+                    break
+                after = keys[-1]
+            if limit:
+                users = users[:limit]
+        
+        # If we have users and interests were specified, get every user's interest names in one query
         if users and interests and len(interests) > 0:
+            user_ids = [user['user_id'] for user in users]
+            cursor.execute(f"""
+                SELECT user_id, interest_id 
+                FROM User_Interests
+                WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})
+            """, user_ids)
+            
+            interest_ids = {}
+            for row in cursor.fetchall():
+                interest_ids.setdefault(row['user_id'], []).append(row['interest_id'])
             for user in users:
-                cursor.execute("""
-                    SELECT i.interest_name 
-                    FROM Interests i
-                    JOIN User_Interests ui ON i.interest_id = ui.interest_id
-                    WHERE ui.user_id = %s
-                """, (user['user_id'],))
-                
-                interests_data = cursor.fetchall()
-                user['interests'] = [interest['interest_name'] for interest in interests_data]
+                user['interests'] = interest_names(interest_ids.get(user['user_id'], []))
         
         return users
     except Exception as e:
@@ -866,105 +1196,28 @@ def get_all_interests():
     Get all available interests.
     
     Returns:
-        list: A list of all interests
+        list: A list of all interests, ordered by name, from the process-wide reference data
     """
-    connection = None
-    cursor = None
     try:
-        connection = get_connection()
-        if not connection:
-            return None
-            
-        cursor = connection.cursor(DictCursor)
-        cursor.execute("SELECT * FROM Interests ORDER BY interest_name")
-        interests = cursor.fetchall()
-        return interests
+        return get_reference_data().rows('interests')
     except Exception as e:
         print(f"Error in get_all_interests: {str(e)}")
         return None
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 def delete_user_account(user_id):
     """
     Delete a user account and all their associated data.
     
+    The user is tombstoned immediately; their rows are purged by a background
+    job in small chunks (see db.account_deletion).
+    
     Args:
         user_id (int): The ID of the user to delete
         
     Returns:
-        dict: A dictionary with success/error message
+        dict: The deletion job's progress, or a dictionary with an error message
     """
-    connection = None
-    cursor = None
-    try:
-        connection = get_connection()
-        if not connection:
-            return {"error": "Database connection failed"}
-            
-        cursor = connection.cursor(DictCursor)
-        
-        # Check if user exists
-        cursor.execute("SELECT user_id FROM User WHERE user_id = %s", (user_id,))
-        if not cursor.fetchone():
-            return {"error": "User not found"}
-        
-        # Start transaction
-        connection.begin()
-        
-        # Delete user's friend requests
-        cursor.execute("DELETE FROM FriendRequests WHERE sender_id = %s OR receiver_id = %s", 
-                      (user_id, user_id))
-        
-        # Delete user's messages in chats
-        cursor.execute("DELETE FROM Messages WHERE sender_id = %s", (user_id,))
-        
-        # Delete user's interests
-        cursor.execute("DELETE FROM User_Interests WHERE user_id = %s", (user_id,))
-        
-        # Get all friendships to delete associated chats
-        cursor.execute("""
-            SELECT chat_id FROM Friendships 
-            WHERE user1_id = %s OR user2_id = %s
-        """, (user_id, user_id))
-        chat_ids = [row['chat_id'] for row in cursor.fetchall()]
-        
-        # Delete friendships
-        cursor.execute("DELETE FROM Friendships WHERE user1_id = %s OR user2_id = %s", 
-                      (user_id, user_id))
-        
-        # Delete chats associated with the friendships
-        if chat_ids:
-            placeholders = ', '.join(['%s'] * len(chat_ids))
-            cursor.execute(f"DELETE FROM Chat WHERE chat_id IN ({placeholders})", chat_ids)
-            
-        # Remove user from groups
-        cursor.execute("DELETE FROM Group_Members WHERE user_id = %s", (user_id,))
-        
-        # Finally delete the user
-        cursor.execute("DELETE FROM User WHERE user_id = %s", (user_id,))
-        
-        # Commit transaction
-        connection.commit()
-        
-        return {
-            "success": True,
-            "message": "User account deleted successfully"
-        }
-        
-    except Exception as e:
-        print(f"Error in delete_user_account: {str(e)}")
-        if connection:
-            connection.rollback()
-        return {"error": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+    return start_account_deletion(user_id)
 
 def get_recommended_groups(user_id):
     """
@@ -979,6 +1232,7 @@ def get_recommended_groups(user_id):
     connection = None
     cursor = None
     try:
+        ensure_group_stats_table()
         connection = get_connection()
         if not connection:
             return None
@@ -994,15 +1248,13 @@ def get_recommended_groups(user_id):
                 g.group_id,
                 g.group_name,
                 g.created_at,
-                COUNT(gm.user_id) AS member_count,
-                COUNT(DISTINCT m.message_id) AS message_count,
-                COUNT(DISTINCT e.event_id) AS event_count
+                COALESCE(gs.member_count, 0) AS member_count,
+                COALESCE(gs.message_count, 0) AS message_count,
+                COALESCE(gs.event_count, 0) AS event_count
             FROM
                 `Group` g
                 JOIN User_Interests ui ON g.interest_id = ui.interest_id
-                LEFT JOIN Group_Members gm ON g.group_id = gm.group_id
-                LEFT JOIN Messages m ON g.chat_id = m.chat_id
-                LEFT JOIN Event e ON g.group_id = e.group_id
+                LEFT JOIN Group_Stats gs ON g.group_id = gs.group_id
             WHERE
                 ui.user_id = %s
                 AND g.group_id NOT IN (
@@ -1013,18 +1265,19 @@ def get_recommended_groups(user_id):
                     WHERE
                         user_id = %s
                 )
-            GROUP BY
-                g.group_id,
-                g.group_name,
-                g.created_at
             ORDER BY
                 member_count DESC,
                 message_count DESC,
-                event_count DESC
-            LIMIT 10
-        """, (user_id, user_id))
+                event_count DESC,
+                g.group_id ASC
+            LIMIT %s
+        """, (user_id, user_id, GROUP_RECOMMENDATION_LIMIT))
         
-        groups = cursor.fetchall()
+        # precompute_recommendations ranks with rank_group_candidates and the same merge
+        groups = merge_cf_recommendations(
+            cursor, user_id, cursor.fetchall(), GROUP_RECOMMENDATION_LIMIT,
+            ['group_id', 'group_name', 'created_at', 'member_count', 'message_count', 'event_count']
+        )
         
         # Format timestamps
         for group in groups:
@@ -1045,46 +1298,48 @@ def get_recommended_groups(user_id):
         if connection:
             connection.close()
 
-def get_active_groups():
+def get_active_groups(window='7d'):
     """
     Get the most active groups based on message and event activity.
+    
+    Args:
+        window (str): Activity window, one of '1h', '24h' or '7d' (default: '7d')
+        
+    Returns:
+        list: Up to 10 groups with their message and event counts in the window
     """
     connection = None
     cursor = None
     try:
+        ranking = get_activity_counters().top(window, 10)
+        if not ranking:
+            return []
+            
         connection = get_connection()
         if not connection:
             return None
             
         cursor = connection.cursor(DictCursor)
         
-        # Start transaction with READ COMMITTED isolation level
-        cursor.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
-        connection.start_transaction()
-        
-        cursor.execute("""
-            SELECT 
-                g.group_id,
-                g.group_name,
-                g.created_at,
-                COUNT(DISTINCT m.message_id) as message_count,
-                COUNT(DISTINCT e.event_id) as event_count
-            FROM `Group` g
-            LEFT JOIN Messages m ON g.chat_id = m.chat_id
-            LEFT JOIN Event e ON g.group_id = e.group_id
-            GROUP BY g.group_id
-            ORDER BY (message_count + event_count) DESC
-            LIMIT 10
-        """)
-        groups = cursor.fetchall()
-        
-        # Commit the transaction
-        connection.commit()
+        group_ids = [group_id for group_id, _, _ in ranking]
+        placeholders = ', '.join(['%s'] * len(group_ids))
+        cursor.execute(f"""
+            SELECT group_id, group_name, created_at
+            FROM `Group`
+            WHERE group_id IN ({placeholders})
+        """, group_ids)
+        groups_by_id = {group['group_id']: group for group in cursor.fetchall()}
+        
+        groups = []
+        for group_id, message_count, event_count in ranking:
+            group = groups_by_id.get(group_id)
+            if group:
+                group['message_count'] = message_count
+                group['event_count'] = event_count
+                groups.append(group)
         return groups
     except Exception as e:
         print(f"Error getting active groups: {e}")
-        if connection:
-            connection.rollback()
         return None
     finally:
         if cursor:
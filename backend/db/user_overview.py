@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .group_operations import get_group_recommendations, get_user_groups
+from .user_operations import (
+    get_friend_recommendations, get_pending_friend_requests, get_sent_friend_requests,
+    get_user_friends, get_user_recommendations, load_user_details
+)
+
+# Each section gets its own worker in a per-request executor, so overviews never queue behind each other
+OVERVIEW_TIMEOUT_SECONDS = 5.0
+
+# Sections running at once across the whole process, including ones an overview already gave up
+# on (a started query cannot be cancelled). Each holds a database connection while it runs:
+# 8 request threads x 8 sections
+MAX_SECTIONS_IN_FLIGHT = 64
+
+_SECTIONS = {
+    'details': load_user_details,
+    'friends': get_user_friends,
+    'groups': get_user_groups,
+    'pending_friend_requests': get_pending_friend_requests,
+    'sent_friend_requests': get_sent_friend_requests,
+    'user_recommendations': get_user_recommendations,
+    'friend_recommendations': get_friend_recommendations,
+    'group_recommendations': get_group_recommendations,
+}
+
+_section_slots = threading.BoundedSemaphore(MAX_SECTIONS_IN_FLIGHT)
+
+
+def _timed(fn, user_id, started):
+    # The section's deadline starts once it holds a slot, not when it was submitted
+    if not _section_slots.acquire(timeout=OVERVIEW_TIMEOUT_SECONDS):
+        return 'timeout', None, None
+    start = time.monotonic()
+    started[fn] = start
+    try:
+        return 'ok', fn(user_id), round((time.monotonic() - start) * 1000, 1)
+    except Exception as e:
+        print(f"Error in get_user_overview ({fn.__name__}): {str(e)}")
+        return 'error', None, round((time.monotonic() - start) * 1000, 1)
+    finally:
+        _section_slots.release()
+
+
+def get_user_overview(user_id):
+    """
+    Load everything the profile and dashboard pages show for a user, in parallel.
+
+    Args:
+        user_id (int): The ID of the user
+
+    Returns:
+        dict: "sections" (name -> status, elapsed_ms and data) and the total
+        "elapsed_ms"; None if the user does not exist; {"error": ...} if the
+        user's details could not be loaded
+    """
+    start = time.monotonic()
+    started = {}
+    executor = ThreadPoolExecutor(max_workers=len(_SECTIONS), thread_name_prefix='overview')
+    try:
+        futures = {name: executor.submit(_timed, fn, user_id, started) for name, fn in _SECTIONS.items()}
+
+        # Each section may wait OVERVIEW_TIMEOUT_SECONDS for a slot, then run for as long again
+        pending = set(futures.values())
+        while pending:
+            now = time.monotonic()
+            deadlines = [
+                started.get(_SECTIONS[name], start + OVERVIEW_TIMEOUT_SECONDS) + OVERVIEW_TIMEOUT_SECONDS
+                for name, future in futures.items() if future in pending
+            ]
+            if max(deadlines) <= now:
+                break
+            _, pending = wait(pending, timeout=max(deadlines) - now, return_when=FIRST_COMPLETED)
+    finally:
+        # Sections still running finish in the background and release their slots then
+        executor.shutdown(wait=False)
+
+    sections = {}
+    for name, future in futures.items():
+        if not future.done():
+            sections[name] = {"status": "timeout", "elapsed_ms": None, "data": None}
+            continue
+        status, data, elapsed_ms = future.result()
+        if status == 'ok' and name != 'details' and (data is None or (isinstance(data, dict) and "error" in data)):
+            status, data = 'error', None
+        sections[name] = {"status": status, "elapsed_ms": elapsed_ms, "data": data}
+
+    details = sections['details']
+    if details['status'] == 'ok':
+        if details['data'] is None:
+            return None
+        details['data'].pop('password', None)
+    elif details['status'] == 'error':
+        return {"error": "Failed to load user"}
+
+    return {
+        "user_id": user_id,
+        "sections": sections,
+        "elapsed_ms": round((time.monotonic() - start) * 1000, 1)
+    }
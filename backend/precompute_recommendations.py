@@ -0,0 +1,378 @@
+"""
+Precompute friend and group recommendations for every user.
+
+Loads the interest, friendship and membership tables once, shards the users
+across a process pool (each worker scores its own slice of the interest
+matrix) and bulk-writes the results. Candidates are blended and ranked by
+the same functions the live endpoints use. Finished chunks are recorded in
+a checkpoint file as user_id ranges, so an interrupted run can be picked up
+with --resume even if users were added or deleted in between.
+
+Usage:
+    python precompute_recommendations.py [--workers 4] [--chunk-size 500] [--resume]
+"""
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool, get_start_method
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from db.connection import get_connection
+from db.group_cf import GroupSimilarityModel, blend_cf_scores
+from db.group_stats import ensure_group_stats_table
+from db.recommendation_scoring import (
+    FRIEND_CANDIDATE_POOL, GROUP_RECOMMENDATION_LIMIT, blend_friend_candidates,
+    rank_group_candidates, top_interest_matches
+)
+
+CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS Precomputed_Friend_Recommendations (
+        user_id INTEGER,
+        rank_position INTEGER,
+        recommended_user_id INTEGER,
+        common_interests INTEGER,
+        mutual_friends INTEGER,
+        score INTEGER,
+        computed_at TIMESTAMP,
+        PRIMARY KEY (user_id, rank_position)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Precomputed_Group_Recommendations (
+        user_id INTEGER,
+        rank_position INTEGER,
+        group_id INTEGER,
+        member_count INTEGER,
+        message_count INTEGER,
+        event_count INTEGER,
+        computed_at TIMESTAMP,
+        PRIMARY KEY (user_id, rank_position)
+    )
+    """,
+]
+
+# Filled in before the pool starts; with the fork start method workers share it copy-on-write
+_data = {}
+
+
+def load_data(cursor):
+    """
+    Read everything the scoring needs into sparse matrices indexed by user position.
+    """
+    cursor.execute("SELECT user_id, age FROM User ORDER BY user_id")
+    users = cursor.fetchall()
+    user_ids = np.array([row[0] for row in users], dtype=np.int64)
+    ages = np.array([row[1] if row[1] is not None else -1 for row in users], dtype=np.int64)
+    user_index = {int(user_id): i for i, user_id in enumerate(user_ids)}
+    n = len(user_ids)
+
+    cursor.execute("SELECT user_id, interest_id FROM User_Interests")
+    pairs = [(user_index[u], i) for u, i in cursor.fetchall() if u in user_index]
+    interest_ids = sorted({i for _, i in pairs})
+    interest_index = {interest_id: j for j, interest_id in enumerate(interest_ids)}
+    interests = csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32),
+         ([u for u, _ in pairs], [interest_index[i] for _, i in pairs])),
+        shape=(n, len(interest_ids))
+    )
+
+    cursor.execute("SELECT user1_id, user2_id FROM Friendships")
+    edges = [(user_index[a], user_index[b]) for a, b in cursor.fetchall()
+             if a in user_index and b in user_index]
+    rows = [a for a, _ in edges] + [b for _, b in edges]
+    cols = [b for _, b in edges] + [a for a, _ in edges]
+    friends = csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(n, n))
+    friends.sum_duplicates()
+    friends.data[:] = 1
+
+    cursor.execute("""
+        SELECT
+            g.group_id,
+            g.interest_id,
+            COALESCE(gs.member_count, 0),
+            COALESCE(gs.message_count, 0),
+            COALESCE(gs.event_count, 0)
+        FROM `Group` g
+        LEFT JOIN Group_Stats gs ON g.group_id = gs.group_id
+    """)
+    groups_by_id = {}
+    groups_by_interest = {}
+    for group_id, interest_id, member_count, message_count, event_count in cursor.fetchall():
+        group = {
+            'group_id': group_id,
+            'member_count': member_count,
+            'message_count': message_count,
+            'event_count': event_count,
+        }
+        groups_by_id[group_id] = group
+        if interest_id in interest_index:
+            groups_by_interest.setdefault(interest_index[interest_id], []).append(group)
+
+    cursor.execute("SELECT user_id, group_id FROM Group_Members")
+    member_pairs = cursor.fetchall()
+    memberships = {}
+    for user_id, group_id in member_pairs:
+        if user_id in user_index:
+            memberships.setdefault(user_index[user_id], set()).add(group_id)
+
+    return {
+        'user_ids': user_ids,
+        'ages': ages,
+        'interests': interests,
+        'friends': friends,
+        'groups_by_id': groups_by_id,
+        'groups_by_interest': groups_by_interest,
+        'memberships': memberships,
+        # The same model get_recommended_groups merges with, built from the same table
+        'group_model': GroupSimilarityModel(member_pairs),
+    }
+
+
+def _init_worker(data):
+    _data.update(data)
+
+
+def _age_difference(ages, i, j):
+    # ABS(u1.age - u2.age) in SQL: NULL if either age is unknown
+    return abs(int(ages[i]) - int(ages[j])) if ages[i] >= 0 and ages[j] >= 0 else None
+
+
+def score_chunk(bounds):
+    """
+    Score users [start, end) against the whole user base.
+
+    Returns:
+        tuple: (start, end, friend rows, group rows) ready for bulk insert
+    """
+    start, end = bounds
+    user_ids = _data['user_ids']
+    ages = _data['ages']
+    interests = _data['interests']
+    friends = _data['friends']
+    groups_by_id = _data['groups_by_id']
+    group_model = _data['group_model']
+
+    # This worker's slice of the interest matrix against everyone: shared interest counts
+    common = (interests[start:end] @ interests.T).tocsr()
+    # Two hops through the friendship matrix: mutual friend counts
+    mutual = (friends[start:end] @ friends).tocsr()
+
+    friend_rows = []
+    group_rows = []
+    for offset in range(end - start):
+        i = start + offset
+        user_id = int(user_ids[i])
+        friend_positions = friends.indices[friends.indptr[i]:friends.indptr[i + 1]]
+        excluded = set(friend_positions.tolist())
+        excluded.add(i)
+
+        # The two pools get_friend_recommendations blends: the interest query's top
+        # FRIEND_CANDIDATE_POOL and the friend graph's top FRIEND_CANDIDATE_POOL
+        interest_matches = top_interest_matches([
+            {
+                'recommended_user_id': int(user_ids[j]),
+                'common_interests': int(count),
+                'age_difference': _age_difference(ages, i, j),
+            }
+            for j, count in zip(common.indices[common.indptr[offset]:common.indptr[offset + 1]],
+                                common.data[common.indptr[offset]:common.indptr[offset + 1]])
+            if j not in excluded
+        ])
+        mutual_counts = sorted(
+            (
+                (int(user_ids[j]), int(count))
+                for j, count in zip(mutual.indices[mutual.indptr[offset]:mutual.indptr[offset + 1]],
+                                    mutual.data[mutual.indptr[offset]:mutual.indptr[offset + 1]])
+                if j not in excluded and count > 0
+            ),
+            key=lambda item: (-item[1], item[0])
+        )[:FRIEND_CANDIDATE_POOL]
+
+        def load_missing(missing_ids):
+            positions = np.searchsorted(user_ids, missing_ids)
+            return [{
+                'recommended_user_id': candidate_id,
+                'common_interests': 0,
+                'age_difference': _age_difference(ages, i, j),
+            } for candidate_id, j in zip(missing_ids, positions)]
+
+        ranked = blend_friend_candidates(interest_matches, mutual_counts, load_missing)
+        for position, candidate in enumerate(ranked, start=1):
+            friend_rows.append((
+                user_id, position, candidate['recommended_user_id'],
+                candidate['common_interests'], candidate['mutual_friends'], candidate['score']
+            ))
+
+        # get_recommended_groups: the interest-matched top GROUP_RECOMMENDATION_LIMIT,
+        # merged with the collaborative-filtering ranking
+        member_of = _data['memberships'].get(i, set())
+        interest_groups = rank_group_candidates([
+            dict(group)
+            for interest in interests.indices[interests.indptr[i]:interests.indptr[i + 1]]
+            for group in _data['groups_by_interest'].get(int(interest), [])
+            if group['group_id'] not in member_of
+        ])
+        cf_scores = group_model.recommend(
+            user_id, user_ids[friend_positions].tolist(), GROUP_RECOMMENDATION_LIMIT * 2
+        )
+        ranked = blend_cf_scores(
+            interest_groups, cf_scores,
+            lambda missing_ids: [dict(groups_by_id[group_id]) for group_id in missing_ids
+                                 if group_id in groups_by_id and group_id not in member_of],
+            GROUP_RECOMMENDATION_LIMIT
+        )
+        for position, group in enumerate(ranked, start=1):
+            group_rows.append((
+                user_id, position, group['group_id'],
+                group['member_count'], group['message_count'], group['event_count']
+            ))
+
+    return start, end, friend_rows, group_rows
+
+
+def write_chunk(connection, user_ids, friend_rows, group_rows):
+    cursor = connection.cursor()
+    try:
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        cursor.execute(
+            f"DELETE FROM Precomputed_Friend_Recommendations WHERE user_id IN ({placeholders})",
+            user_ids
+        )
+        cursor.execute(
+            f"DELETE FROM Precomputed_Group_Recommendations WHERE user_id IN ({placeholders})",
+            user_ids
+        )
+        if friend_rows:
+            cursor.executemany("""
+                INSERT INTO Precomputed_Friend_Recommendations (
+                    user_id, rank_position, recommended_user_id,
+                    common_interests, mutual_friends, score, computed_at
+                ) VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            """, friend_rows)
+        if group_rows:
+            cursor.executemany("""
+                INSERT INTO Precomputed_Group_Recommendations (
+                    user_id, rank_position, group_id,
+                    member_count, message_count, event_count, computed_at
+                ) VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            """, group_rows)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def load_checkpoint(path):
+    """
+    Read the user_id ranges finished by a previous run.
+
+    Returns:
+        list: [first_user_id, last_user_id] pairs, inclusive
+    """
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if 'completed_ranges' not in checkpoint:
+        # Written by an older run that recorded chunk positions, which shift as users come and go
+        print("Checkpoint has no user_id ranges, starting over")
+        return []
+    return [list(bounds) for bounds in checkpoint['completed_ranges']]
+
+
+def save_checkpoint(path, completed_ranges):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump({'completed_ranges': completed_ranges}, f)
+    os.replace(temp_path, path)
+
+
+def plan_chunks(user_ids, chunk_size, completed_ranges):
+    """
+    Split the users not covered by a finished range into contiguous [start, end) position chunks.
+    """
+    done = np.zeros(len(user_ids), dtype=bool)
+    for first, last in completed_ranges:
+        done |= (user_ids >= first) & (user_ids <= last)
+
+    chunks = []
+    start = None
+    for i in range(len(user_ids) + 1):
+        if i < len(user_ids) and not done[i]:
+            if start is None:
+                start = i
+            if i + 1 - start == chunk_size:
+                chunks.append((start, i + 1))
+                start = None
+        elif start is not None:
+            chunks.append((start, i))
+            start = None
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute friend and group recommendations")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--checkpoint', default='precompute_recommendations.checkpoint.json')
+    parser.add_argument('--resume', action='store_true', help="Skip users finished by a previous run")
+    args = parser.parse_args()
+
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        for statement in CREATE_TABLES:
+            cursor.execute(statement)
+        connection.commit()
+        ensure_group_stats_table()
+
+        load_started = time.time()
+        data = load_data(cursor)
+    finally:
+        cursor.close()
+
+    n = len(data['user_ids'])
+    print(f"Loaded {n} users in {time.time() - load_started:.1f}s")
+
+    completed_ranges = load_checkpoint(args.checkpoint) if args.resume else []
+    chunks = plan_chunks(data['user_ids'], args.chunk_size, completed_ranges)
+    remaining_users = sum(end - start for start, end in chunks)
+    if completed_ranges:
+        print(f"Resuming: {n - remaining_users} users already done, {remaining_users} users left")
+
+    started = time.time()
+    done_users = 0
+    _init_worker(data)
+    pool_options = {} if get_start_method() == 'fork' else {'initializer': _init_worker, 'initargs': (data,)}
+    try:
+        with Pool(args.workers, **pool_options) as pool:
+            for start, end, friend_rows, group_rows in pool.imap_unordered(score_chunk, chunks):
+                chunk_user_ids = data['user_ids'][start:end].tolist()
+                write_chunk(connection, chunk_user_ids, friend_rows, group_rows)
+                completed_ranges.append([chunk_user_ids[0], chunk_user_ids[-1]])
+                save_checkpoint(args.checkpoint, completed_ranges)
+
+                done_users += end - start
+                elapsed = time.time() - started
+                print(f"{done_users}/{remaining_users} users "
+                      f"({100.0 * done_users / max(remaining_users, 1):.1f}%), "
+                      f"{done_users / max(elapsed, 1e-9):.1f} users/sec")
+    finally:
+        connection.close()
+
+    elapsed = time.time() - started
+    print(f"Done: {done_users} users in {elapsed:.1f}s "
+          f"({done_users / max(elapsed, 1e-9):.1f} users/sec)")
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Integration tests for account deletion, run against the database db.connection points at.
+
+They create and delete real users, so they only run when SYNAPO_INTEGRATION_DB=1 is set
+and the Cloud SQL credentials (creds.json or GOOGLE_CREDENTIALS_JSON) are available.
+"""
+import os
+import time
+import uuid
+
+import pytest
+
+if os.getenv('SYNAPO_INTEGRATION_DB') != '1':
+    pytest.skip("set SYNAPO_INTEGRATION_DB=1 to run against the database", allow_module_level=True)
+
+from db.account_deletion import account_tombstoned, get_account_deletion_job, start_account_deletion
+from db.user_operations import create_user, get_user_by_id, verify_login
+
+JOB_TIMEOUT_SECONDS = 60
+
+
+def _wait_until_done(user_id):
+    deadline = time.monotonic() + JOB_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        job = get_account_deletion_job(user_id)
+        if job and job['status'] == 'done':
+            return job
+        if job and job['status'] == 'failed':
+            pytest.fail(f"deletion job failed: {job['error']}")
+        time.sleep(0.5)
+    pytest.fail(f"deletion job for user {user_id} did not finish in {JOB_TIMEOUT_SECONDS}s")
+
+
+def test_new_user_reusing_a_deleted_max_id_can_log_in():
+    # Created last, so this user holds MAX(user_id) and create_user will hand the id out again
+    doomed = create_user({'full_name': f"doomed-{uuid.uuid4().hex}", 'password': 'secret'})
+    assert doomed.get('success'), doomed
+    deleted_id = doomed['user_id']
+
+    assert 'error' not in start_account_deletion(deleted_id)
+    _wait_until_done(deleted_id)
+    assert get_user_by_id(deleted_id) is None
+
+    name = f"reborn-{uuid.uuid4().hex}"
+    reborn = create_user({'full_name': name, 'password': 'secret'})
+    assert reborn.get('success'), reborn
+    assert reborn['user_id'] == deleted_id
+
+    assert not account_tombstoned(deleted_id)
+    assert get_user_by_id(deleted_id)['full_name'] == name
+    login = verify_login(name, 'secret')
+    assert login and login['user_id'] == deleted_id
+
+    # The new account can be deleted in turn; the old done job does not shadow it
+    job = start_account_deletion(deleted_id)
+    assert 'error' not in job, job
+    _wait_until_done(deleted_id)
+    assert verify_login(name, 'secret') is None